@@ -0,0 +1,113 @@
+# BACKENDS DE INFERENCIA: EXPORTA LOS PESOS .pt A ONNX / OPENVINO UNA SOLA VEZ Y LOS CACHEA.
+"""
+En máquinas sin GPU, PyTorch en modo eager es la opción más lenta para correr YOLO.
+cargar_yolo() devuelve el modelo listo para predict() según BACKEND:
+
+- torch    -> los pesos .pt tal cual (comportamiento original)
+- onnx     -> exportado a ONNX (onnxruntime)
+- openvino -> exportado a OpenVINO, opcionalmente en FP16 o INT8 (INT8 se calibra con
+  imágenes del dominio: el dataset YAML de CALIBDATA)
+
+La exportación es lenta, así que se hace una vez y el resultado se guarda en EXPORTCACHE
+con una clave que incluye el hash de los pesos, el backend, el tamaño de entrada, la
+precisión y, en INT8, el hash del dataset de calibración: si cambian los pesos (o la
+configuración) se exporta de nuevo; si no, todos los workers y reinicios reutilizan el
+mismo artefacto.
+"""
+import os
+import shutil
+import tempfile
+from ultralytics import YOLO
+from cache import hash_archivo
+
+BACKENDS = ("torch", "onnx", "openvino")
+PRECISIONES = ("fp32", "fp16", "int8")
+
+
+def hash_pesos(path):
+    """sha256 del archivo de pesos (leído por bloques)."""
+    return hash_archivo(path)
+
+
+def validar(backend, precision, calib=None):
+    """Verifica que la combinación backend/precisión sea exportable en CPU."""
+    if backend not in BACKENDS:
+        raise ValueError(f"BACKEND inválido: {backend} (opciones: {', '.join(BACKENDS)})")
+    if precision not in PRECISIONES:
+        raise ValueError(f"PRECISION inválida: {precision} (opciones: {', '.join(PRECISIONES)})")
+    if backend == "torch" and precision != "fp32":
+        raise ValueError("PRECISION solo aplica a los backends exportados (onnx / openvino)")
+    if backend == "onnx" and precision != "fp32":
+        # ultralytics solo exporta ONNX en FP16 con GPU y no cuantiza ONNX a INT8
+        raise ValueError("ONNX en CPU solo admite PRECISION=fp32; usar BACKEND=openvino para fp16/int8")
+    if precision == "int8":
+        # Sin data= ultralytics calibra con su dataset por defecto (coco8): lo descarga (falla
+        # sin red) y cuantiza el rodhead con imágenes de otro dominio
+        if not calib:
+            raise ValueError("PRECISION=int8 requiere CALIBDATA: dataset YAML con frames de los pozos para calibrar")
+        if not os.path.isfile(calib):
+            raise ValueError(f"CALIBDATA no existe: {calib}")
+
+
+def _destino(cache_dir, clave, backend):
+    # ultralytics reconoce el formato por el nombre: *.onnx o carpeta *_openvino_model
+    if backend == "onnx":
+        return os.path.join(cache_dir, f"{clave}.onnx")
+    return os.path.join(cache_dir, f"{clave}_openvino_model")
+
+
+def exportar(pesos, backend, imgsz=640, precision="fp32", cache_dir=None, calib=None):
+    """
+    Devuelve la ruta del modelo exportado, exportándolo si no está en el cache.
+    En INT8, `calib` es el dataset YAML de calibración.
+
+    La exportación se hace en una carpeta temporal dentro del cache y se mueve a su lugar
+    con un rename, así dos workers que exportan a la vez no dejan un artefacto a medias.
+
+    Returns:
+        str: Ruta del .onnx o de la carpeta *_openvino_model
+    """
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(pesos)), ".export_cache")
+    os.makedirs(cache_dir, exist_ok=True)
+
+    base = os.path.splitext(os.path.basename(pesos))[0]
+    clave = f"{base}-{hash_pesos(pesos)[:16]}-{imgsz}-{precision}"
+    if precision == "int8":
+        clave += f"-{hash_pesos(calib)[:16]}"
+    destino = _destino(cache_dir, clave, backend)
+    if os.path.exists(destino):
+        return destino
+
+    print(f"Exportando {os.path.basename(pesos)} a {backend} ({precision}, imgsz={imgsz})...")
+    tmp = tempfile.mkdtemp(prefix=".tmp-", dir=cache_dir)
+    try:
+        copia = os.path.join(tmp, f"{clave}.pt")
+        shutil.copy2(pesos, copia)
+        exportado = YOLO(copia).export(
+            format=backend,
+            imgsz=imgsz,
+            dynamic=True,   # admite lotes y los recortes de ROI (imgsz menor)
+            half=precision == "fp16",
+            int8=precision == "int8",
+            **({"data": calib} if precision == "int8" else {}),
+            device="cpu"
+        )
+        try:
+            os.rename(exportado, destino)
+        except OSError:
+            if not os.path.exists(destino):
+                raise
+            # Otro worker terminó primero: se usa el suyo
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    print(f"Modelo exportado en cache: {destino}")
+    return destino
+
+
+def cargar_yolo(pesos, backend="torch", imgsz=640, precision="fp32", cache_dir=None, calib=None):
+    """Carga un modelo YOLO con el backend pedido (exportando/cacheando si hace falta)."""
+    validar(backend, precision, calib)
+    if backend == "torch":
+        return YOLO(pesos)
+    return YOLO(exportar(pesos, backend, imgsz=imgsz, precision=precision, cache_dir=cache_dir, calib=calib),
+                task="detect")
@@ -0,0 +1,268 @@
+# BENCHMARK OFFLINE: VIDEOS Y SEÑALES SINTÉTICAS DE PUMP JACK PARA MEDIR CADA ETAPA.
+"""
+Genera un video sintético (una caja que sube y baja a un BPM conocido sobre un fondo fijo)
+y series de detecciones sintéticas de distintos largos, y cronometra cada etapa por
+separado: decodificación, pre-análisis de movimiento, inferencia del rodhead, inferencia
+COCO, dibujo/codificación del video anotado, graficador.graficar, on_off.detect_on_off,
+bpm.bpm_cycle y bpm.bpm_cycle_batch (sobre --lote señales, con el suavizado aparte).
+Reporta frames/s, latencia por video, memoria pico y el error del BPM contra el valor
+real, en JSON.
+
+Con --ruido se controla el jitter de las series: bpm.bpm_cycle cuenta extremos espurios
+cerca de los picos cuando el ruido supera ~0.7 píxeles, y el error del BPM lo muestra.
+
+Corre en CPU y sin red. Las etapas de inferencia se omiten si no están los pesos (MODELPATH
+y COCOPATH, o --modelo / --coco); usan el mismo BACKEND / PRECISION / IMGSZ que Detection.
+
+Uso:
+    python Scripts/benchmark.py --salida bench.json
+    python Scripts/benchmark.py --segundos 60 --largos 1000,100000 --modelo best.pt
+"""
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+import bpm
+import detecciones
+import graficador
+import metricas
+import movimiento
+import on_off
+from escritor import EscritorVideo
+
+
+def rss_pico_mb():
+    # Misma medición que metrics.json
+    return metricas.rss_pico_bytes() / 2 ** 20
+
+
+def etapa(segundos, n=None, **extra):
+    res = {'segundos': round(segundos, 4), 'rss_pico_mb': round(rss_pico_mb(), 1)}
+    if n is not None:
+        res['n'] = int(n)
+        res['por_segundo'] = round(n / segundos, 2) if segundos > 0 else None
+    res.update(extra)
+    return res
+
+
+def cronometrar(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    r = fn(*args, **kwargs)
+    return r, time.perf_counter() - t0
+
+
+def error_bpm(valor, real):
+    return None if not valor else round(abs(valor - real) / real, 4)
+
+
+def senal_sintetica(n_frames, fps, bpm_real, amplitud=60.0, centro=240.0, ruido=0.5,
+                    perdidas=0.05, seed=0):
+    """Serie (frames, cy) de un rodhead a bpm_real, con ruido y frames sin detección."""
+    rng = np.random.default_rng(seed)
+    frames = np.arange(1, n_frames + 1)
+    fase = rng.uniform(0, 2 * np.pi)
+    ys = centro + amplitud * np.sin(2 * np.pi * bpm_real / 60.0 * frames / fps + fase)
+    ys += rng.normal(0, ruido, n_frames)
+    keep = rng.random(n_frames) >= perdidas
+    return frames[keep], ys[keep]
+
+
+def video_sintetico(path, segundos, fps, bpm_real, size=(640, 360), seed=0):
+    """
+    Escribe un .avi con una caja que oscila verticalmente a bpm_real sobre un fondo fijo.
+
+    Returns:
+        (frames, cys): centro Y real de la caja en cada frame (índices desde 1)
+    """
+    rng = np.random.default_rng(seed)
+    w, h = size
+    fondo = cv2.GaussianBlur(rng.integers(0, 255, (h, w, 3), dtype=np.uint8), (21, 21), 0)
+    amplitud, lado = h * 0.25, max(8, h // 10)
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"XVID"), fps, size)
+    n = int(segundos * fps)
+    frames = np.arange(1, n + 1)
+    cys = h / 2 + amplitud * np.sin(2 * np.pi * bpm_real / 60.0 * frames / fps)
+    for cy in cys:
+        frame = fondo.copy()
+        y0 = int(cy - lado / 2)
+        cv2.rectangle(frame, (w // 2 - lado // 2, y0), (w // 2 + lado // 2, y0 + lado), (230, 230, 230), -1)
+        out.write(frame)
+    out.release()
+    return frames, cys
+
+
+def _analisis(output_file, run_dir, fps, bpm_real, bpm_min, bpm_max, graficar=True):
+    """Etapas de análisis sobre un detections.npz ya escrito."""
+    res = {}
+    if graficar:
+        _, t = cronometrar(graficador.graficar, output_file, run_dir)
+        res['graficar'] = etapa(t)
+    estado, t = cronometrar(on_off.detect_on_off, output_file)
+    res['on_off'] = etapa(t, estado=estado['status'])
+    frames, ys = bpm.load_points(output_file)
+    (valor, _), t = cronometrar(bpm.bpm_cycle, frames, ys, fps, bpm_min=bpm_min, bpm_max=bpm_max)
+    res['bpm'] = etapa(t, n=len(frames), valor=valor, real=bpm_real, error_rel=error_bpm(valor, bpm_real))
+    return res
+
+
+def _inferencia(pesos, frames, batch, imgsz, predict_kwargs):
+    import backends
+    backend = os.getenv("BACKEND", "torch").lower()
+    precision = os.getenv("PRECISION", "fp32").lower()
+    modelo, t_carga = cronometrar(backends.cargar_yolo, pesos, backend=backend, imgsz=imgsz,
+                                  precision=precision, cache_dir=os.getenv("EXPORTCACHE") or None,
+                                  calib=os.getenv("CALIBDATA") or None)
+    modelo.predict(frames[:1], imgsz=imgsz, device="cpu", verbose=False)  # warm-up
+    t0 = time.perf_counter()
+    for i in range(0, len(frames), batch):
+        modelo.predict(frames[i:i + batch], imgsz=imgsz, device="cpu", verbose=False, **predict_kwargs)
+    t = time.perf_counter() - t0
+    return etapa(t, n=len(frames), carga_s=round(t_carga, 3), backend=backend,
+                 precision=precision, imgsz=imgsz, batch=batch)
+
+
+def bench_video(tmp, args, bpm_min, bpm_max):
+    video = os.path.join(tmp, "sintetico.avi")
+    (frames_reales, cys), t = cronometrar(video_sintetico, video, args.segundos, args.fps,
+                                          args.bpm, seed=args.seed)
+    res = {'generar': etapa(t, n=len(cys))}
+    n_total = len(cys)
+
+    # Decodificación (se guardan solo los primeros frames para las etapas de inferencia)
+    muestra = []
+    t0 = time.perf_counter()
+    cap = cv2.VideoCapture(video)
+    n = 0
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        n += 1
+        if len(muestra) < args.max_frames:
+            muestra.append(frame)
+    cap.release()
+    res['decodificar'] = etapa(time.perf_counter() - t0, n=n)
+
+    previo, t = cronometrar(movimiento.prepass_movimiento, video)
+    res['prepass'] = etapa(t, estado=previo['status'])
+
+    # Inferencia: solo si están los pesos
+    imgsz = int(os.getenv("IMGSZ", "640"))
+    for nombre, pesos, kwargs in (("rodhead", args.modelo, {'classes': [0, 1]}),
+                                  ("coco", args.coco, {'classes': [0, 2, 7], 'conf': 0.35})):
+        if pesos and os.path.exists(pesos):
+            res[nombre] = _inferencia(pesos, muestra, args.batch, imgsz, kwargs)
+        else:
+            res[nombre] = {'omitido': "sin pesos"}
+
+    # Dibujo y codificación del video anotado (caja real dibujada como seguida)
+    h, w = muestra[0].shape[:2]
+    lado = max(8, h // 10)
+    escritor = EscritorVideo(os.path.join(tmp, "anotado.avi"), args.fps, (w, h))
+    t0 = time.perf_counter()
+    for i, frame in enumerate(muestra):
+        escritor.escribir(i + 1, None, frame=frame, caja_seguida=(w / 2, cys[i], lado, lado, 1.0))
+    escritor.cerrar()
+    res['anotar_codificar'] = etapa(time.perf_counter() - t0, n=len(muestra))
+
+    # Análisis sobre la trayectoria real de la caja
+    run_dir = os.path.join(tmp, "video")
+    os.makedirs(run_dir, exist_ok=True)
+    output_file = os.path.join(run_dir, detecciones.NOMBRE)
+    filas = [(f, w / 2, cy, lado, lado, 1.0, 0) for f, cy in zip(frames_reales, cys)]
+    detecciones.guardar(output_file, detecciones.desde_filas(filas), fps=args.fps, stride=1)
+    res.update(_analisis(output_file, run_dir, args.fps, args.bpm, bpm_min, bpm_max))
+
+    # Latencia estimada del video completo: las etapas por frame se extrapolan a todos los frames
+    latencia = res['decodificar']['segundos']
+    for nombre in ("rodhead", "coco", "anotar_codificar"):
+        por_seg = res[nombre].get('por_segundo')
+        if por_seg:
+            latencia += n_total / por_seg
+    latencia += sum(res[k]['segundos'] for k in ("graficar", "on_off", "bpm"))
+    res['latencia_video_s'] = round(latencia, 3)
+    res['frames'] = n_total
+    return res
+
+
+def bench_senales(tmp, args, bpm_min, bpm_max):
+    res = {}
+    for largo in args.largos:
+        run_dir = os.path.join(tmp, f"senal_{largo}")
+        os.makedirs(run_dir, exist_ok=True)
+        output_file = os.path.join(run_dir, detecciones.NOMBRE)
+        frames, ys = senal_sintetica(largo, args.fps, args.bpm, ruido=args.ruido, seed=args.seed)
+        filas = [(f, 0.0, y, 0.0, 0.0, 1.0, 0) for f, y in zip(frames, ys)]
+        detecciones.guardar(output_file, detecciones.desde_filas(filas), fps=args.fps, stride=1)
+        res[str(largo)] = _analisis(output_file, run_dir, args.fps, args.bpm, bpm_min, bpm_max,
+                                    graficar=largo <= args.max_graficar)
+
+        # Motor batch: args.lote señales del mismo largo, suavizado aparte del total
+        if args.lote:
+            series = [senal_sintetica(largo, args.fps, args.bpm, ruido=args.ruido, seed=args.seed + k)
+                      for k in range(args.lote)]
+            Y = bpm.interpolate_signals(series)
+            _, t_suave = cronometrar(bpm.smooth_ma_batch, Y)
+            (bpms, _), t = cronometrar(bpm.bpm_cycle_batch, Y, args.fps, bpm_min=bpm_min, bpm_max=bpm_max)
+            res[str(largo)]['bpm_batch'] = etapa(t, n=args.lote, suavizado_s=round(t_suave, 4),
+                                                 error_rel_mediano=error_bpm(float(np.nanmedian(bpms)), args.bpm))
+    return res
+
+
+def main(argv=None):
+    load_dotenv()
+    p = argparse.ArgumentParser(description="Benchmark offline del pipeline de pump jack")
+    p.add_argument("--salida", help="Archivo JSON de salida (default: stdout)")
+    p.add_argument("--segundos", type=float, default=60, help="Duración del video sintético")
+    p.add_argument("--fps", type=float, default=30)
+    p.add_argument("--bpm", type=float, default=6, help="BPM real de la señal sintética")
+    p.add_argument("--ruido", type=float, default=0.5,
+                   help="Desvío (píxeles) del ruido de las series sintéticas")
+    p.add_argument("--largos", default="1000,10000,100000",
+                   help="Largos (en frames) de las series sintéticas, separados por coma")
+    p.add_argument("--lote", type=int, default=100,
+                   help="Señales por largo para bpm_cycle_batch (0 = no medir el motor batch)")
+    p.add_argument("--max-frames", type=int, default=128, help="Frames usados para inferencia y codificación")
+    p.add_argument("--max-graficar", type=int, default=100000, help="Largo máximo de serie que se grafica")
+    p.add_argument("--batch", type=int, default=int(os.getenv("BATCHSIZE", "1")))
+    p.add_argument("--modelo", default=os.getenv("MODELPATH"))
+    p.add_argument("--coco", default=os.getenv("COCOPATH"))
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args(argv)
+    args.largos = [int(x) for x in args.largos.split(",") if x.strip()]
+
+    bpm_min = float(os.getenv("BPMMIN", "0.8"))
+    bpm_max = float(os.getenv("BPMMAX", "10"))
+
+    with tempfile.TemporaryDirectory(prefix="bench_") as tmp:
+        resultado = {
+            'sistema': {
+                'python': platform.python_version(),
+                'plataforma': platform.platform(),
+                'cpus': os.cpu_count(),
+                'numpy': np.__version__,
+                'opencv': cv2.__version__,
+            },
+            'parametros': {k: v for k, v in vars(args).items() if k != "salida"},
+            'video': bench_video(tmp, args, bpm_min, bpm_max),
+            'senales': bench_senales(tmp, args, bpm_min, bpm_max),
+        }
+    resultado['rss_pico_mb'] = round(rss_pico_mb(), 1)
+
+    texto = json.dumps(resultado, indent=2, default=float)
+    if args.salida:
+        with open(args.salida, "w") as f:
+            f.write(texto + "\n")
+        print(f"Benchmark guardado en {args.salida}")
+    else:
+        print(texto)
+    return resultado
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,8 @@
 import numpy as np
-import re
+import detecciones
 
 def load_points(path):
-    frames, ys = [], []
-    with open(path) as f:
-        for line in f:
-            line = line.strip()
-            if not line:
-                continue
-            m = re.match(r"\((\d+),\s*([0-9.]+)\)", line)
-            if m:
-                frames.append(int(m.group(1)))
-                ys.append(float(m.group(2)))
-    return np.array(frames), np.array(ys)
+    return detecciones.cargar_puntos(path)
 
 def interpolate_signal(frames, ys):
     n = frames.max() + 1
@@ -36,24 +26,21 @@ def find_extrema(y):
     min_idx = np.where((s[:-1] < 0) & (s[1:] > 0))[0] + 1
     return max_idx, min_idx
 
+def _best_per_group(gid, key):
+    """Posición del mayor `key` de cada grupo (el primero si hay empate), gid no decreciente."""
+    order = np.lexsort((np.arange(len(gid)), -key, gid))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = gid[order][1:] != gid[order][:-1]
+    return order[first]
+
 def group_close(idxs, y, merge_dist, mode):
     if len(idxs) == 0:
         return idxs
     idxs = np.sort(idxs)
-    groups = [[idxs[0]]]
-    for i in idxs[1:]:
-        if i - groups[-1][-1] <= merge_dist:
-            groups[-1].append(i)
-        else:
-            groups.append([i])
-
-    out = []
-    for g in groups:
-        if mode == "max":
-            out.append(max(g, key=lambda j: y[j]))
-        else:
-            out.append(min(g, key=lambda j: y[j]))
-    return np.array(out, dtype=int)
+    # un grupo nuevo cada vez que el salto supera merge_dist; de cada grupo, el más extremo
+    gid = np.concatenate(([0], np.cumsum(np.diff(idxs) > merge_dist)))
+    key = y[idxs] if mode == "max" else -y[idxs]
+    return idxs[_best_per_group(gid, key)].astype(int)
 
 def alternating_extrema(y, fps, bpm_min=2, bpm_max=20, smooth_win=11):
     y_s = smooth_ma(y, win=smooth_win)
@@ -66,29 +53,28 @@ def alternating_extrema(y, fps, bpm_min=2, bpm_max=20, smooth_win=11):
     max_idx = group_close(max_idx, y_s, merge_dist, mode="max")
     min_idx = group_close(min_idx, y_s, merge_dist, mode="min")
 
-    events = [(i, "max") for i in max_idx] + [(i, "min") for i in min_idx]
-    events.sort(key=lambda x: x[0])
-    if not events:
+    idxs = np.concatenate((max_idx, min_idx)).astype(int)
+    if len(idxs) == 0:
         return [], y_s
+    is_max = np.concatenate((np.ones(len(max_idx), bool), np.zeros(len(min_idx), bool)))
+    order = np.argsort(idxs, kind="stable")
+    idxs, is_max = idxs[order], is_max[order]
 
     # fuerza alternancia: si hay dos seguidos del mismo tipo, conserva el más extremo
-    cleaned = [events[0]]
-    for i, t in events[1:]:
-        pi, pt = cleaned[-1]
-        if t != pt:
-            cleaned.append((i, t))
-        else:
-            if t == "max" and y_s[i] > y_s[pi]:
-                cleaned[-1] = (i, t)
-            if t == "min" and y_s[i] < y_s[pi]:
-                cleaned[-1] = (i, t)
+    run = np.concatenate(([0], np.cumsum(is_max[1:] != is_max[:-1])))
+    key = np.where(is_max, y_s[idxs], -y_s[idxs])
+    keep = _best_per_group(run, key)
 
+    cleaned = [(i, "max" if m else "min") for i, m in zip(idxs[keep].tolist(), is_max[keep].tolist())]
     return cleaned, y_s
 
 def bpm_cycle(points_frames, points_y, fps, bpm_min=2, bpm_max=20, smooth_win=11):
     y = interpolate_signal(points_frames, points_y)
     events, _ = alternating_extrema(y, fps, bpm_min=bpm_min, bpm_max=bpm_max, smooth_win=smooth_win)
+    return bpm_from_events(events, fps)
 
+def bpm_from_events(events, fps):
+    """BPM a partir de los extremos de alternating_extrema (para no recalcularlos si ya están)."""
     # período de ciclo completo: cada 2 eventos del mismo tipo
     periods = []
     for k in range(2, len(events)):
@@ -104,3 +90,466 @@ def bpm_cycle(points_frames, points_y, fps, bpm_min=2, bpm_max=20, smooth_win=11
     bpm = 60 / T
     return bpm, {"events_sample": events[:10], "median_period_s": T, "n_periods": len(periods)}
 
+
+
+# --- Motor batch para muchas señales -------------------------------------------
+# Todas las funciones de abajo trabajan sobre una matriz (n_señales, n_frames) con las
+# señales ya interpoladas, alineadas a la izquierda y rellenadas con NaN al final.
+
+def interpolate_signals(series):
+    """
+    Interpola varias series [(frames, ys), ...] y las apila en una matriz rellenada con NaN.
+
+    Returns:
+        np.ndarray: (n_señales, max_frames + 1)
+    """
+    señales = [interpolate_signal(np.asarray(f), np.asarray(y)) if len(f) else np.zeros(0)
+               for f, y in series]
+    n = max((len(y) for y in señales), default=0)
+    Y = np.full((len(señales), n), np.nan)
+    for k, y in enumerate(señales):
+        Y[k, :len(y)] = y
+    return Y
+
+def _lengths(Y):
+    # Largo válido de cada fila (el relleno NaN va al final)
+    valid = np.isfinite(Y)
+    return np.where(valid.any(axis=1), Y.shape[1] - np.argmax(valid[:, ::-1], axis=1), 0)
+
+def smooth_ma_batch(Y, win=11, lengths=None):
+    """
+    smooth_ma fila por fila sobre el largo válido de cada señal.
+
+    Se usa el mismo np.convolve que bpm_cycle (y no sumas acumuladas) para que los valores
+    suavizados sean idénticos bit a bit: con cy enteros (centros de cajas de YOLO) hay
+    muchas mesetas y cualquier diferencia de redondeo cambia qué pendientes son 0 y qué
+    extremo gana un empate. Con win chico el bucle sobre np.convolve tampoco es el cuello de
+    botella: una media móvil por sumas acumuladas sobre toda la matriz resultó ~3 veces más
+    lenta (ver bpm_batch en benchmark.py). Como en smooth_ma, una señal más corta que la
+    ventana queda de largo win.
+
+    Returns:
+        (Y_s, largos): matriz suavizada (relleno NaN) y largo válido de cada fila
+    """
+    win = max(1, int(win))
+    if lengths is None:
+        lengths = _lengths(Y)
+    largos = np.where(lengths > 0, np.maximum(lengths, win), 0)
+    Y_s = np.full((Y.shape[0], max(Y.shape[1], int(largos.max(initial=0)))), np.nan)
+    for k, L in enumerate(lengths.tolist()):
+        if L:
+            Y_s[k, :largos[k]] = smooth_ma(Y[k, :L], win=win)
+    return Y_s, largos
+
+def _extrema_batch(Y_s, lengths, merge_dist):
+    """Extremos agrupados y alternados de todas las filas: (fila, índice, es_max) ordenados."""
+    # Igual que find_extrema: pendiente 0 cuenta como subida
+    with np.errstate(invalid="ignore"):
+        up = np.diff(Y_s, axis=1) >= 0
+    inside = np.arange(up.shape[1] - 1)[None, :] < (lengths[:, None] - 2)
+
+    rows_max, idx_max = np.nonzero(up[:, :-1] & ~up[:, 1:] & inside)
+    rows_min, idx_min = np.nonzero(~up[:, :-1] & up[:, 1:] & inside)
+    idx_max, idx_min = idx_max + 1, idx_min + 1
+
+    def agrupar(rows, idxs, sign):
+        # np.nonzero ya ordena por (fila, índice)
+        if len(idxs) == 0:
+            return rows, idxs
+        nuevo = np.ones(len(idxs), dtype=bool)
+        nuevo[1:] = (rows[1:] != rows[:-1]) | (np.diff(idxs) > merge_dist[rows[1:]])
+        keep = _best_per_group(np.cumsum(nuevo), sign * Y_s[rows, idxs])
+        return rows[keep], idxs[keep]
+
+    rows_max, idx_max = agrupar(rows_max, idx_max, 1.0)
+    rows_min, idx_min = agrupar(rows_min, idx_min, -1.0)
+
+    rows = np.concatenate((rows_max, rows_min))
+    idxs = np.concatenate((idx_max, idx_min))
+    is_max = np.concatenate((np.ones(len(idx_max), bool), np.zeros(len(idx_min), bool)))
+    order = np.lexsort((idxs, rows))
+    rows, idxs, is_max = rows[order], idxs[order], is_max[order]
+    if len(idxs) == 0:
+        return rows, idxs, is_max
+
+    # Alternancia: de cada racha del mismo tipo (dentro de la fila) queda el más extremo
+    nuevo = np.ones(len(idxs), dtype=bool)
+    nuevo[1:] = (rows[1:] != rows[:-1]) | (is_max[1:] != is_max[:-1])
+    key = np.where(is_max, Y_s[rows, idxs], -Y_s[rows, idxs])
+    keep = _best_per_group(np.cumsum(nuevo), key)
+    return rows[keep], idxs[keep], is_max[keep]
+
+def bpm_cycle_batch(Y, fps, bpm_min=2, bpm_max=20, smooth_win=11):
+    """
+    bpm_cycle para muchas señales a la vez (muchos pozos/videos): mismo resultado que
+    bpm_cycle señal por señal, con extremos, merge, alternancia y medianas vectorizados.
+
+    Args:
+        Y: Matriz (n_señales, n_frames) de señales interpoladas, con relleno NaN al final
+            (ver interpolate_signals)
+        fps: Escalar o array con el fps de cada señal
+
+    Returns:
+        (bpms, info): bpms es un array con el BPM de cada señal (NaN si no hay ciclos
+        completos); info tiene 'median_period_s' y 'n_periods' por señal
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    n_rows = Y.shape[0]
+    fps = np.broadcast_to(np.asarray(fps, dtype=float), (n_rows,))
+    lengths = _lengths(Y)
+
+    # merge de extremos cercanos (mesetas): usar una fracción del período mínimo
+    min_period = (fps * 60 / bpm_max).astype(int)
+    merge_dist = np.maximum(1, (min_period * 0.15).astype(int))
+
+    Y_s, largos = smooth_ma_batch(Y, win=smooth_win, lengths=lengths)
+    rows, idxs, _ = _extrema_batch(Y_s, largos, merge_dist)
+
+    # período de ciclo completo: cada 2 eventos (del mismo tipo, por la alternancia)
+    same = rows[2:] == rows[:-2]
+    p_rows = rows[2:][same]
+    periods = (idxs[2:] - idxs[:-2])[same] / fps[p_rows]
+
+    # Mediana por fila: ordenar por (fila, período) y tomar el/los del medio
+    order = np.lexsort((periods, p_rows))
+    p_rows, periods = p_rows[order], periods[order]
+    counts = np.bincount(p_rows, minlength=n_rows)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    has = counts > 0
+    T = np.full(n_rows, np.nan)
+    lo = starts[has] + (counts[has] - 1) // 2
+    hi = starts[has] + counts[has] // 2
+    T[has] = (periods[lo] + periods[hi]) / 2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bpms = 60 / T
+    return bpms, {"median_period_s": T, "n_periods": counts}
+
+def bpm_spectral(Y, fps, bpm_min=2, bpm_max=20, method="fft"):
+    """
+    Estimador alternativo del período por espectro (FFT) o autocorrelación, restringido a
+    la banda [bpm_min, bpm_max]. Más robusto que contar extremos cuando la señal es ruidosa
+    o tiene pocos ciclos marcados.
+
+    Args:
+        Y: Matriz (n_señales, n_frames) como en bpm_cycle_batch (o una sola señal 1-D)
+        fps: Escalar o array con el fps de cada señal
+        method: "fft" (pico del espectro) o "acf" (pico de la autocorrelación)
+
+    Returns:
+        np.ndarray: BPM de cada señal (NaN si no hay pico dentro de la banda)
+    """
+    Y = np.atleast_2d(np.asarray(Y, dtype=float))
+    n_rows, n = Y.shape
+    fps = np.broadcast_to(np.asarray(fps, dtype=float), (n_rows,))
+    lengths = _lengths(Y)
+    if n < 3:
+        return np.full(n_rows, np.nan)
+
+    # Sin media y con ventana de Hann sobre el largo válido de cada fila
+    i = np.arange(n)[None, :]
+    L = lengths[:, None]
+    valid = i < L
+    X = np.where(valid, np.nan_to_num(Y, nan=0.0), 0.0)
+    X = X - np.where(valid, X.sum(axis=1, keepdims=True) / np.maximum(L, 1), 0.0)
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))  # relleno: resolución y ACF sin solapamiento circular
+
+    if method == "fft":
+        hann = np.where(valid, 0.5 - 0.5 * np.cos(2 * np.pi * i / np.maximum(L - 1, 1)), 0.0)
+        P = np.abs(np.fft.rfft(X * hann, n=nfft, axis=1)) ** 2
+        k = np.arange(P.shape[1])[None, :]
+        bpm_k = k / nfft * fps[:, None] * 60
+        band = (bpm_k >= bpm_min) & (bpm_k <= bpm_max)
+    elif method == "acf":
+        F = np.fft.rfft(X, n=nfft, axis=1)
+        acf = np.fft.irfft(np.abs(F) ** 2, n=nfft, axis=1)[:, :n]
+        # Autocorrelación sin sesgo: normalizar por la cantidad de pares de cada lag
+        pares = np.maximum(L - i, 1)
+        P = acf / pares
+        lag_min = fps * 60 / bpm_max
+        lag_max = fps * 60 / bpm_min
+        band = (i >= lag_min[:, None]) & (i <= lag_max[:, None]) & (i < L - 1)
+        # Solo máximos locales: evita tomar el borde de la banda en la caída del lag 0
+        local = np.zeros_like(band)
+        local[:, 1:-1] = (P[:, 1:-1] >= P[:, :-2]) & (P[:, 1:-1] >= P[:, 2:])
+        band &= local
+    else:
+        raise ValueError(f"Método inválido: {method}")
+
+    Pb = np.where(band, P, -np.inf)
+    k0 = np.argmax(Pb, axis=1)
+    ok = np.isfinite(Pb[np.arange(n_rows), k0]) & (lengths >= 3)
+    if method == "acf":
+        # Los múltiplos del período (2T, 3T...) dan picos casi igual de altos: se toma el
+        # primer máximo local que llegue al 80% del mayor
+        cand = band & (P >= 0.8 * Pb[np.arange(n_rows), k0][:, None])
+        k0 = np.where(cand.any(axis=1), np.argmax(cand, axis=1), k0)
+
+    # Interpolación parabólica alrededor del pico para no quedar atado a la grilla
+    km = np.clip(k0 - 1, 0, P.shape[1] - 1)
+    kp = np.clip(k0 + 1, 0, P.shape[1] - 1)
+    r = np.arange(n_rows)
+    a, b, c = P[r, km], P[r, k0], P[r, kp]
+    den = a - 2 * b + c
+    with np.errstate(divide="ignore", invalid="ignore"):
+        delta = np.where((den != 0) & (km < k0) & (kp > k0), 0.5 * (a - c) / den, 0.0)
+        pico = k0 + np.clip(delta, -0.5, 0.5)
+        if method == "fft":
+            bpms = pico / nfft * fps * 60
+        else:
+            bpms = 60 * fps / pico
+    return np.where(ok, bpms, np.nan)
+
+
+class BPMOnline:
+    """
+    Estimador incremental de BPM con memoria acotada.
+
+    Consume los puntos (frame, cy) a medida que los produce detectar() y reproduce paso a paso
+    el mismo cálculo que bpm_cycle: interpolación, media móvil, extremos, merge de mesetas,
+    alternancia y período entre eventos del mismo tipo. Solo guarda una ventana de
+    ~smooth_win muestras de la señal; lo único que crece es la lista de períodos (un float
+    por ciclo), necesaria para que finalizar() dé exactamente la mediana del batch.
+
+    Uso:
+        est = BPMOnline(fps, bpm_min=0.8, bpm_max=10)
+        for frame, cy in puntos:
+            for ev in est.agregar(frame, cy):
+                print(ev["frame"], ev["bpm"])
+        bpm_value, dbg = est.finalizar()
+
+    Args:
+        fps, bpm_min, bpm_max, smooth_win: Igual que en bpm_cycle
+        ventana_periodos: Cantidad de períodos recientes para el BPM en curso
+        max_periodos: Si se indica, limita también la lista de períodos (finalizar() deja
+            de ser exactamente igual al batch en videos con más ciclos que eso)
+    """
+
+    def __init__(self, fps, bpm_min=2, bpm_max=20, smooth_win=11, ventana_periodos=5, max_periodos=None):
+        self.fps = fps
+        self.bpm_min = bpm_min
+        self.bpm_max = bpm_max
+        self.smooth_win = smooth_win
+        self.ventana_periodos = max(1, int(ventana_periodos))
+        self.max_periodos = max_periodos
+
+        self._win = max(1, int(smooth_win))
+        self._k = np.ones(self._win) / self._win
+        self._c = (self._win - 1) // 2  # desplazamiento de mode="same" respecto de mode="full"
+        min_period = int(fps * 60 / bpm_max)
+        self._merge_dist = max(1, int(min_period * 0.15))
+
+        # Interpolación: último punto emitido y punto pendiente (puede repetirse el frame)
+        self._emitido = None      # (frame, y) del último punto ya volcado a la señal
+        self._pendiente = None    # (frame, y) aún no volcado
+        # Señal cruda interpolada: solo las últimas muestras necesarias para suavizar
+        self._buf = np.zeros(0)
+        self._buf0 = 0            # índice global de self._buf[0]
+        self._n = 0               # muestras crudas recibidas
+        self._m = 0               # próximo índice de la convolución "full" a calcular
+        # Extremos sobre la señal suavizada
+        self._i = 0               # próximo índice suavizado
+        self._ys_prev = None
+        self._s_prev = None
+        self._grupos = {"max": None, "min": None}  # [primer_idx, ultimo_idx, mejor_idx, mejor_val]
+        self._cerrados = []       # eventos agrupados a la espera de ordenarse
+        self._ultimo = None       # último evento de la alternancia (todavía reemplazable)
+        self._finales = []        # últimos eventos definitivos (para los períodos)
+        self._ciclos = []         # ciclos cerrados aún no devueltos
+        self._eventos_muestra = []
+        self.periodos = []
+        self.n_eventos = 0
+        self.bpm_actual = None
+
+    # --- entrada -------------------------------------------------------------
+
+    def agregar(self, frame, cy):
+        """
+        Agrega un punto (frame, cy). Los frames deben llegar en orden creciente; si se repite
+        el último frame, gana el valor nuevo (como en interpolate_signal).
+
+        Returns:
+            list: Ciclos cerrados con este punto, cada uno
+                {"frame", "tipo", "periodo_s", "bpm"}
+        """
+        frame, cy = int(frame), float(cy)
+        if self._pendiente is not None:
+            if frame < self._pendiente[0]:
+                raise ValueError(f"Frame fuera de orden: {frame} < {self._pendiente[0]}")
+            if frame == self._pendiente[0]:
+                self._pendiente = (frame, cy)
+                return []
+        nuevos = []
+        if self._pendiente is not None:
+            self._volcar_pendiente()
+            nuevos = self._avanzar()
+        self._pendiente = (frame, cy)
+        return nuevos
+
+    def agregar_muchos(self, frames, ys):
+        """Agrega varios puntos de una vez; devuelve todos los ciclos cerrados."""
+        nuevos = []
+        for f, y in zip(frames, ys):
+            nuevos.extend(self.agregar(f, y))
+        return nuevos
+
+    def finalizar(self):
+        """
+        Cierra la señal y devuelve (bpm, dbg), igual que bpm_cycle sobre el archivo completo.
+        """
+        if self._pendiente is None:
+            return None, {"reason": "no hay ciclos completos suficientes", "events": []}
+        self._volcar_pendiente()
+        self._pendiente = None
+
+        if self._n < self._win:
+            # Señal más corta que la ventana: se resuelve con el camino batch (es chica)
+            y = self._buf.copy()
+            events, _ = alternating_extrema(y, self.fps, bpm_min=self.bpm_min, bpm_max=self.bpm_max,
+                                            smooth_win=self.smooth_win)
+            for i, t in events:
+                self._finalizar_evento(int(i), t)
+            return self._resultado()
+
+        self._avanzar()
+        # Borde derecho de mode="same": las últimas c muestras con relleno de ceros
+        seg = self._buf[-self._win:]
+        full = np.convolve(seg, self._k, mode="full")
+        self._procesar_suavizado(full[self._win:self._win + self._c])
+
+        self._cerrar_grupos(forzar=True)
+        self._liberar(frontera=None)
+        if self._ultimo is not None:
+            self._finalizar_evento(*self._ultimo[:2])
+            self._ultimo = None
+        return self._resultado()
+
+    # --- interpolación y suavizado -------------------------------------------
+
+    def _volcar_pendiente(self):
+        f, y = self._pendiente
+        if self._emitido is None:
+            # Antes del primer punto np.interp repite el primer valor (índices 0..f)
+            nuevas = np.full(f + 1, y, dtype=float)
+        else:
+            f0, y0 = self._emitido
+            idx = np.arange(f0 + 1, f + 1)
+            nuevas = np.interp(idx, [f0, f], [y0, y])
+            nuevas[-1] = y
+        self._emitido = (f, y)
+        self._buf = np.concatenate([self._buf, nuevas])
+        self._n += len(nuevas)
+
+    def _avanzar(self):
+        """Calcula la media móvil de las muestras nuevas y corre la detección de extremos."""
+        n, win = self._n, self._win
+        if n < win:
+            return []  # hasta tener una ventana completa se deja todo en el buffer
+
+        if self._m < win - 1:
+            # Todavía no se calculó el borde izquierdo: el buffer tiene la señal desde 0
+            full = np.convolve(self._buf, self._k, mode="full")[self._m:n]
+        else:
+            ini = self._m - win + 1 - self._buf0
+            full = np.convolve(self._buf[ini:], self._k, mode="valid")
+        desde = self._m
+        self._m = n
+
+        # full[m] corresponde a la muestra suavizada m - c (mode="same")
+        if desde < self._c:
+            full = full[self._c - desde:]
+        nuevos = self._procesar_suavizado(full)
+
+        # Solo hacen falta las últimas win muestras crudas
+        if len(self._buf) > win:
+            self._buf0 += len(self._buf) - win
+            self._buf = self._buf[-win:]
+        return nuevos
+
+    # --- extremos, merge y alternancia ---------------------------------------
+
+    def _procesar_suavizado(self, valores):
+        for v in valores.tolist():
+            i = self._i
+            self._i += 1
+            if self._ys_prev is not None:
+                # Igual que find_extrema: signo de la derivada, 0 cuenta como positivo
+                s = v - self._ys_prev
+                s = 1.0 if s >= 0 else -1.0
+                if self._s_prev is not None:
+                    j = i - 1
+                    if self._s_prev > 0 and s < 0:
+                        self._agregar_extremo(j, self._ys_prev, "max")
+                    elif self._s_prev < 0 and s > 0:
+                        self._agregar_extremo(j, self._ys_prev, "min")
+                self._s_prev = s
+            self._ys_prev = v
+
+            # Los próximos extremos van a tener índice >= i: se pueden cerrar grupos viejos
+            self._cerrar_grupos(pos=i)
+            self._liberar(frontera=self._frontera(i))
+
+        nuevos, self._ciclos = self._ciclos, []
+        return nuevos
+
+    def _agregar_extremo(self, j, val, tipo):
+        g = self._grupos[tipo]
+        if g is not None and j - g[1] <= self._merge_dist:
+            g[1] = j
+            if (tipo == "max" and val > g[3]) or (tipo == "min" and val < g[3]):
+                g[2], g[3] = j, val
+            return
+        if g is not None:
+            self._cerrados.append((g[2], tipo, g[3]))
+        self._grupos[tipo] = [j, j, j, val]
+
+    def _cerrar_grupos(self, pos=None, forzar=False):
+        for tipo, g in self._grupos.items():
+            if g is not None and (forzar or pos - g[1] > self._merge_dist):
+                self._cerrados.append((g[2], tipo, g[3]))
+                self._grupos[tipo] = None
+
+    def _frontera(self, pos):
+        abiertos = [g[0] for g in self._grupos.values() if g is not None]
+        return min(abiertos + [pos])
+
+    def _liberar(self, frontera):
+        # Pasa a la alternancia, en orden de índice, los eventos que ya no pueden cambiar de lugar
+        if not self._cerrados:
+            return
+        self._cerrados.sort(key=lambda e: e[0])
+        listos = [e for e in self._cerrados if frontera is None or e[0] < frontera]
+        self._cerrados = self._cerrados[len(listos):]
+        for i, t, val in listos:
+            if self._ultimo is None:
+                self._ultimo = (i, t, val)
+            elif t != self._ultimo[1]:
+                self._finalizar_evento(*self._ultimo[:2])
+                self._ultimo = (i, t, val)
+            elif (t == "max" and val > self._ultimo[2]) or (t == "min" and val < self._ultimo[2]):
+                self._ultimo = (i, t, val)
+
+    def _finalizar_evento(self, i, t):
+        if len(self._eventos_muestra) < 10:
+            self._eventos_muestra.append((i, t))
+        self.n_eventos += 1
+        self._finales.append((i, t))
+        if len(self._finales) > 3:
+            self._finales.pop(0)
+        if len(self._finales) == 3:
+            j, tt = self._finales[0]
+            if t == tt:
+                self.periodos.append((i - j) / self.fps)
+                if self.max_periodos is not None and len(self.periodos) > self.max_periodos:
+                    self.periodos.pop(0)
+                recientes = self.periodos[-self.ventana_periodos:]
+                self.bpm_actual = 60 / np.median(recientes)
+                self._ciclos.append({"frame": i, "tipo": t, "periodo_s": self.periodos[-1],
+                                     "bpm": self.bpm_actual})
+
+    def _resultado(self):
+        if len(self.periodos) < 1:
+            return None, {"reason": "no hay ciclos completos suficientes", "events": self._eventos_muestra}
+        T = np.median(self.periodos)
+        return 60 / T, {"events_sample": self._eventos_muestra, "median_period_s": T,
+                        "n_periods": len(self.periodos)}
@@ -0,0 +1,55 @@
+# CACHE DE DETECCIONES DIRECCIONADO POR CONTENIDO: HASH DEL VIDEO + PESOS + CONFIGURACIÓN.
+"""
+Un video que vuelve a subirse (mismo contenido, otro nombre u otro timestamp) no necesita
+pasar otra vez por YOLO: sus detecciones dependen solo de los bytes del video, de los pesos
+y de la configuración de detección (Detection.firma()). La clave es el sha256 de esas tres
+cosas y el valor, una copia del detections.npz:
+
+    CACHEPATH/ab/abcdef....npz
+
+El análisis (ON/OFF, BPM) no forma parte de la clave: para recalcularlo con otros parámetros
+sobre las detecciones guardadas está reanalizar.py.
+"""
+import hashlib
+import json
+import os
+import shutil
+
+
+def hash_archivo(path, bloque=1 << 20):
+    """sha256 de un archivo (leído por bloques)."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(bloque), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def clave(video_path, firma):
+    """sha256 del contenido del video junto con la firma de detección (pesos + configuración)."""
+    datos = json.dumps({"video": hash_archivo(video_path), **firma}, sort_keys=True)
+    return hashlib.sha256(datos.encode()).hexdigest()
+
+
+def _path(raiz, clave):
+    return os.path.join(raiz, clave[:2], f"{clave}.npz")
+
+
+def buscar(raiz, clave):
+    """Ruta del detections.npz cacheado, o None si no está."""
+    path = _path(raiz, clave)
+    return path if os.path.exists(path) else None
+
+
+def guardar(raiz, clave, output_file):
+    """Copia las detecciones al cache (a un temporal y rename, por si hay otro worker)."""
+    path = _path(raiz, clave)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        shutil.copyfile(output_file, tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        print("No se pudo guardar en el cache:", e)
+        return None
+    return path
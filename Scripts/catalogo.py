@@ -0,0 +1,477 @@
+# CATÁLOGO DE CORRIDAS EN SQLITE: ESTADO, TIEMPOS Y RESULTADOS DE CADA VIDEO, CON ÍNDICES.
+"""
+Cada run_dir de OUTPUTPATH deja sus resultados en archivos (_RUNNING/_SUCCESS, metrics.json,
+resultados.txt). Para listar o filtrar corridas no hace falta recorrer el árbol: los workers
+registran cada corrida en una base SQLite local (CATALOGPATH, por defecto
+OUTPUTPATH/catalogo.sqlite):
+
+    runs:   una fila por run_dir (video, host, inicio/fin, estado de la corrida, veredicto
+            ON/OFF, confianza, BPM, período, tiempos y rutas de los archivos)
+    bombas: una fila por bomba de las corridas multi-bomba (MULTIPUMP=1)
+
+La base usa WAL, así que varios workers del mismo host escriben a la vez sin bloquearse a
+los lectores. No conviene ponerla en un filesystem de red (NFS): SQLite no garantiza ahí el
+bloqueo entre hosts; en ese caso cada host con su CATALOGPATH local.
+
+Uso:
+    python Scripts/catalogo.py buscar --video pozo12 --desde 2026-10-01 --estado ON
+    python Scripts/catalogo.py buscar --estado-run error --formato json
+    python Scripts/catalogo.py backfill /ruta/a/Outputs
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import socket
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+
+NOMBRE = "catalogo.sqlite"
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_dir TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    video TEXT,
+    host TEXT,
+    inicio REAL,              -- epoch (s)
+    fin REAL,
+    estado_run TEXT,          -- running | ok | error | off_prepass
+    estado TEXT,              -- ON | OFF | UNKNOWN | "2/3 ON" (multi-bomba)
+    confianza REAL,
+    bpm REAL,
+    periodo_mediano_s REAL,
+    n_periodos INTEGER,
+    n_puntos INTEGER,
+    n_bombas INTEGER,
+    total_s REAL,
+    fps_efectivo REAL,
+    etapas TEXT,              -- JSON {etapa: segundos}
+    detecciones TEXT,
+    resultados TEXT,
+    metricas TEXT,
+    grafico TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_video ON runs (video, inicio);
+CREATE INDEX IF NOT EXISTS runs_inicio ON runs (inicio);
+CREATE INDEX IF NOT EXISTS runs_estado ON runs (estado, inicio);
+CREATE INDEX IF NOT EXISTS runs_estado_run ON runs (estado_run, inicio);
+CREATE TABLE IF NOT EXISTS bombas (
+    run_dir TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    estado TEXT,
+    confianza REAL,
+    bpm REAL,
+    periodo_mediano_s REAL,
+    n_periodos INTEGER,
+    n_puntos INTEGER,
+    PRIMARY KEY (run_dir, id)
+);
+"""
+
+_TIMESTAMP = re.compile(r"_(\d{8}_\d{6})$")  # sufijo de procesamiento.nuevo_video_id
+
+
+def path_por_defecto():
+    """CATALOGPATH, u OUTPUTPATH/catalogo.sqlite; None si CATALOGPATH=off."""
+    path = os.getenv("CATALOGPATH")
+    if path and path.lower() == "off":
+        return None
+    if path:
+        return path
+    output_path = os.getenv("OUTPUTPATH")
+    return os.path.join(output_path, NOMBRE) if output_path else None
+
+
+def desde_entorno():
+    """Catálogo configurado por el entorno, o None si está desactivado."""
+    path = path_por_defecto()
+    return Catalogo(path) if path else None
+
+
+_COLUMNAS_ANALISIS = ("estado", "confianza", "bpm", "periodo_mediano_s", "n_periodos", "n_puntos")
+
+
+def _analisis(status_result=None, bpm_value=None, dbg=None):
+    # Columnas del veredicto de una corrida (o de una bomba)
+    dbg = dbg or {}
+    status_result = status_result or {}
+    return {
+        "estado": status_result.get("status"),
+        "confianza": status_result.get("confidence"),
+        "bpm": float(bpm_value) if bpm_value else None,
+        "periodo_mediano_s": float(dbg["median_period_s"]) if dbg.get("median_period_s") is not None else None,
+        "n_periodos": dbg.get("n_periods"),
+        "n_puntos": status_result.get("n_points", status_result.get("n_muestras")),
+    }
+
+
+def _bombas(bombas):
+    # [(id, status_result, bpm_value, dbg), ...] de procesamiento.analizar_bombas -> filas
+    return None if bombas is None else [{"id": i, **_analisis(st, b, d)} for i, st, b, d in bombas]
+
+
+class Catalogo:
+    """
+    Acceso al catálogo. Cada proceso abre su propia conexión (la primera vez que la usa);
+    los errores de SQLite se informan y no cortan el procesamiento del video.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._con = None
+
+    def _conexion(self):
+        if self._con is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            con = sqlite3.connect(self.path, timeout=30)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.executescript(_ESQUEMA)
+            self._con = con
+        return self._con
+
+    def cerrar(self):
+        if self._con is not None:
+            self._con.close()
+            self._con = None
+
+    def _upsert(self, con, run_dir, campos):
+        # Los None no pisan lo que ya estaba, salvo en un veredicto nuevo: ahí un OFF tiene
+        # que borrar el BPM de un ON anterior
+        veredicto = campos.get("estado") is not None
+        campos = {k: v for k, v in campos.items() if v is not None or (veredicto and k in _COLUMNAS_ANALISIS)}
+        campos.setdefault("video_id", os.path.basename(os.path.normpath(run_dir)))
+        cols = ["run_dir", *campos]
+        actualizar = ", ".join(f"{c} = excluded.{c}" for c in campos)
+        con.execute(f"INSERT INTO runs ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))}) "
+                    f"ON CONFLICT (run_dir) DO UPDATE SET {actualizar}",
+                    [run_dir, *campos.values()])
+
+    def _guardar(self, run_dir, campos, bombas=None):
+        # bombas: [{"id": ..., "estado": ..., ...}, ...] reemplaza las de la corrida
+        try:
+            con = self._conexion()
+            with con:
+                self._upsert(con, run_dir, campos)
+                if bombas is not None:
+                    con.execute("DELETE FROM bombas WHERE run_dir = ?", (run_dir,))
+                    con.executemany(
+                        "INSERT INTO bombas (run_dir, id, estado, confianza, bpm, periodo_mediano_s, "
+                        "n_periodos, n_puntos) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(run_dir, int(b["id"]), *(b.get(c) for c in _COLUMNAS_ANALISIS)) for b in bombas])
+        except sqlite3.Error as e:
+            print(f"Error registrando {run_dir} en el catálogo:", e)
+            return False
+        return True
+
+    def registrar_inicio(self, run_dir, video):
+        """Alta de una corrida que empieza (estado_run = running)."""
+        return self._guardar(run_dir, {"video": video, "host": socket.gethostname(),
+                                       "inicio": time.time(), "estado_run": "running"})
+
+    def registrar_run(self, run_dir, video, resultado, datos_metricas=None, status_result=None,
+                      bpm_value=None, dbg=None, bombas=None, estado=None, fin=None):
+        """
+        Cierra una corrida: resultado (ok / error / off_prepass), tiempos de metrics.json,
+        veredicto y rutas de los archivos que quedaron en el run_dir.
+
+        Args:
+            datos_metricas: dict de MetricasRun.guardar() (o el metrics.json leído)
+            bombas: [(id, status_result, bpm_value, dbg), ...] de una corrida multi-bomba
+            estado: Veredicto resumido si no sale de status_result (ej. "2/3 ON")
+        """
+        datos_metricas = datos_metricas or {}
+        fin = fin or time.time()
+        campos = {
+            "video": video,
+            "fin": fin,
+            "estado_run": resultado,
+            "total_s": datos_metricas.get("total_s"),
+            "fps_efectivo": datos_metricas.get("fps_efectivo"),
+            "etapas": json.dumps({k: v["segundos"] for k, v in datos_metricas.get("etapas", {}).items()})
+                      if datos_metricas.get("etapas") else None,
+            **_analisis(status_result, bpm_value, dbg),
+        }
+        if estado is not None:
+            campos["estado"] = estado
+        if bombas is not None:
+            campos["n_bombas"] = len(bombas)
+        for col, nombre in (("detecciones", "detections.npz"), ("resultados", "resultados.txt"),
+                            ("metricas", "metrics.json"), ("grafico", "grafico_detecciones.png")):
+            path = os.path.join(run_dir, nombre)
+            if os.path.exists(path):
+                campos[col] = path
+        try:
+            fila = self._conexion().execute("SELECT inicio FROM runs WHERE run_dir = ?", (run_dir,)).fetchone()
+        except sqlite3.Error:
+            fila = None
+        if (fila is None or fila["inicio"] is None) and campos["total_s"]:
+            campos["inicio"] = fin - campos["total_s"]
+        return self._guardar(run_dir, campos, _bombas(bombas))
+
+    def registrar_analisis(self, run_dir, status_result=None, bpm_value=None, dbg=None, bombas=None, estado=None):
+        """Actualiza solo el veredicto de una corrida (lo usa reanalizar.py)."""
+        campos = _analisis(status_result, bpm_value, dbg)
+        if estado is not None:
+            campos["estado"] = estado
+        if bombas is not None:
+            campos["n_bombas"] = len(bombas)
+        return self._guardar(run_dir, campos, _bombas(bombas))
+
+    def buscar(self, video=None, desde=None, hasta=None, estado=None, estado_run=None, limite=None):
+        """
+        Corridas que cumplen todos los filtros, de la más reciente a la más vieja.
+
+        Args:
+            video: Nombre del video, con o sin extensión (acepta comodines % de LIKE)
+            desde, hasta: Rango de inicio (epoch o datetime)
+            estado: ON / OFF / UNKNOWN (en multi-bomba, corridas con alguna bomba en ese estado)
+            estado_run: running / ok / error / off_prepass
+
+        Returns:
+            list[dict]: filas de runs (con la lista "bombas" en las corridas multi-bomba)
+        """
+        condiciones, args = [], []
+        if video:
+            if "%" in video:
+                condiciones.append("video LIKE ?")
+                args.append(video)
+            else:
+                # Con o sin extensión: "pozo12" encuentra pozo12.mp4 (el _ de LIKE se escapa)
+                condiciones.append("(video = ? OR video LIKE ? ESCAPE '\\')")
+                args += [video, re.sub(r"([\\%_])", r"\\\1", video) + ".%"]
+        for op, valor in ((">=", desde), ("<", hasta)):
+            if valor is not None:
+                condiciones.append(f"inicio {op} ?")
+                args.append(valor.timestamp() if isinstance(valor, datetime) else float(valor))
+        if estado:
+            condiciones.append("(estado = ? OR run_dir IN (SELECT run_dir FROM bombas WHERE estado = ?))")
+            args += [estado, estado]
+        if estado_run:
+            condiciones.append("estado_run = ?")
+            args.append(estado_run)
+        sql = "SELECT * FROM runs"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        sql += " ORDER BY inicio DESC"
+        if limite:
+            sql += f" LIMIT {int(limite)}"
+
+        con = self._conexion()
+        filas = [dict(f) for f in con.execute(sql, args)]
+        multi = [f["run_dir"] for f in filas if f["n_bombas"] is not None]
+        if multi:
+            bombas = {}
+            for i in range(0, len(multi), 500):  # límite de parámetros de SQLite
+                lote = multi[i:i + 500]
+                for b in con.execute(f"SELECT * FROM bombas WHERE run_dir IN ({', '.join('?' * len(lote))}) "
+                                     "ORDER BY run_dir, id", lote):
+                    b = dict(b)
+                    bombas.setdefault(b.pop("run_dir"), []).append(b)
+            for f in filas:
+                if f["n_bombas"] is not None:
+                    f["bombas"] = bombas.get(f["run_dir"], [])
+        return filas
+
+    def backfill(self, output_path):
+        """
+        Importa los run_dir existentes de output_path (corridas anteriores al catálogo).
+        Lee los marcadores, metrics.json y resultados.txt; las fechas salen del sufijo
+        _AAAAMMDD_HHMMSS del nombre o, si no lo tiene, de la fecha de los archivos.
+
+        Returns:
+            int: corridas importadas
+        """
+        n = 0
+        for nombre in sorted(os.listdir(output_path)):
+            run_dir = os.path.join(output_path, nombre)
+            if not os.path.isdir(run_dir) or not _es_run_dir(run_dir):
+                continue
+            campos, bombas = leer_run_dir(run_dir)
+            if self._guardar(run_dir, campos, bombas):
+                n += 1
+        return n
+
+
+def _es_run_dir(run_dir):
+    return any(os.path.exists(os.path.join(run_dir, n))
+               for n in ("_RUNNING", "_SUCCESS", "resultados.txt", "detections.npz", "detections.txt"))
+
+
+def _float(texto):
+    try:
+        return float(texto)
+    except (TypeError, ValueError):
+        return None
+
+
+def leer_resultados(path):
+    """
+    Parsea un resultados.txt (de escribir_resultados o escribir_resultados_bombas).
+
+    Returns:
+        list[dict]: un dict por sección (una sola sin multi-bomba), con "id" en las bombas
+    """
+    secciones, actual = [], {}
+    with open(path, encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            m = re.match(r"=== BOMBA (\d+) ===", linea)
+            if m:
+                actual = {"id": int(m.group(1))}
+                secciones.append(actual)
+                continue
+            if linea.startswith("=== LÍNEA DE TIEMPO"):
+                break
+            clave, _, valor = linea.partition(": ")
+            if not valor:
+                continue
+            if not secciones:
+                secciones.append(actual)
+            if clave == "Estado Pump Jack":
+                actual["estado"] = valor.split()[0]
+            elif clave == "Confianza":
+                confianza = _float(valor.rstrip("%"))
+                actual["confianza"] = confianza / 100 if confianza is not None else None
+            elif clave == "BPM":
+                actual["bpm"] = _float(valor)
+            elif clave == "Período mediano":
+                actual["periodo_mediano_s"] = _float(valor.split()[0])
+            elif clave == "Número de períodos":
+                actual["n_periodos"] = int(valor) if valor.isdigit() else None
+            elif clave in ("Puntos analizados", "Muestras del pre-análisis"):
+                actual["n_puntos"] = int(valor) if valor.isdigit() else None
+    return [s for s in secciones if s]
+
+
+def leer_run_dir(run_dir):
+    """
+    Reconstruye la fila del catálogo de un run_dir a partir de sus archivos (backfill).
+
+    Returns:
+        (campos, bombas): bombas es None si la corrida no es multi-bomba
+    """
+    nombre = os.path.basename(os.path.normpath(run_dir))
+
+    def path(archivo):
+        return os.path.join(run_dir, archivo)
+
+    campos = {"video_id": nombre}
+
+    metricas = {}
+    if os.path.exists(path("metrics.json")):
+        try:
+            with open(path("metrics.json")) as f:
+                metricas = json.load(f)
+        except (OSError, ValueError):
+            pass
+    campos["video"] = metricas.get("video")
+    campos["total_s"] = metricas.get("total_s")
+    campos["fps_efectivo"] = metricas.get("fps_efectivo")
+    if metricas.get("etapas"):
+        campos["etapas"] = json.dumps({k: v["segundos"] for k, v in metricas["etapas"].items()})
+
+    # Fechas: fin = último archivo escrito; inicio = timestamp del nombre o fin - total_s
+    mtimes = [os.path.getmtime(path(n)) for n in os.listdir(run_dir)]
+    campos["fin"] = max(mtimes) if mtimes else None
+    m = _TIMESTAMP.search(nombre)
+    if m:
+        campos["inicio"] = datetime.strptime(m.group(1), "%Y%m%d_%H%M%S").timestamp()
+    elif campos["fin"] is not None:
+        campos["inicio"] = campos["fin"] - (campos["total_s"] or 0)
+
+    if metricas.get("resultado"):
+        campos["estado_run"] = metricas["resultado"]
+    elif os.path.exists(path("_SUCCESS")):
+        campos["estado_run"] = "ok"
+    elif os.path.exists(path("_RUNNING")):
+        campos["estado_run"] = "running"
+    else:
+        campos["estado_run"] = "error"
+
+    bombas = None
+    if os.path.exists(path("resultados.txt")):
+        secciones = leer_resultados(path("resultados.txt"))
+        if any("id" in s for s in secciones):
+            bombas = [s for s in secciones if "id" in s]
+            encendidas = sum(1 for b in bombas if b.get("estado") == "ON")
+            campos["estado"] = f"{encendidas}/{len(bombas)} ON"
+            campos["n_bombas"] = len(bombas)
+        elif secciones:
+            campos.update({k: v for k, v in secciones[0].items() if k != "id"})
+    if metricas.get("estado") and "estado" not in campos:
+        campos["estado"] = metricas["estado"]
+
+    for col, n in (("detecciones", "detections.npz"), ("resultados", "resultados.txt"),
+                   ("metricas", "metrics.json"), ("grafico", "grafico_detecciones.png")):
+        if os.path.exists(path(n)):
+            campos[col] = path(n)
+    if campos["video"] is None:
+        videos = [n for n in os.listdir(run_dir)
+                  if os.path.splitext(n)[1].lower() in (".mp4", ".avi", ".mov", ".mkv")]
+        campos["video"] = videos[0] if videos else None
+    return campos, bombas
+
+
+def _fecha(texto):
+    """AAAA-MM-DD o AAAA-MM-DDTHH:MM[:SS] -> datetime."""
+    return datetime.fromisoformat(texto)
+
+
+def main(argv=None):
+    load_dotenv()
+    p = argparse.ArgumentParser(description="Catálogo de corridas (SQLite)")
+    p.add_argument("--db", default=path_por_defecto(), help="Base (default: CATALOGPATH u OUTPUTPATH/catalogo.sqlite)")
+    sub = p.add_subparsers(dest="comando", required=True)
+
+    b = sub.add_parser("buscar", help="Lista corridas filtradas")
+    b.add_argument("--video", help="Nombre del video, con o sin extensión (acepta % como comodín)")
+    b.add_argument("--desde", type=_fecha, help="Inicio desde (AAAA-MM-DD[THH:MM])")
+    b.add_argument("--hasta", type=_fecha, help="Inicio antes de (AAAA-MM-DD[THH:MM])")
+    b.add_argument("--estado", help="ON / OFF / UNKNOWN")
+    b.add_argument("--estado-run", help="running / ok / error / off_prepass")
+    b.add_argument("--limite", type=int)
+    b.add_argument("--formato", choices=("tabla", "json", "csv"), default="tabla")
+
+    bf = sub.add_parser("backfill", help="Importa los run_dir existentes")
+    bf.add_argument("output", nargs="?", default=os.getenv("OUTPUTPATH"), help="Raíz de salida (default: OUTPUTPATH)")
+    args = p.parse_args(argv)
+
+    if not args.db:
+        p.error("No hay catálogo configurado (CATALOGPATH / OUTPUTPATH)")
+    catalogo = Catalogo(args.db)
+
+    if args.comando == "backfill":
+        n = catalogo.backfill(args.output)
+        print(f"{n} corridas importadas de {args.output} en {args.db}")
+        return n
+
+    filas = catalogo.buscar(video=args.video, desde=args.desde, hasta=args.hasta, estado=args.estado,
+                            estado_run=args.estado_run, limite=args.limite)
+    if args.formato == "json":
+        print(json.dumps(filas, indent=2, ensure_ascii=False))
+    elif args.formato == "csv":
+        columnas = [c for c in (filas[0] if filas else {}) if c != "bombas"]
+        w = csv.DictWriter(sys.stdout, fieldnames=columnas, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(filas)
+    else:
+        for f in filas:
+            inicio = datetime.fromtimestamp(f["inicio"]).strftime("%Y-%m-%d %H:%M:%S") if f["inicio"] else "-"
+            bpm_txt = f"{f['bpm']:.2f}" if f["bpm"] else "N/A"
+            print(f"{inicio}  {f['video_id']}  {f['estado_run'] or '-'}  {f['estado'] or '-'}  BPM: {bpm_txt}")
+            for bomba in f.get("bombas", []):
+                bpm_txt = f"{bomba['bpm']:.2f}" if bomba["bpm"] else "N/A"
+                print(f"    bomba {bomba['id']}: {bomba['estado']}  BPM: {bpm_txt}")
+        print(f"{len(filas)} corridas")
+    return filas
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+# MODO CONTINUO: DETECCIÓN INCREMENTAL SOBRE UNA CÁMARA, STREAM O ARCHIVO QUE CRECE, CON RESULTADOS POR VENTANA.
+"""
+Para los pozos que se vigilan todo el tiempo no hace falta grabar clips y subirlos a la
+bandeja: este modo lee directamente la fuente y, cada VENTANA segundos de video, escribe en
+el run_dir el ON/OFF y el BPM de esa ventana.
+
+Fuentes:
+    - cámara (índice, ej. 0) o URL de stream (rtsp://, http://...): si se corta, se reconecta
+    - archivo que está creciendo (--creciente): al llegar al final espera a que crezca y
+      termina cuando deja de crecer (--fin-s). Sirve con contenedores que se pueden leer
+      mientras se escriben (.avi, .mkv, .ts), no con un .mp4 sin cerrar
+    - archivo local con --tiempo-real: se reproduce al ritmo de su fps, como si fuera una
+      cámara (para probar el modo sin una)
+
+Nunca se guarda el video ni la lista completa de detecciones: la detección corre lote a lote
+(Detection.detectar_lotes: mismo pipeline que detectar(), sin video anotado), los puntos de
+la ventana en curso se descartan al cerrarla y el BPM se sigue con bpm.BPMOnline (memoria
+acotada). Solo la variante de una bomba por cámara.
+
+Salida en OUTPUTPATH/<id>_<timestamp>/:
+    ventanas.csv     una línea por ventana cerrada (inicio/fin, estado, confianza, BPM)
+    resultados.txt   el resultado de la última ventana, con el formato de siempre
+    ventanas/        detecciones de cada ventana (.npz), solo con --detecciones
+    metrics.json, _RUNNING / _SUCCESS
+
+Uso:
+    python Scripts/continuo.py rtsp://camara-pozo12/stream --id pozo12 --ventana 60
+    python Scripts/continuo.py grabacion.avi --tiempo-real --ventana 30
+"""
+import argparse
+import csv
+import os
+import time
+from datetime import datetime
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+import bpm
+import detecciones
+import metricas
+import on_off
+import procesamiento
+
+CSV = "ventanas.csv"
+COLUMNAS_CSV = ["ventana", "inicio_s", "fin_s", "hora", "estado", "confianza", "bpm", "n_puntos", "n_ciclos", "parcial"]
+
+
+class FuenteContinua:
+    """
+    Envuelve un cv2.VideoCapture para que la lea lector.LectorFrames como si fuera un
+    video: read()/grab() bloquean hasta que hay un frame nuevo y devuelven False recién
+    cuando la fuente terminó (stream sin reconexión posible, archivo que dejó de crecer o
+    fin de un archivo común).
+
+    Args:
+        fuente: Índice de cámara, URL o ruta de archivo
+        fps: FPS a usar si la fuente no informa uno válido
+        tiempo_real: No entregar el frame k antes de k / fps segundos desde el inicio
+        creciente: Al llegar al final del archivo, esperar a que crezca
+        espera_s: Intervalo de sondeo del archivo creciente / espera entre reconexiones
+        fin_s: Segundos sin crecer para dar por terminado el archivo
+        reintentos: Reconexiones seguidas de un stream antes de abandonar
+    """
+
+    def __init__(self, fuente, fps=30.0, tiempo_real=False, creciente=False, espera_s=0.5, fin_s=30.0, reintentos=5):
+        self.fuente = int(fuente) if str(fuente).isdigit() else fuente
+        self.es_archivo = isinstance(self.fuente, str) and os.path.isfile(self.fuente)
+        self.tiempo_real = tiempo_real
+        self.creciente = creciente and self.es_archivo
+        self.espera_s = espera_s
+        self.fin_s = fin_s
+        self.reintentos = reintentos
+        self.pos = 0  # frames entregados
+        self.reconexiones = 0
+        self._t0 = None
+
+        self.cap = cv2.VideoCapture(self.fuente)
+        if not self.cap.isOpened():
+            raise RuntimeError(f"No se pudo abrir la fuente: {fuente}")
+        fps_fuente = self.cap.get(cv2.CAP_PROP_FPS)
+        # Las cámaras a veces informan 0 o valores absurdos
+        self.fps = fps_fuente if 0 < fps_fuente <= 240 else fps
+        self.size = (int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def grab(self):
+        return self._siguiente(self.cap.grab)
+
+    def read(self, image=None):
+        return self._siguiente(lambda: self.cap.read(image) if image is not None else self.cap.read())
+
+    def release(self):
+        self.cap.release()
+
+    def _siguiente(self, leer):
+        while True:
+            res = leer()
+            ok = res[0] if isinstance(res, tuple) else res
+            if ok:
+                self.pos += 1
+                self._esperar_turno()
+                return res
+            if not self._recuperar():
+                return res
+
+    def _esperar_turno(self):
+        if not self.tiempo_real:
+            return
+        if self._t0 is None:
+            self._t0 = time.monotonic()
+        espera = self._t0 + self.pos / self.fps - time.monotonic()
+        if espera > 0:
+            time.sleep(espera)
+
+    def _reabrir(self):
+        self.cap.release()
+        self.cap = cv2.VideoCapture(self.fuente)
+        if self.es_archivo and self.cap.isOpened():
+            # Volver a la posición donde se cortó (sin seek exacto, avanzando sin decodificar)
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, self.pos)
+            if int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) != self.pos:
+                self.cap.release()
+                self.cap = cv2.VideoCapture(self.fuente)
+                for _ in range(self.pos):
+                    if not self.cap.grab():
+                        break
+        return self.cap.isOpened()
+
+    def _recuperar(self):
+        """Después de una lectura fallida: True si se puede seguir leyendo."""
+        if self.creciente:
+            tamano = os.path.getsize(self.fuente)
+            limite = time.monotonic() + self.fin_s
+            while time.monotonic() < limite:
+                time.sleep(self.espera_s)
+                if os.path.getsize(self.fuente) != tamano:
+                    return self._reabrir()
+            print(f"El archivo no crece hace {self.fin_s:.0f} s: fin de la fuente")
+            return False
+        if self.es_archivo:
+            return False
+        # Stream o cámara: reconectar con espera creciente
+        for intento in range(1, self.reintentos + 1):
+            time.sleep(self.espera_s * 2 ** (intento - 1))
+            print(f"Fuente cortada, reconectando ({intento}/{self.reintentos})...")
+            if self._reabrir():
+                self.reconexiones += 1
+                return True
+        return False
+
+
+class MonitorContinuo:
+    """
+    Detección incremental y resultados por ventana sobre una FuenteContinua.
+
+    Las ventanas son de video (VENTANA segundos = ventana_s * fps frames), no de reloj: una
+    reproducción a mayor velocidad da las mismas ventanas que en tiempo real.
+
+    Args:
+        detector: detection.Detection con los modelos cargados
+        run_dir: Carpeta de salida
+        ventana_s: Duración de cada ventana
+        guardar_detecciones: Guardar las detecciones de cada ventana en ventanas/NNNNNN.npz
+        catalogo: catalogo.Catalogo donde ir actualizando el veredicto (opcional)
+        max_periodos: Períodos que guarda BPMOnline (memoria acotada)
+    """
+
+    def __init__(self, detector, run_dir, ventana_s=60.0, bpm_min=procesamiento.BPM_MIN,
+                 bpm_max=procesamiento.BPM_MAX, guardar_detecciones=False, catalogo=None, max_periodos=1000):
+        self.detector = detector
+        self.run_dir = run_dir
+        self.ventana_s = ventana_s
+        self.bpm_min = bpm_min
+        self.bpm_max = bpm_max
+        self.guardar_detecciones = guardar_detecciones
+        self.catalogo = catalogo
+        self.max_periodos = max_periodos
+        self.ventanas = 0
+        self.ultimo = {}  # status_result, bpm_value y dbg de la última ventana
+        self.metricas = metricas.MetricasRun()
+
+    def correr(self, fuente):
+        """
+        Procesa la fuente hasta que termina (o Ctrl+C); la última ventana puede quedar parcial.
+
+        Returns:
+            dict de metrics.json
+        """
+        d = self.detector
+        fps = fuente.fps
+        stride = d.stride_para(fps)
+        self._fps, self._stride = fps, stride
+        self._largo = max(stride, int(round(self.ventana_s * fps)))  # frames por ventana
+        self._estimador = bpm.BPMOnline(fps, bpm_min=self.bpm_min, bpm_max=self.bpm_max,
+                                        max_periodos=self.max_periodos)
+        self._filas, self._ciclos = [], []
+        if d.MULTI_PUMP:
+            print("El modo continuo sigue una sola bomba: se ignora MULTIPUMP")
+        print(f"Modo continuo: {fps:.2f} fps, muestreo 1/{stride}, ventanas de {self.ventana_s:g} s")
+
+        k, ultimo = 0, 0
+        try:
+            for ultimo, filas in d.detectar_lotes(fuente, stride, self.metricas):
+                for fila in filas:
+                    while fila[0] > self._fin(k):
+                        self._cerrar(k)
+                        k += 1
+                    self._filas.append(fila)
+                    self._ciclos.extend(self._estimador.agregar(fila[0], fila[2]))
+                while ultimo >= self._fin(k):
+                    self._cerrar(k)
+                    k += 1
+        except KeyboardInterrupt:
+            print("Deteniendo el modo continuo...")
+        finally:
+            fuente.release()
+        if ultimo > self._fin(k - 1):
+            self._cerrar(k, hasta=ultimo)
+        return self.metricas.guardar(self.run_dir, fuente=str(fuente.fuente), ventanas=self.ventanas,
+                                     reconexiones=fuente.reconexiones)
+
+    def _fin(self, k):
+        # Último frame (índice desde 1) de la ventana k
+        return (k + 1) * self._largo
+
+    def _cerrar(self, k, hasta=None):
+        """Analiza la ventana k con los puntos acumulados, escribe los resultados y los descarta."""
+        fin = hasta or self._fin(k)
+        parcial = hasta is not None
+        ys = np.array([f[2] for f in self._filas], dtype=float)
+        with self.metricas.etapa("ventana"):
+            status_result = on_off.detect_on_off_series(ys, stride=self._stride)
+            bpm_value, dbg = None, {}
+            if status_result['status'] == 'ON':
+                periodos = [c["periodo_s"] for c in self._ciclos]
+                if periodos:
+                    T = float(np.median(periodos))
+                    bpm_value, dbg = 60 / T, {"median_period_s": T, "n_periods": len(periodos)}
+                elif self._estimador.bpm_actual:
+                    # Ningún ciclo cerró en esta ventana: el BPM en curso de las anteriores
+                    bpm_value = self._estimador.bpm_actual
+            self._escribir(k, fin, parcial, status_result, bpm_value, dbg)
+        self.ultimo = {"status_result": status_result, "bpm_value": bpm_value, "dbg": dbg}
+        self._filas, self._ciclos = [], []
+        self.ventanas += 1
+
+    def _escribir(self, k, fin, parcial, status_result, bpm_value, dbg):
+        inicio_s, fin_s = k * self._largo / self._fps, fin / self._fps
+        hora = datetime.now().isoformat(timespec="seconds")
+        fila = {
+            "ventana": k,
+            "inicio_s": round(inicio_s, 2),
+            "fin_s": round(fin_s, 2),
+            "hora": hora,
+            "estado": status_result['status'],
+            "confianza": round(status_result['confidence'], 4),
+            "bpm": round(bpm_value, 3) if bpm_value else "",
+            "n_puntos": len(self._filas),
+            "n_ciclos": len(self._ciclos),
+            "parcial": int(parcial),
+        }
+        path_csv = os.path.join(self.run_dir, CSV)
+        nuevo = not os.path.exists(path_csv)
+        with open(path_csv, "a", newline="") as f:
+            w = csv.DictWriter(f, fieldnames=COLUMNAS_CSV)
+            if nuevo:
+                w.writeheader()
+            w.writerow(fila)
+
+        # resultados.txt con el formato de siempre, reemplazado de forma atómica
+        resultados = os.path.join(self.run_dir, "resultados.txt")
+        tmp = f"{resultados}.tmp"
+        procesamiento.escribir_resultados(tmp, status_result, bpm_value, dbg)
+        with open(tmp, "a") as f:
+            f.write(f"\nVentana {k}: {inicio_s:.1f}s - {fin_s:.1f}s del video ({hora})"
+                    f"{' (parcial)' if parcial else ''}\n")
+        os.replace(tmp, resultados)
+
+        if self.guardar_detecciones:
+            carpeta = os.path.join(self.run_dir, "ventanas")
+            os.makedirs(carpeta, exist_ok=True)
+            detecciones.guardar(os.path.join(carpeta, f"{k:06d}.npz"), detecciones.desde_filas(self._filas),
+                                fps=self._fps, stride=self._stride, fps_efectivo=self._fps / self._stride)
+        if self.catalogo is not None:
+            self.catalogo.registrar_analisis(self.run_dir, status_result, bpm_value, dbg)
+
+        bpm_txt = f"{bpm_value:.2f}" if bpm_value else "N/A"
+        print(f"[{hora}] Ventana {k} ({inicio_s:.0f}s - {fin_s:.0f}s): {status_result['status']} "
+              f"(Confianza: {status_result['confidence']:.0%}, BPM: {bpm_txt})")
+
+
+def main(argv=None):
+    load_dotenv()
+    p = argparse.ArgumentParser(description="Detección continua sobre una cámara, stream o archivo que crece")
+    p.add_argument("fuente", help="Índice de cámara, URL del stream o ruta del archivo")
+    p.add_argument("--id", help="Nombre del run_dir (default: nombre de la fuente)")
+    p.add_argument("--ventana", type=float, default=float(os.getenv("CONTINUOWINDOW", "60")),
+                   help="Segundos de video por ventana de resultados")
+    p.add_argument("--tiempo-real", action="store_true", help="Reproducir un archivo al ritmo de su fps")
+    p.add_argument("--creciente", action="store_true", help="El archivo se sigue escribiendo: esperar a que crezca")
+    p.add_argument("--fin-s", type=float, default=30.0, help="Segundos sin crecer para terminar (--creciente)")
+    p.add_argument("--fps", type=float, default=30.0, help="FPS si la fuente no informa uno válido")
+    p.add_argument("--reintentos", type=int, default=5, help="Reconexiones seguidas de un stream")
+    p.add_argument("--detecciones", action="store_true", help="Guardar las detecciones de cada ventana")
+    p.add_argument("--salida", default=os.getenv("OUTPUTPATH"), help="Raíz de salida (default: OUTPUTPATH)")
+    args = p.parse_args(argv)
+    if not args.salida:
+        p.error("falta la raíz de salida: --salida o OUTPUTPATH")
+
+    import detection
+    import catalogo as catalogo_runs
+
+    fuente = FuenteContinua(args.fuente, fps=args.fps, tiempo_real=args.tiempo_real, creciente=args.creciente,
+                            fin_s=args.fin_s, reintentos=args.reintentos)
+    nombre = args.id or os.path.splitext(os.path.basename(str(args.fuente).rstrip("/")))[0] or "camara"
+    run_dir = os.path.join(args.salida, procesamiento.nuevo_video_id(nombre))
+    procesamiento.touch(os.path.join(run_dir, "_RUNNING"))
+    catalogo = catalogo_runs.desde_entorno()
+    if catalogo is not None:
+        catalogo.registrar_inicio(run_dir, str(args.fuente))
+
+    monitor = None
+    try:
+        detector = detection.Detection()
+        monitor = MonitorContinuo(detector, run_dir, ventana_s=args.ventana,
+                                  guardar_detecciones=args.detecciones, catalogo=catalogo)
+        datos = monitor.correr(fuente)
+        procesamiento.touch(os.path.join(run_dir, "_SUCCESS"))
+        if catalogo is not None:
+            catalogo.registrar_run(run_dir, str(args.fuente), "ok", datos, **monitor.ultimo)
+    except Exception:
+        # También si falla la carga de modelos: la fila no queda en "running"
+        if catalogo is not None:
+            if monitor is not None:
+                catalogo.registrar_run(run_dir, str(args.fuente), "error", monitor.metricas.resumen(),
+                                       **monitor.ultimo)
+            else:
+                catalogo.registrar_run(run_dir, str(args.fuente), "error")
+        raise
+    finally:
+        procesamiento.unlink(os.path.join(run_dir, "_RUNNING"))
+        fuente.release()
+        if catalogo is not None:
+            catalogo.cerrar()
+    print(f"Modo continuo terminado: {monitor.ventanas} ventanas en {run_dir}")
+    return run_dir
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+# FORMATO BINARIO COLUMNAR DE LAS DETECCIONES Y CARGADOR ÚNICO PARA TODOS LOS CONSUMIDORES.
+"""
+Las detecciones se guardan en /Output/video/detections.npz (sin comprimir), una columna por
+campo, más metadatos escalares (ej. fps):
+
+    frame: int32   índice de frame (arranca en 1)
+    cx, cy: float32 centro de la caja en píxeles
+    w, h: float32   ancho y alto de la caja
+    conf: float32   confianza del modelo (o del seguimiento, si tracked=1)
+    tracked: uint8  0 = punto detectado por YOLO, 1 = punto seguido con flujo óptico
+    id: int32       bomba a la que pertenece la caja (solo en modo multi-bomba, MULTIPUMP=1)
+
+El detections.txt con formato "(frame, cy)" queda solo como exportación opcional
+(DETECTIONSTXT=1). cargar() acepta ambos formatos, así bpm, on_off y graficador leen igual
+corridas nuevas y viejas.
+
+Durante la detección de videos largos se guarda además checkpoint.npz con el mismo formato
+y el último frame procesado en los metadatos, para poder reanudar después de una caída.
+"""
+import os
+import re
+import numpy as np
+
+NOMBRE = "detections.npz"
+NOMBRE_TXT = "detections.txt"
+NOMBRE_CHECKPOINT = "checkpoint.npz"
+
+COLUMNAS = {
+    "frame": np.int32,
+    "cx": np.float32,
+    "cy": np.float32,
+    "w": np.float32,
+    "h": np.float32,
+    "conf": np.float32,
+    "tracked": np.uint8,
+}
+
+COLUMNA_ID = "id"  # columna opcional, después de las de COLUMNAS
+
+_LINEA_TXT = re.compile(r"\((\d+),\s*([0-9.]+)\)")
+
+
+def vacias():
+    """Columnas vacías con los tipos correctos."""
+    return {k: np.zeros(0, dtype=t) for k, t in COLUMNAS.items()}
+
+
+def desde_filas(filas, con_id=False):
+    """Convierte [(frame, cx, cy, w, h, conf, tracked[, id]), ...] en columnas."""
+    if not filas:
+        columnas = vacias()
+        if con_id:
+            columnas[COLUMNA_ID] = np.zeros(0, dtype=np.int32)
+        return columnas
+    arr = np.asarray(filas, dtype=np.float64).reshape(len(filas), -1)
+    columnas = {k: arr[:, i].astype(t) for i, (k, t) in enumerate(COLUMNAS.items())}
+    if con_id or arr.shape[1] > len(COLUMNAS):
+        columnas[COLUMNA_ID] = arr[:, len(COLUMNAS)].astype(np.int32)
+    return columnas
+
+
+def guardar(path, columnas, **meta):
+    """
+    Escribe las columnas (y metadatos escalares) en un .npz sin comprimir.
+
+    Se escribe a un temporal y se renombra, así ningún lector ve un archivo a medias.
+    """
+    datos = {k: np.asarray(columnas[k], dtype=t) for k, t in COLUMNAS.items()}
+    for k, v in columnas.items():
+        if k not in datos:
+            datos[k] = np.asarray(v)  # columnas extra
+    for k, v in meta.items():
+        datos[f"meta_{k}"] = np.asarray(v)
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, **datos)
+    os.replace(tmp, path)
+    return path
+
+
+def cargar(path):
+    """
+    Carga las detecciones de un .npz (o de un detections.txt viejo).
+
+    Returns:
+        (columnas, meta): dict de arrays por columna y dict de metadatos
+    """
+    path = str(path)
+    if path.endswith(".txt"):
+        return _cargar_txt(path), {}
+
+    with np.load(path) as z:
+        columnas = {k: z[k] for k in z.files if not k.startswith("meta_")}
+        meta = {k[len("meta_"):]: z[k].item() for k in z.files if k.startswith("meta_")}
+    return columnas, meta
+
+
+def cargar_meta(path):
+    """Solo los metadatos (ej. fps) de un .npz, sin leer las columnas; {} para un .txt."""
+    path = str(path)
+    if path.endswith(".txt"):
+        return {}
+    with np.load(path) as z:
+        return {k[len("meta_"):]: z[k].item() for k in z.files if k.startswith("meta_")}
+
+
+def a_filas(columnas):
+    """Inversa de desde_filas: columnas -> [(frame, cx, cy, w, h, conf, tracked[, id]), ...]."""
+    claves = list(COLUMNAS) + ([COLUMNA_ID] if COLUMNA_ID in columnas else [])
+    return list(zip(*(columnas[k].tolist() for k in claves)))
+
+
+def guardar_checkpoint(run_dir, filas, ultimo_frame, con_id=False, **meta):
+    """Guarda las detecciones acumuladas y el último frame procesado (escritura atómica)."""
+    path = os.path.join(run_dir, NOMBRE_CHECKPOINT)
+    return guardar(path, desde_filas(filas, con_id=con_id), ultimo_frame=ultimo_frame, **meta)
+
+
+def cargar_checkpoint(run_dir):
+    """
+    Returns:
+        (filas, meta) del checkpoint del run_dir, o (None, {}) si no hay uno válido
+    """
+    path = os.path.join(run_dir, NOMBRE_CHECKPOINT)
+    if not os.path.exists(path):
+        return None, {}
+    try:
+        columnas, meta = cargar(path)
+    except (OSError, ValueError, KeyError) as e:
+        print("Checkpoint ilegible, se descarta:", e)
+        return None, {}
+    if "ultimo_frame" not in meta:
+        return None, {}
+    return a_filas(columnas), meta
+
+
+def borrar_checkpoint(run_dir):
+    path = os.path.join(run_dir, NOMBRE_CHECKPOINT)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def cargar_puntos(path):
+    """Carga solo (frames, ys) como arrays de numpy, que es lo que usan bpm y on_off."""
+    columnas, _ = cargar(path)
+    return columnas["frame"].astype(int), columnas["cy"].astype(float)
+
+
+def tiene_ids(path):
+    """Indica si el archivo es de una corrida multi-bomba (tiene columna id)."""
+    path = str(path)
+    if path.endswith(".txt"):
+        return False
+    with np.load(path) as z:
+        return COLUMNA_ID in z.files
+
+
+def series_por_id(path):
+    """
+    Separa las detecciones por bomba (columna id) en {id: (frames, ys)}, ordenado por id.
+    Un archivo sin columna id es una sola serie con id 0.
+    """
+    columnas, _ = cargar(path)
+    frames, ys = columnas["frame"].astype(int), columnas["cy"].astype(float)
+    if COLUMNA_ID not in columnas:
+        return {0: (frames, ys)}
+    ids = columnas[COLUMNA_ID]
+    return {int(i): (frames[ids == i], ys[ids == i]) for i in np.unique(ids)}
+
+
+def _cargar_txt(path):
+    frames, ys = [], []
+    with open(path) as f:
+        for line in f:
+            m = _LINEA_TXT.match(line.strip())
+            if m:
+                frames.append(int(m.group(1)))
+                ys.append(float(m.group(2)))
+    columnas = {k: np.full(len(frames), np.nan, dtype=t) for k, t in COLUMNAS.items()
+                if k not in ("frame", "cy", "tracked")}
+    columnas["tracked"] = np.zeros(len(frames), dtype=COLUMNAS["tracked"])
+    columnas["frame"] = np.array(frames, dtype=COLUMNAS["frame"])
+    columnas["cy"] = np.array(ys, dtype=COLUMNAS["cy"])
+    return columnas
+
+
+def exportar_txt(columnas, path):
+    """Exporta en el formato de texto histórico: una línea "(frame, cy)" por detección."""
+    with open(path, "w") as f:
+        # cy se formatea como float32 para no imprimir ruido de la conversión a float64
+        for frame, cy in zip(columnas["frame"].tolist(), columnas["cy"]):
+            f.write(f"({frame}, {cy!s})\n")
+    return path
@@ -1,10 +1,20 @@
 # SE ENCARGA DE LA DETECCION DE LOS RODHEADS.
 import os
 import shutil
+import subprocess
+import time
+import numpy as np
 import torch
 from dotenv import load_dotenv
-from ultralytics import YOLO
 import cv2
+from escritor import EscritorVideo
+from lector import LectorFrames
+from roi import RegionInteres
+from seguimiento import SeguidorFlujo, AsignadorIds
+import detecciones
+import muestreo
+import backends
+import metricas
 
 class Detection:
     def __init__(self):
@@ -14,112 +24,758 @@ class Detection:
         self.OUTPUT_PATH = os.getenv("OUTPUTPATH")      # raíz /outputs
         self.OUTPUT_FAIL = os.getenv("OUTPUTFAIL")
         self.COCOPATH = os.getenv("COCOPATH")
+        # Backend de inferencia: torch (pesos .pt) | onnx | openvino (exportados y cacheados)
+        self.BACKEND = os.getenv("BACKEND", "torch").lower()
+        self.PRECISION = os.getenv("PRECISION", "fp32").lower()
+        self.EXPORT_CACHE = os.getenv("EXPORTCACHE") or None
+        self.CALIB_DATA = os.getenv("CALIBDATA") or None  # dataset YAML para calibrar INT8
+        backends.validar(self.BACKEND, self.PRECISION, self.CALIB_DATA)
+        # Tamaño de inferencia a frame completo (default de ultralytics)
+        self.IMGSZ = int(os.getenv("IMGSZ", "640"))
+        # Frames por llamada a cada modelo (1 = frame a frame)
+        self.BATCH_SIZE = max(1, int(os.getenv("BATCHSIZE", "1")))
+        # Overlay COCO (solo se usa para dibujar el video anotado):
+        #   all    -> COCO en todos los frames
+        #   stride -> COCO cada COCOSTRIDE frames, reutilizando las últimas cajas en el medio
+        #   sample -> COCO cada COCOSTRIDE frames, dibujado solo en esos frames
+        #   off    -> sin COCO
+        self.COCO_MODE = os.getenv("COCOMODE", "all").lower()
+        self.COCO_STRIDE = max(1, int(os.getenv("COCOSTRIDE", "5")))
+        if self.COCO_MODE not in ("all", "stride", "sample", "off"):
+            raise ValueError(f"COCOMODE inválido: {self.COCO_MODE}")
+        # Modo "solo métricas": no se genera el video anotado (ni se corre COCO)
+        self.HEADLESS = os.getenv("HEADLESS", "0") == "1"
+        # Video anotado: preview reescalado, a menos fps o solo keyframes
+        self.VIDEO_MODE = os.getenv("VIDEOMODE", "video").lower()
+        if self.VIDEO_MODE not in ("video", "keyframes"):
+            raise ValueError(f"VIDEOMODE inválido: {self.VIDEO_MODE} (opciones: video, keyframes)")
+        self.VIDEO_SCALE = float(os.getenv("VIDEOSCALE", "1.0"))
+        self.VIDEO_FPS_DIV = max(1, int(os.getenv("VIDEOFPSDIV", "1")))
+        self.KEYFRAME_EVERY = max(1, int(os.getenv("KEYFRAMEEVERY", "30")))
+        self.VIDEO_QUEUE = max(1, int(os.getenv("VIDEOQUEUE", "32")))
+        # Decodificación en un hilo aparte: lotes decodificados por adelantado y reutilización
+        # de los buffers de frame (DECODEBUFFERS=0 -> un array nuevo por frame)
+        self.DECODE_QUEUE = max(1, int(os.getenv("DECODEQUEUE", "4")))
+        self.DECODE_BUFFERS = os.getenv("DECODEBUFFERS", "1") == "1"
+        # Exportar también el detections.txt "(frame, cy)" además del .npz
+        self.DETECTIONS_TXT = os.getenv("DETECTIONSTXT", "0") == "1"
+        # ROI: después de aprender la zona del rodhead se infiere solo sobre ese recorte
+        self.ROI_MODE = os.getenv("ROIMODE", "0") == "1"
+        self.ROI_MARGIN = float(os.getenv("ROIMARGIN", "0.5"))
+        self.ROI_FRAMES = int(os.getenv("ROIFRAMES", "30"))
+        self.ROI_CONF = float(os.getenv("ROICONF", "0.4"))
+        # Detectar y seguir: YOLO cada TRACKK frames (o cuando el seguimiento pierde
+        # confianza) y flujo óptico en el medio. TRACKK=1 -> YOLO en todos los frames
+        self.TRACK_K = max(1, int(os.getenv("TRACKK", "1")))
+        self.TRACK_CONF = float(os.getenv("TRACKCONF", "0.5"))
+        # Muestreo: inferir 1 de cada N frames ("auto" lo deriva del fps y del rango de BPM)
+        self.SAMPLING = os.getenv("SAMPLING", "1")
+        self.BPM_MAX = float(os.getenv("BPMMAX", "10"))
+        self.BPM_TOLERANCE = float(os.getenv("BPMTOLERANCE", "0.05"))
+        # Checkpoint cada N frames del video (0 = sin checkpoints): permite reanudar
+        # un video largo después de una caída en lugar de volver a procesarlo completo
+        self.CHECKPOINT_EVERY = max(0, int(os.getenv("CHECKPOINTEVERY", "0")))
+        # Videos largos (al menos CHUNKMIN frames) en CHUNKS rangos de frames procesados en
+        # paralelo por procesos aparte, cada uno con sus modelos (CHUNKS<=1 -> desactivado)
+        self.CHUNKS = max(1, int(os.getenv("CHUNKS", "1")))
+        self.CHUNK_MIN = max(1, int(os.getenv("CHUNKMIN", "9000")))
+        self.WORKERS = max(1, int(os.getenv("WORKERS", "1")))  # workers del planificador en esta máquina
+        self._fragmentos = None  # pool de procesos, se crea con el primer video largo
+        # Multi-bomba: todas las cajas de rodhead de cada frame, con un id estable por bomba
+        # (columna id de detections.npz); el análisis se hace por bomba
+        self.MULTI_PUMP = os.getenv("MULTIPUMP", "0") == "1"
+        self.MULTI_DIST = float(os.getenv("MULTIDIST", "1.5"))
+        self.MULTI_LOST = int(os.getenv("MULTILOST", "30"))
+        if self.MULTI_PUMP and (self.TRACK_K > 1 or self.ROI_MODE or self.CHUNKS > 1):
+            # El seguimiento por flujo óptico y la ROI siguen a una sola caja, y los ids
+            # tienen que asignarse recorriendo el video en orden
+            print("MULTIPUMP=1: se desactivan TRACKK, ROIMODE y CHUNKS")
+            self.TRACK_K, self.ROI_MODE, self.CHUNKS = 1, False, 1
+        self._stride = 1  # stride del video en curso
+        self._metricas = metricas.MetricasRun()  # métricas del video en curso
 
-    def detectar(self, video_id=None):
-        nombre_video = os.listdir(self.PROCESSING_PATH)[0]
-        video_path = os.path.join(self.PROCESSING_PATH, nombre_video)
+        # Verificar disponibilidad de GPU (una sola vez por proceso)
+        self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
+        if self.device == 'cuda' and self.BACKEND != "torch":
+            # Los modelos exportados (ONNX / OpenVINO) se usan para correr en CPU
+            self.device = 'cpu'
+            print(f"Usando CPU con backend {self.BACKEND} ({self.PRECISION})")
+        elif self.device == 'cuda':
+            print(f"Usando GPU: {torch.cuda.get_device_name(0)}")
+        elif self.BACKEND != "torch":
+            print(f"GPU no disponible, usando CPU con backend {self.BACKEND} ({self.PRECISION})")
+        else:
+            print("Advertencia: GPU no disponible, usando CPU (será más lento)")
 
-        # Extraer nombre sin extensión para crear carpeta (o usar el proporcionado)
-        if video_id is None:
-            video_id = os.path.splitext(nombre_video)[0]
-        run_dir = os.path.join(self.OUTPUT_PATH, video_id)  # /Output/video
-        os.makedirs(run_dir, exist_ok=True)
+        # Los modelos se cargan una vez y se reutilizan para todos los videos
+        self.model = None
+        self.coco = None
+        self._mtimes = {}
+        self._t_carga = 0.0  # tiempo de carga aún no imputado a ningún video
+        self.cargar_modelos()
 
-        # Ruta para detecciones: /Output/video/detections.txt
-        output_file = os.path.join(run_dir, "detections.txt")
+    def _mtime(self, path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return None
 
-        # Verificar disponibilidad de GPU
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        if device == 'cuda':
-            print(f"Usando GPU: {torch.cuda.get_device_name(0)}")
+    def cargar_modelos(self):
+        """Carga (o recarga) los pesos del rodhead y de COCO y hace el warm-up."""
+        t0 = time.perf_counter()
+        model = self._cargar_yolo(self.MODEL_PATH)
+        # COCO solo se usa para el video anotado: en headless/off ni se carga
+        coco = self._cargar_yolo(self.COCOPATH) if self._usa_coco() else None
+        # Mover modelos a GPU si está disponible (los exportados corren en CPU)
+        if self.device == 'cuda' and self.BACKEND == "torch":
+            model.to(self.device)
+            if coco is not None:
+                coco.to(self.device)
+
+        self.model, self.coco = model, coco
+        self._mtimes = {self.MODEL_PATH: self._mtime(self.MODEL_PATH)}
+        self._hash_modelo = backends.hash_pesos(self.MODEL_PATH)
+        if coco is not None:
+            self._mtimes[self.COCOPATH] = self._mtime(self.COCOPATH)
+        self._warmup()
+        self._t_carga += time.perf_counter() - t0
+        print(f"Modelos cargados: {', '.join(self._mtimes)}")
+
+    def _cargar_yolo(self, pesos):
+        return backends.cargar_yolo(pesos, backend=self.BACKEND, imgsz=self.IMGSZ,
+                                    precision=self.PRECISION, cache_dir=self.EXPORT_CACHE,
+                                    calib=self.CALIB_DATA)
+
+    def firma(self):
+        """
+        Todo lo que determina el contenido de detections.npz para un mismo video: los pesos
+        del rodhead y la configuración de inferencia, muestreo, ROI y seguimiento (COCO y el
+        video anotado no cambian las detecciones). Es parte de la clave del cache.
+        """
+        return {
+            "modelo": self._hash_modelo,
+            "backend": self.BACKEND,
+            "precision": self.PRECISION,
+            **({"calib": backends.hash_pesos(self.CALIB_DATA)} if self.PRECISION == "int8" else {}),
+            "imgsz": self.IMGSZ,
+            "sampling": self.SAMPLING,
+            "bpm_max": self.BPM_MAX,
+            "bpm_tolerance": self.BPM_TOLERANCE,
+            "roi": [self.ROI_MODE, self.ROI_MARGIN, self.ROI_FRAMES, self.ROI_CONF] if self.ROI_MODE else None,
+            "track": [self.TRACK_K, self.TRACK_CONF] if self.TRACK_K > 1 else None,
+            **({"multi": [self.MULTI_DIST, self.MULTI_LOST]} if self.MULTI_PUMP else {}),
+        }
+
+    def _usa_coco(self):
+        return not self.HEADLESS and self.COCO_MODE != "off"
+
+    def _warmup(self):
+        # Una inferencia en vacío para que la primera del video no pague la inicialización
+        dummy = np.zeros((self.IMGSZ, self.IMGSZ, 3), dtype=np.uint8)
+        self.model.predict(dummy, imgsz=self.IMGSZ, device=self.device, verbose=False)
+        if self.coco is not None:
+            self.coco.predict(dummy, imgsz=self.IMGSZ, device=self.device, verbose=False)
+
+    def recargar_si_cambio(self):
+        """Recarga los modelos si algún archivo de pesos cambió en disco.
+
+        Returns:
+            bool: True si hubo recarga
+        """
+        cambiados = [p for p, m in self._mtimes.items() if self._mtime(p) != m]
+        if not cambiados:
+            return False
+        print(f"Pesos modificados en disco, recargando: {', '.join(cambiados)}")
+        try:
+            self.cargar_modelos()
+        except Exception as e:
+            # Archivo a medio copiar, etc.: se sigue con los modelos anteriores y se reintenta luego
+            print("Error recargando modelos, se mantienen los anteriores:", e)
+            return False
+        return True
+
+    def _leer_lotes(self, cap, tam, stride=1, inicio=0, fin=None):
+        """Decodifica el video en un hilo aparte y agrupa los frames en lotes [(frame_idx, frame), ...].
+
+        Los índices arrancan en 1, igual que cuando se iteraba el stream de ultralytics.
+        Con stride > 1 solo se decodifican los frames 1, 1 + stride, ...; el resto se
+        saltea con grab() (avanza el stream sin convertir la imagen). Al reanudar, `inicio`
+        es el último frame ya procesado y cap tiene que estar posicionado justo después.
+        Con `fin` se corta en ese frame (inclusive), para procesar solo un rango.
+        """
+        buffers = 0
+        if self.DECODE_BUFFERS:
+            # Frames que pueden seguir vivos mientras se decodifica el siguiente: lotes en la
+            # cola y en curso de ambos lados, más la cola del escritor de video
+            buffers = (self.DECODE_QUEUE + 3) * tam + self.VIDEO_QUEUE + 2
+        return LectorFrames(cap, tam, stride=stride, inicio=inicio, fin=fin, tam_cola=self.DECODE_QUEUE,
+                            buffers=buffers, metricas_run=self._metricas)
+
+    def _muestra(self, frame_idx):
+        """Número de muestra (0, 1, 2...) de un frame inferido, con el stride del video en curso."""
+        return (frame_idx - 1) // self._stride
+
+    def _cajas_rodhead(self, r_custom, offset=None, todas=True):
+        """Devuelve [(cx, cy, w, h, conf), ...] de los rodheads (class_id=1) del resultado.
+
+        Si el resultado viene de un recorte, `offset` = (x0, y0) lo lleva al frame completo.
+        Con todas=False corta en el primero.
+        """
+        cajas = []
+        if r_custom.boxes is None or len(r_custom.boxes) == 0:
+            return cajas
+        for box in r_custom.boxes:
+            if int(box.cls[0]) != 1:
+                continue
+
+            x1, y1, x2, y2 = map(float, box.xyxy[0])
+            if offset is not None:
+                x1, x2 = x1 + offset[0], x2 + offset[0]
+                y1, y2 = y1 + offset[1], y2 + offset[1]
+            cx = (x1 + x2) / 2
+            cy = (y1 + y2) / 2
+            cajas.append((cx, cy, x2 - x1, y2 - y1, float(box.conf[0])))
+            if not todas:
+                break
+        return cajas
+
+    def _caja_rodhead(self, r_custom, offset=None):
+        """Devuelve (cx, cy, w, h, conf) del primer rodhead del resultado, o None."""
+        cajas = self._cajas_rodhead(r_custom, offset, todas=False)
+        return cajas[0] if cajas else None  # un solo rodhead por frame (sin MULTIPUMP)
+
+    def _predict_rodhead(self, frames, imgsz=None):
+        self._metricas.contar("frames_rodhead", len(frames))
+        with self._metricas.etapa("rodhead"):
+            return self.model.predict(
+                frames,
+                imgsz=imgsz or self.IMGSZ,
+                save=False,         # <- clave: no guardar el video "solo rodhead"
+                classes=[0, 1],   # detecta ambas clases. 1 es  rodhead y 0 es aib
+                device=self.device,
+                verbose=False
+            )
+
+    def _inferir_rodhead(self, frames, roi=None):
+        """
+        Corre el modelo del rodhead sobre un lote de frames, recortado a la ROI si hay una.
+
+        Returns:
+            list: [(r_custom, caja, offset), ...] en el orden de los frames; caja es
+            (cx, cy, w, h, conf) en coordenadas del frame completo (o None) y offset es
+            (x0, y0) si r_custom corresponde a un recorte
+        """
+        region = roi.recorte() if roi is not None else None
+        if region is None:
+            salida = []
+            for r in self._predict_rodhead(frames):
+                caja = self._caja_rodhead(r)
+                if roi is not None:
+                    roi.observar(caja)
+                salida.append((r, caja, None))
+            return salida
+
+        x0, y0, x1, y1 = region
+        recortes = [frame[y0:y1, x0:x1] for frame in frames]
+        salida = []
+        for frame, r in zip(frames, self._predict_rodhead(recortes, imgsz=roi.imgsz(self.IMGSZ))):
+            caja = self._caja_rodhead(r, offset=(x0, y0))
+            if roi.confiable(caja):
+                roi.ampliar(caja)
+                salida.append((r, caja, (x0, y0)))
+                continue
+            # Se perdió el rodhead (o bajó la confianza) en el recorte: re-detección a frame completo
+            if roi.recorte() is not None:
+                roi.perder()
+            r = self._predict_rodhead([frame])[0]
+            caja = self._caja_rodhead(r)
+            roi.observar(caja)
+            salida.append((r, caja, None))
+        return salida
+
+    def _detectar_y_seguir(self, lote, roi, seguidor):
+        """
+        Como _inferir_rodhead, pero YOLO corre solo en los frames programados (cada TRACK_K,
+        en un único lote) y en el resto se sigue la caja con flujo óptico. Si la confianza
+        del seguimiento cae por debajo de TRACK_CONF, o no hay seguimiento activo, se vuelve
+        a detectar en ese frame.
+
+        Returns:
+            list: [(r_custom, caja, offset), ...]; r_custom es None en los frames seguidos
+        """
+        programados = [i for i, (frame_idx, _) in enumerate(lote) if self._muestra(frame_idx) % self.TRACK_K == 0]
+        detectados = {}
+        if programados:
+            res = self._inferir_rodhead([lote[i][1] for i in programados], roi)
+            detectados = dict(zip(programados, res))
+
+        salida = []
+        for i, (_, frame) in enumerate(lote):
+            if i in detectados:
+                r_custom, caja, offset = detectados[i]
+            else:
+                caja = None
+                if seguidor.activo():
+                    with self._metricas.etapa("seguimiento"):
+                        caja = seguidor.actualizar(frame)
+                if caja is not None and caja[4] >= self.TRACK_CONF:
+                    self._metricas.contar("frames_seguidos")
+                    salida.append((None, caja, None))
+                    continue
+                # Seguimiento poco confiable o sin objetivo (no se pudo iniciar, ej. caja sin
+                # textura): re-detección en este frame, como con confianza 0
+                r_custom, caja, offset = self._inferir_rodhead([frame], roi)[0]
+            seguidor.iniciar(frame, caja)
+            salida.append((r_custom, caja, offset))
+        return salida
+
+    def _corre_coco(self, frame_idx, out):
+        """Indica si la política de overlay corre COCO en este frame."""
+        if out is None:
+            return False
+        if self.COCO_MODE == "all":
+            # Solo hace falta en los frames que efectivamente se escriben
+            return out.quiere(self._muestra(frame_idx))
+        if self.COCO_MODE == "off":
+            return False
+        toca = self._muestra(frame_idx) % self.COCO_STRIDE == 0
+        if self.COCO_MODE == "sample":
+            # Se dibuja solo en el frame donde corre: si no se escribe, no hace falta
+            return toca and out.quiere(self._muestra(frame_idx))
+        return toca
+
+    def _seguidor_y_roi(self, size):
+        seguidor = SeguidorFlujo() if self.TRACK_K > 1 else None
+        roi = None
+        if self.ROI_MODE:
+            roi = RegionInteres(size, margen=self.ROI_MARGIN,
+                                frames_aprendizaje=self.ROI_FRAMES, conf_min=self.ROI_CONF)
+        return seguidor, roi
+
+    def _asignador(self):
+        return AsignadorIds(self.MULTI_DIST, self.MULTI_LOST) if self.MULTI_PUMP else None
+
+    def _procesar_lote(self, lote, out, roi, seguidor, centros, ultimo_coco, desde=0, asignador=None):
+        """
+        Inferencia del rodhead (y COCO para el overlay) sobre un lote: agrega las detecciones
+        a `centros` y encola los frames anotados en `out`. Los frames con índice <= desde solo
+        sirven para calentar la ROI y el seguimiento (no se registran ni se escriben).
+        Con `asignador` (MULTIPUMP) se registran todas las cajas, cada una con su id.
+
+        Returns:
+            Últimas cajas COCO (para reutilizar en modo stride)
+        """
+        m = self._metricas
+        frames = [frame for _, frame in lote]
+
+        if asignador is not None:
+            rodheads = [(r, self._cajas_rodhead(r), None) for r in self._predict_rodhead(frames)]
+        elif seguidor is None:
+            rodheads = self._inferir_rodhead(frames, roi)
         else:
-            print("Advertencia: GPU no disponible, usando CPU (será más lento)")
+            rodheads = self._detectar_y_seguir(lote, roi, seguidor)
+
+        # Correr COCO SOLO para dibujar (NO escribir detecciones), únicamente
+        # sobre los frames que pide la política de overlay
+        r_cocos = [None] * len(lote)
+        if self._usa_coco():
+            pos = [i for i, (frame_idx, _) in enumerate(lote)
+                   if frame_idx > desde and self._corre_coco(frame_idx, out)]
+            if pos:
+                # COCO ids típicos: 0=person, 2=car, 7=truck
+                m.contar("frames_coco", len(pos))
+                with m.etapa("coco"):
+                    res = self.coco.predict(
+                        [frames[i] for i in pos],
+                        imgsz=self.IMGSZ,
+                        conf=0.35,
+                        classes=[0, 2, 7],
+                        device=self.device,
+                        verbose=False
+                    )
+                for i, r in zip(pos, res):
+                    r_cocos[i] = r
+
+        for (frame_idx, frame), (r_custom, caja, offset), r_coco in zip(lote, rodheads, r_cocos):
+            if frame_idx <= desde:
+                continue
+            # 1) Registrar SOLO rodhead (class_id=1) en detections.npz,
+            # marcando si el punto salió del detector o del seguimiento
+            seguido = r_custom is None
+            etiquetas = None
+            if asignador is not None:
+                ids = asignador.asignar(self._muestra(frame_idx), caja)
+                centros.extend((frame_idx, *c, 0, i) for c, i in zip(caja, ids))
+                etiquetas = [(f"bomba {i}", c[0], c[1]) for c, i in zip(caja, ids)]
+                caja = None
+            elif caja is not None:
+                centros.append((frame_idx, *caja, int(seguido)))
+
+            if out is None or not out.quiere(self._muestra(frame_idx)):
+                continue
 
-        model = YOLO(self.MODEL_PATH)
-        # Mover modelo a GPU si está disponible
-        if device == 'cuda':
-            model.to(device)
+            # 2) Encolar ambas salidas para dibujarlas sobre el mismo frame
+            if r_coco is not None:
+                ultimo_coco = r_coco
+            elif self.COCO_MODE == "stride":
+                r_coco = ultimo_coco
 
-        coco = YOLO(self.COCOPATH)
+            out.escribir(frame_idx, r_custom, r_coco, frame=frame, offset=offset,
+                         caja_seguida=caja if seguido else None, etiquetas=etiquetas)
+        return ultimo_coco
 
-        if device == 'cuda':
-            coco.to(device)
+    def _posicionar(self, cap, video_path, inicio):
+        """Deja cap listo para leer el frame siguiente a `inicio` (índice desde 1)."""
+        if inicio <= 0:
+            return cap
+        cap.set(cv2.CAP_PROP_POS_FRAMES, inicio)
+        if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == inicio:
+            return cap
+        # El contenedor no soporta seek exacto: se avanza desde el principio sin decodificar
+        cap.release()
+        cap = cv2.VideoCapture(video_path)
+        for _ in range(inicio):
+            if not cap.grab():
+                break
+        return cap
 
+    def _segmentado(self):
+        return self.CHECKPOINT_EVERY > 0 and self.VIDEO_MODE == "video"
 
+    def _ruta_video_yolo(self, yolo_dir, video_id, parte=None):
+        if self.VIDEO_MODE == "keyframes":
+            return os.path.join(yolo_dir, "keyframes")
+        if parte is None:
+            return os.path.join(yolo_dir, f"{video_id}.avi")
+        return os.path.join(yolo_dir, f"{video_id}_parte{parte:03d}.avi")
+
+    def _abrir_escritor(self, path, fps, size, m):
+        return EscritorVideo(
+            path, fps, size,
+            escala=self.VIDEO_SCALE,
+            fps_div=self.VIDEO_FPS_DIV,
+            modo=self.VIDEO_MODE,
+            keyframe_cada=self.KEYFRAME_EVERY,
+            tam_cola=self.VIDEO_QUEUE,
+            metricas_run=m
+        )
+
+    def _unir_segmentos(self, yolo_dir, video_id, partes):
+        """
+        Escribe la lista de concatenación de ffmpeg con los segmentos del video anotado y, si
+        ffmpeg está instalado, los une (sin recodificar) en <video_id>.avi.
+
+        Returns:
+            str: Ruta del video unido, o de la lista si quedó segmentado
+        """
+        lista = os.path.join(yolo_dir, "segmentos.txt")
+        nombres = [os.path.basename(self._ruta_video_yolo(yolo_dir, video_id, i)) for i in range(partes)]
+        with open(lista, "w") as f:
+            for nombre in nombres:
+                f.write(f"file '{nombre}'\n")
+        if shutil.which("ffmpeg") is None:
+            return lista
+        destino = self._ruta_video_yolo(yolo_dir, video_id)
         try:
-            centros = []  # [(frame, cx, cy)]
+            subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                            "-i", lista, "-c", "copy", destino], check=True)
+        except (OSError, subprocess.CalledProcessError) as e:
+            print("No se pudieron unir los segmentos del video anotado:", e)
+            return lista
+        for nombre in nombres:
+            os.remove(os.path.join(yolo_dir, nombre))
+        os.remove(lista)
+        return destino
 
-             # Preparar writer del video final combinado
-            yolo_dir = os.path.join(run_dir, "yolo")
-            os.makedirs(yolo_dir, exist_ok=True)
+    def _fragmentar(self, n_frames, run_dir, stride):
+        """
+        ¿Se reparte este video entre procesos? Nunca al reanudar desde un checkpoint, ni
+        cuando el video entra en un solo rango (n_frames <= stride con un CHUNKMIN bajo).
+        """
+        import fragmentos
+        if self.CHUNKS <= 1 or n_frames < self.CHUNK_MIN:
+            return False
+        if len(fragmentos.rangos(n_frames, self.CHUNKS, stride)) < 2:
+            return False
+        return not os.path.exists(os.path.join(run_dir, detecciones.NOMBRE_CHECKPOINT))
+
+    def _solape(self, stride):
+        """
+        Frames previos a cada rango que se procesan solo para calentar la ROI y el
+        seguimiento (sin ROI ni seguimiento cada frame es independiente y no hace falta).
+        """
+        muestras = 0
+        if self.ROI_MODE:
+            muestras = max(muestras, self.ROI_FRAMES)
+        if self.TRACK_K > 1:
+            muestras = max(muestras, self.TRACK_K)
+        return muestras * stride
+
+    def detectar_rango(self, video_path, inicio, fin, stride, salida_video=None, solape=0):
+        """
+        Procesa solo los frames inicio+1..fin del video (fin=None: hasta el final), con el
+        mismo muestreo que detectar(). Es lo que corre cada proceso en el modo por rangos.
+
+        Args:
+            inicio, fin: Límites del rango (múltiplos de stride, para no correr el muestreo)
+            salida_video: Video anotado (o carpeta de keyframes) del rango; None = headless
+            solape: Frames antes de `inicio` para calentar ROI/seguimiento (ver _solape)
+
+        Returns:
+            (centros, etapas, contadores): detecciones del rango y métricas para sumar al video
+        """
+        m = self._metricas = metricas.MetricasRun()
+        self.recargar_si_cambio()
+        self._stride = stride
+        arranque = max(0, inicio - solape)
+
+        cap = cv2.VideoCapture(video_path)
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        cap = self._posicionar(cap, video_path, arranque)
+        out = self._abrir_escritor(salida_video, fps / stride, size, m) if salida_video else None
+        seguidor, roi = self._seguidor_y_roi(size)
+
+        centros = []
+        ultimo_coco = None
+        try:
+            with self._leer_lotes(cap, self.BATCH_SIZE, stride, arranque, fin) as lotes:
+                for lote in lotes:
+                    ultimo_coco = self._procesar_lote(lote, out, roi, seguidor, centros, ultimo_coco, desde=inicio)
+        finally:
+            cap.release()
+            if out is not None:
+                with m.etapa("espera_escritor"):
+                    out.cerrar()
+        # Los frames de calentamiento ya los cuenta el rango anterior
+        m.contar("frames_video", arranque - inicio)
+        return centros, m.etapas, m.contadores
+
+    def stride_para(self, fps):
+        """Stride de inferencia para una fuente de `fps` (SAMPLING, acotado por BPMMAX)."""
+        return muestreo.resolver_stride(self.SAMPLING, fps, bpm_max=self.BPM_MAX,
+                                        tolerancia=self.BPM_TOLERANCE)
+
+    def detectar_lotes(self, cap, stride, metricas_run=None):
+        """
+        Detección incremental para fuentes que no terminan (cámara, stream, archivo que
+        crece): lee `cap` lote a lote con el mismo pipeline que detectar() y entrega las
+        detecciones de cada lote apenas salen. Sin video anotado, checkpoints ni
+        detections.npz; una sola bomba (no usa MULTIPUMP).
+
+        Args:
+            cap: Objeto con la interfaz de cv2.VideoCapture (read/grab/get/release); no se
+                libera acá
+            stride: Muestreo (ver stride_para)
+            metricas_run: metricas.MetricasRun donde acumular los tiempos por etapa
+
+        Yields:
+            (ultimo_frame, filas): último frame leído del lote (índice desde 1) y sus
+            detecciones [(frame, cx, cy, w, h, conf, tracked), ...]
+        """
+        self._metricas = metricas_run or metricas.MetricasRun()
+        self._stride = stride
+        size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+        seguidor, roi = self._seguidor_y_roi(size)
+        with self._leer_lotes(cap, self.BATCH_SIZE, stride) as lotes:
+            for lote in lotes:
+                filas = []
+                self._procesar_lote(lote, None, roi, seguidor, filas, None)
+                yield lote[-1][0], filas
+
+    def _detectar_fragmentado(self, video_path, video_id, yolo_dir, n_frames, stride, m):
+        """
+        Reparte el video en CHUNKS rangos de frames y los procesa en paralelo (fragmentos.py).
+        Cada rango escribe su parte del video anotado, que después se unen como los segmentos
+        de los checkpoints.
+
+        Returns:
+            (centros, video_yolo_salida)
+        """
+        import fragmentos
+        if self._fragmentos is None:
+            # Los núcleos se reparten entre todos los procesos: WORKERS workers x CHUNKS rangos
+            threads = max(1, (os.cpu_count() or 1) // (self.WORKERS * self.CHUNKS))
+            self._fragmentos = fragmentos.PoolFragmentos(self.CHUNKS, threads=threads)
+        rangos = fragmentos.rangos(n_frames, self.CHUNKS, stride)
+        print(f"  - {len(rangos)} rangos de ~{rangos[0][1] - rangos[0][0]} frames en paralelo")
+
+        if self.HEADLESS:
+            salidas = [None] * len(rangos)
+        else:
+            salidas = [self._ruta_video_yolo(yolo_dir, video_id, i) for i in range(len(rangos))]
+        with m.etapa("rangos"):
+            resultados = self._fragmentos.detectar(video_path, rangos, stride, salidas, self._solape(stride))
+
+        for _, etapas, contadores in resultados:
+            for nombre, segundos in etapas.items():
+                m.sumar(nombre, segundos)
+            for nombre, n in contadores.items():
+                m.contar(nombre, n)
+        centros = fragmentos.unir_filas([filas for filas, _, _ in resultados])
+
+        video_yolo_salida = None
+        if not self.HEADLESS:
+            if self.VIDEO_MODE == "video":
+                video_yolo_salida = self._unir_segmentos(yolo_dir, video_id, len(rangos))
+            else:
+                video_yolo_salida = salidas[0]  # keyframes: todos en la misma carpeta
+        return centros, video_yolo_salida
 
-            video_yolo_salida = os.path.join(yolo_dir, f"{video_id}.avi")
+    def _detectar_serie(self, cap, video_path, video_id, run_dir, yolo_dir, fps, size, stride, m):
+        """
+        Recorre el video en este proceso, con checkpoints y reanudación (ver CHECKPOINTEVERY).
 
+        Returns:
+            (centros, video_yolo_salida)
+        """
+        w, h = size
+        centros = []  # [(frame, cx, cy, w, h, conf, tracked)]
+        # Reanudar desde el checkpoint de una corrida anterior interrumpida (mismo run_dir)
+        inicio, parte = 0, 0
+        asignador = self._asignador()
+        filas_ckpt, ckpt = detecciones.cargar_checkpoint(run_dir)
+        if filas_ckpt is not None and int(ckpt.get('stride', 1)) == stride:
+            inicio, parte = int(ckpt['ultimo_frame']), int(ckpt.get('segmentos', 0))
+            centros = filas_ckpt
+            cap = self._posicionar(cap, video_path, inicio)
+            print(f"  - Reanudando desde el frame {inicio} ({len(centros)} detecciones del checkpoint)")
+            if asignador is not None:
+                asignador.sembrar(centros, stride)
+        ultimo_ckpt = inicio
+
+        # Preparar writer del video final combinado (no en modo headless). Dibuja y
+        # codifica en su propio hilo para no frenar la inferencia. Con checkpoints el .avi
+        # se escribe en segmentos que se cierran en cada checkpoint. El writer se abre recién
+        # con el lote que lo usa: un checkpoint en el último lote (o una reanudación sin
+        # frames pendientes) no deja un segmento vacío
+        out = None
+        abrir = not self.HEADLESS
+        video_yolo_salida = None
+        if not self.HEADLESS:
+            if self._segmentado():
+                # Los segmentos posteriores al checkpoint quedaron a medias: se rehacen
+                siguiente = parte
+                while os.path.exists(self._ruta_video_yolo(yolo_dir, video_id, siguiente)):
+                    os.remove(self._ruta_video_yolo(yolo_dir, video_id, siguiente))
+                    siguiente += 1
+                video_yolo_salida = self._ruta_video_yolo(yolo_dir, video_id, parte)
+            else:
+                video_yolo_salida = self._ruta_video_yolo(yolo_dir, video_id)
+
+        ultimo_coco = None  # últimas cajas COCO, para reutilizar en modo stride
+        seguidor, roi = self._seguidor_y_roi((w, h))
+
+        # Procesar el video por lotes de BATCH_SIZE frames: ambos modelos reciben el lote
+        # completo y los resultados vuelven en el mismo orden que los frames
+        with self._leer_lotes(cap, self.BATCH_SIZE, stride, inicio) as lotes:
+            for lote in lotes:
+                if abrir:
+                    out = self._abrir_escritor(video_yolo_salida, fps / stride, (w, h), m)
+                    abrir = False
+                ultimo_coco = self._procesar_lote(lote, out, roi, seguidor, centros, ultimo_coco,
+                                                  asignador=asignador)
+
+                # 3) Checkpoint: se cierra el segmento de video en curso (queda completo en
+                # disco) y se guardan las detecciones hasta este frame
+                if self.CHECKPOINT_EVERY and lote[-1][0] - ultimo_ckpt >= self.CHECKPOINT_EVERY:
+                    with m.etapa("checkpoint"):
+                        if out is not None:
+                            out.cerrar()
+                            out, abrir = None, True
+                            if self._segmentado():
+                                parte += 1
+                                video_yolo_salida = self._ruta_video_yolo(yolo_dir, video_id, parte)
+                        ultimo_ckpt = lote[-1][0]
+                        detecciones.guardar_checkpoint(run_dir, centros, ultimo_ckpt, con_id=self.MULTI_PUMP,
+                                                       stride=stride, segmentos=parte)
+        cap.release()
+
+        if out is not None:
+            with m.etapa("espera_escritor"):  # vaciar la cola del hilo de escritura
+                out.cerrar()
+        if self._segmentado() and not self.HEADLESS:
+            # El segmento `parte` solo existe si se llegó a abrir
+            video_yolo_salida = self._unir_segmentos(yolo_dir, video_id, parte + (not abrir))
+        if roi is not None:
+            print(f"  - ROI final: {roi.recorte()} (re-detecciones a frame completo: {roi.reaprendizajes})")
+        return centros, video_yolo_salida
+
+    def detectar(self, video_id=None, video_path=None, metricas_run=None):
+        """
+        Procesa un video y escribe /Output/video/detections.npz.
+
+        Args:
+            video_id: Nombre de la carpeta de salida (default: nombre del video)
+            video_path: Video a procesar; si no se pasa, toma el primero de PROCESSING_PATH.
+                El planificador siempre pasa el archivo ya reclamado para evitar carreras.
+            metricas_run: metricas.MetricasRun donde acumular los tiempos por etapa
+
+        Returns:
+            (run_dir, output_file), o (None, None) si falló
+        """
+        if video_path is None:
+            nombre_video = os.listdir(self.PROCESSING_PATH)[0]
+            video_path = os.path.join(self.PROCESSING_PATH, nombre_video)
+        nombre_video = os.path.basename(video_path)
+
+        # Extraer nombre sin extensión para crear carpeta (o usar el proporcionado)
+        if video_id is None:
+            video_id = os.path.splitext(nombre_video)[0]
+        run_dir = os.path.join(self.OUTPUT_PATH, video_id)  # /Output/video
+        os.makedirs(run_dir, exist_ok=True)
+
+        # Ruta para detecciones: /Output/video/detections.npz
+        output_file = os.path.join(run_dir, detecciones.NOMBRE)
+
+        m = self._metricas = metricas_run or metricas.MetricasRun()
+        self.recargar_si_cambio()
+        # La carga de modelos (al arrancar el worker o al recargar) se imputa a este video
+        if self._t_carga:
+            m.sumar("carga_modelos", self._t_carga)
+            self._t_carga = 0.0
+
+        try:
             cap = cv2.VideoCapture(video_path)
             fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
             w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            cap.release()
 
-            fourcc = cv2.VideoWriter_fourcc(*"XVID")
-            out = cv2.VideoWriter(video_yolo_salida, fourcc, fps, (w, h))
-
-            # Procesar video con tu YOLO en stream, SIN guardar automáticamente
-            for frame_idx, r_custom in enumerate(
-                model(
-                    video_path,
-                    stream=True,
-                    save=False,         # <- clave: no guardar el video "solo rodhead"
-                    classes=[0, 1],   # detecta ambas clases. 1 es  rodhead y 0 es aib
-                    device=device
-                ),
-                start=1
-            ):
-                # Frame original
-                frame = r_custom.orig_img  # numpy BGR
-
-                # 1) Registrar SOLO rodhead (class_id=1) en detections.txt
-                if r_custom.boxes is not None and len(r_custom.boxes) > 0:
-                    for box in r_custom.boxes:
-                        if int(box.cls[0]) != 1:
-                            continue
-
-                        x1, y1, x2, y2 = map(float, box.xyxy[0])
-                        cx = (x1 + x2) / 2
-                        cy = (y1 + y2) / 2
-                        centros.append((frame_idx, cx, cy))
-                        break  # si querés solo 1 rodhead por frame
-
-
-                # 2) Correr COCO SOLO para dibujar (NO escribir detecciones)
-                # COCO ids típicos: 0=person, 2=car, 7=truck
-                r_coco = coco.predict(
-                    frame,
-                    conf=0.35,
-                    classes=[0, 2, 7],
-                    device=device,
-                    verbose=False
-                )[0]
+            # Stride de inferencia: los frames salteados ni se decodifican
+            stride = self.stride_para(fps)
+            self._stride = stride
+            if stride > 1:
+                print(f"  - Muestreo: 1 de cada {stride} frames ({fps / stride:.2f} fps efectivos)")
 
-                # 3) Dibujar ambas salidas sobre el mismo frame
-                frame_anno = r_custom.plot()             # dibuja rodhead
-                frame_anno = r_coco.plot(img=frame_anno) # dibuja COCO encima
-
-                out.write(frame_anno)
+            yolo_dir = os.path.join(run_dir, "yolo")
+            if not self.HEADLESS:
+                os.makedirs(yolo_dir, exist_ok=True)
 
-            out.release()
+            # Videos largos: se reparten por rangos de frames entre varios procesos
+            n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            if self._fragmentar(n_frames, run_dir, stride):
+                cap.release()
+                centros, video_yolo_salida = self._detectar_fragmentado(
+                    video_path, video_id, yolo_dir, n_frames, stride, m)
+            else:
+                centros, video_yolo_salida = self._detectar_serie(
+                    cap, video_path, video_id, run_dir, yolo_dir, fps, (w, h), stride, m)
 
             # Escribir detecciones: SOLO rodhead, tal cual pediste
-            with open(output_file, "w") as f:
-                for frame, cx, cy in centros:
-                    f.write(f"({frame}, {cy})\n")
+            with m.etapa("guardar_detecciones"):
+                columnas = detecciones.desde_filas(centros, con_id=self.MULTI_PUMP)
+                detecciones.guardar(output_file, columnas, fps=fps, stride=stride, fps_efectivo=fps / stride)
+                if self.DETECTIONS_TXT:
+                    detecciones.exportar_txt(columnas, os.path.join(run_dir, detecciones.NOMBRE_TXT))
+                detecciones.borrar_checkpoint(run_dir)
 
             # Mover video original a: /Output/video/video.mp4
             video_destino = os.path.join(run_dir, nombre_video)
             shutil.move(video_path, video_destino)
 
             print(f"Video procesado exitosamente: {nombre_video}")
-            print(f"  - Video YOLO combinado: {video_yolo_salida}")
+            if video_yolo_salida:
+                print(f"  - Video YOLO combinado: {video_yolo_salida}")
             print(f"  - Video original: {video_destino}")
             print(f"  - Detecciones (solo rodhead): {output_file}")
             return run_dir, output_file
@@ -128,4 +784,6 @@ class Detection:
             print("Error procesando video:", e)
             shutil.move(video_path, os.path.join(self.OUTPUT_FAIL, nombre_video))
             print(f"Video movido a carpeta de fallidos: {nombre_video}")
+            if os.path.exists(os.path.join(run_dir, detecciones.NOMBRE_CHECKPOINT)):
+                print(f"  - Queda el checkpoint en {run_dir}: si se vuelve a encolar, se reanuda")
             return None, None
\ No newline at end of file
@@ -0,0 +1,145 @@
+# SE ENCARGA DE DIBUJAR Y CODIFICAR EL VIDEO ANOTADO FUERA DEL HILO DE INFERENCIA.
+import os
+import queue
+import threading
+import time
+import cv2
+
+_FIN = object()  # marca de fin de cola
+
+
+class EscritorVideo:
+    """
+    Etapa de escritura del video anotado en un hilo aparte.
+
+    El hilo de inferencia encola (frame_idx, r_custom, r_coco) en una cola acotada y este
+    hilo se encarga de r.plot(), del reescalado y de cv2.VideoWriter.write(). Si la cola se
+    llena, escribir() bloquea (back-pressure) en lugar de acumular frames en memoria.
+
+    Args:
+        path: Ruta del .avi de salida (en modo keyframes, carpeta de los .jpg)
+        fps: FPS de los frames que llegan (el del video original dividido el stride de muestreo)
+        size: (w, h) del video original
+        escala: Factor de reescalado del preview (1.0 = resolución original)
+        fps_div: Escribe 1 de cada fps_div frames (el .avi queda a fps / fps_div)
+        modo: "video" escribe el .avi; "keyframes" guarda solo frames anotados sueltos
+        keyframe_cada: En modo keyframes, cada cuántos frames se guarda uno
+        tam_cola: Tamaño máximo de la cola entre inferencia y escritura
+        metricas_run: metricas.MetricasRun opcional: suma "anotar", "codificar" y el tiempo
+            que el productor espera con la cola llena ("espera_cola_video")
+    """
+
+    def __init__(self, path, fps, size, escala=1.0, fps_div=1, modo="video",
+                 keyframe_cada=30, tam_cola=32, metricas_run=None):
+        if modo not in ("video", "keyframes"):
+            raise ValueError(f"Modo de video inválido: {modo}")
+        self.path = path
+        self.modo = modo
+        self.escala = escala
+        self.metricas = metricas_run
+        self.paso = max(1, int(fps_div)) if modo == "video" else max(1, int(keyframe_cada))
+
+        w, h = size
+        self.size = (max(1, int(w * escala)), max(1, int(h * escala)))
+
+        self.out = None
+        if modo == "video":
+            fourcc = cv2.VideoWriter_fourcc(*"XVID")
+            self.out = cv2.VideoWriter(path, fourcc, fps / self.paso, self.size)
+        else:
+            os.makedirs(path, exist_ok=True)
+
+        self._cola = queue.Queue(maxsize=max(1, int(tam_cola)))
+        self._error = None
+        self._hilo = threading.Thread(target=self._run, name="escritor-video", daemon=True)
+        self._hilo.start()
+
+    def quiere(self, muestra):
+        """Indica si la muestra (0, 1, 2... entre los frames inferidos) va a escribirse.
+
+        Los frames que no se escriben ni se dibujan.
+        """
+        return muestra % self.paso == 0
+
+    def escribir(self, frame_idx, r_custom, r_coco=None, frame=None, offset=None, caja_seguida=None,
+                 etiquetas=None):
+        """
+        Encola un frame para dibujar y escribir. Bloquea si la cola está llena.
+
+        Si r_custom se infirió sobre un recorte, `frame` es el frame completo y `offset` la
+        esquina (x0, y0) del recorte: el recorte anotado se pega sobre el frame completo.
+        En los frames seguidos con flujo óptico r_custom es None y se dibuja `caja_seguida`
+        (cx, cy, w, h, conf) sobre `frame`. `etiquetas` [(texto, x, y), ...] se escriben
+        encima (ej. el id de cada bomba).
+        """
+        if self._error is not None:
+            raise RuntimeError("Falló la escritura del video anotado") from self._error
+        item = (frame_idx, r_custom, r_coco, frame, offset, caja_seguida, etiquetas)
+        if self.metricas is None:
+            self._cola.put(item)
+            return
+        t0 = time.perf_counter()
+        self._cola.put(item)
+        self.metricas.sumar("espera_cola_video", time.perf_counter() - t0)
+
+    def cerrar(self):
+        """Vacía la cola, espera al hilo y cierra el archivo."""
+        self._cola.put(_FIN)
+        self._hilo.join()
+        if self.out is not None:
+            self.out.release()
+        if self._error is not None:
+            raise RuntimeError("Falló la escritura del video anotado") from self._error
+
+    def _run(self):
+        while True:
+            item = self._cola.get()
+            if item is _FIN:
+                return
+            if self._error is not None:
+                continue  # seguir vaciando la cola para no bloquear al productor
+            try:
+                self._escribir_frame(*item)
+            except Exception as e:
+                self._error = e
+
+    def _escribir_frame(self, frame_idx, r_custom, r_coco, frame, offset, caja_seguida, etiquetas):
+        t0 = time.perf_counter()
+        # Dibujar ambas salidas sobre el mismo frame
+        if r_custom is None:
+            frame_anno = frame.copy()
+            if caja_seguida is not None:
+                cx, cy, w, h, conf = caja_seguida
+                p1 = (int(cx - w / 2), int(cy - h / 2))
+                p2 = (int(cx + w / 2), int(cy + h / 2))
+                cv2.rectangle(frame_anno, p1, p2, (0, 200, 255), 2)
+                cv2.putText(frame_anno, f"rodhead (track) {conf:.2f}", (p1[0], max(0, p1[1] - 5)),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 200, 255), 1)
+        elif offset is None:
+            frame_anno = r_custom.plot()             # dibuja rodhead
+        else:
+            x0, y0 = offset
+            recorte = r_custom.plot()
+            frame_anno = frame.copy()
+            frame_anno[y0:y0 + recorte.shape[0], x0:x0 + recorte.shape[1]] = recorte
+            cv2.rectangle(frame_anno, (x0, y0), (x0 + recorte.shape[1], y0 + recorte.shape[0]),
+                          (255, 255, 0), 1)     # marca la ROI
+        if r_coco is not None:
+            frame_anno = r_coco.plot(img=frame_anno) # dibuja COCO encima
+        for texto, x, y in etiquetas or ():
+            cv2.putText(frame_anno, texto, (int(x), int(y)), cv2.FONT_HERSHEY_SIMPLEX, 0.6,
+                        (255, 0, 255), 2)
+        t1 = time.perf_counter()
+
+        if self.escala != 1.0:
+            frame_anno = cv2.resize(frame_anno, self.size, interpolation=cv2.INTER_AREA)
+
+        if self.out is not None:
+            self.out.write(frame_anno)
+        else:
+            cv2.imwrite(os.path.join(self.path, f"frame_{frame_idx:06d}.jpg"), frame_anno)
+
+        if self.metricas is not None:
+            self.metricas.sumar("anotar", t1 - t0)
+            self.metricas.sumar("codificar", time.perf_counter() - t1)
+            self.metricas.contar("frames_escritos")
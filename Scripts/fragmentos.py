@@ -0,0 +1,91 @@
+# VIDEOS LARGOS EN PARALELO: RANGOS DE FRAMES REPARTIDOS ENTRE PROCESOS CON SUS PROPIOS MODELOS.
+"""
+Un video de horas en un solo proceso deja ociosos al resto de los núcleos. Con CHUNKS=N,
+Detection.detectar() corta los videos de al menos CHUNKMIN frames en N rangos contiguos y
+cada uno lo procesa un proceso del pool (Detection.detectar_rango), que busca el inicio de
+su rango con seek y decodifica solo esa parte.
+
+Los límites de los rangos son múltiplos del stride, así que los frames inferidos son los
+mismos que en la corrida en serie y, sin ROI ni seguimiento, también las detecciones. Con
+ROI o seguimiento cada rango procesa antes unos frames de calentamiento (ver
+Detection._solape) que no se registran.
+"""
+import math
+import os
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+_detector = None  # Detection de cada proceso del pool
+
+
+def rangos(n_frames, partes, stride=1):
+    """
+    Divide n_frames en `partes` rangos [(inicio, fin), ...] (frames inicio+1..fin, el
+    último con fin=None para leer hasta el final aunque el conteo del contenedor no sea
+    exacto). Los límites son múltiplos de stride.
+    """
+    partes = max(1, int(partes))
+    tam = max(stride, math.ceil(n_frames / partes / stride) * stride)
+    inicios = list(range(0, max(n_frames, 1), tam))
+    return [(ini, inicios[i + 1] if i + 1 < len(inicios) else None) for i, ini in enumerate(inicios)]
+
+
+def unir_filas(listas):
+    """Concatena las detecciones de los rangos en orden (sin frames repetidos)."""
+    filas, ultimo = [], 0
+    for lista in listas:
+        for fila in lista:
+            if fila[0] > ultimo:
+                filas.append(fila)
+                ultimo = fila[0]
+    return filas
+
+
+def _iniciar(threads):
+    global _detector
+    import torch
+    import detection
+    torch.set_num_threads(threads)
+    _detector = detection.Detection()
+
+
+def _detectar_rango(video_path, inicio, fin, stride, salida_video, solape):
+    return _detector.detectar_rango(video_path, inicio, fin, stride,
+                                    salida_video=salida_video, solape=solape)
+
+
+class PoolFragmentos:
+    """
+    Procesos (spawn) que cargan los modelos una vez y procesan rangos de frames.
+
+    Los núcleos se reparten entre los procesos para no sobresuscribir la CPU. Si el
+    detector corre dentro de un worker del planificador, ese worker no es daemon y puede
+    tener este pool como hijo.
+    """
+
+    def __init__(self, procesos, threads=None):
+        self.procesos = max(1, int(procesos))
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.procesos)
+        self._pool = None
+
+    def detectar(self, video_path, rangos, stride, salidas, solape=0):
+        """
+        Returns:
+            [(centros, etapas, contadores), ...] en el orden de `rangos`
+        """
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.procesos, mp_context=mp.get_context("spawn"),
+                                             initializer=_iniciar, initargs=(self.threads,))
+        futuros = [self._pool.submit(_detectar_rango, video_path, inicio, fin, stride, salida, solape)
+                   for (inicio, fin), salida in zip(rangos, salidas)]
+        try:
+            return [f.result() for f in futuros]
+        except BrokenProcessPool:
+            self._pool = None  # murió un proceso: el próximo video arranca un pool nuevo
+            raise
+
+    def cerrar(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
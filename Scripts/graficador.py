@@ -1,44 +1,92 @@
-import ast
+# GRAFICA LA COORDENADA Y DEL RODHEAD (EN UN PROCESO APARTE PARA NO FRENAR EL PRÓXIMO VIDEO).
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.ticker import MaxNLocator
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
+import numpy as np
+import detecciones
 
+FIGSIZE = (10, 4)
+DPI = 150
+COLUMNAS_PX = FIGSIZE[0] * DPI  # columnas de píxeles del gráfico
 
-# Cargar variables de entorno
-def graficar(output_file, run_dir):
+
+def decimar_minmax(x, y, columnas=COLUMNAS_PX):
+    """
+    Reduce una serie larga a, como mucho, el mínimo y el máximo de cada columna de píxeles.
+
+    El gráfico se ve igual (cada columna dibuja su rango completo) pero el tiempo de render
+    queda acotado por el ancho de la imagen y no por la cantidad de puntos. x debe venir
+    ordenado.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if len(x) <= 2 * columnas:
+        return x, y
+    ancho = max(float(x[-1] - x[0]), 1.0)
+    col = np.minimum(((x - x[0]) / ancho * columnas).astype(np.int64), columnas - 1)
+    # Dentro de cada columna ordenado por y: el primero es el mínimo y el último el máximo
+    order = np.lexsort((y, col))
+    c = col[order]
+    primero = np.ones(len(c), dtype=bool)
+    primero[1:] = c[1:] != c[:-1]
+    ultimo = np.ones(len(c), dtype=bool)
+    ultimo[:-1] = c[1:] != c[:-1]
+    idx = np.unique(order[primero | ultimo])
+    return x[idx], y[idx]
+
+
+def graficar(output_file, run_dir, frames=None, ys=None, y_suave=None, eventos=None, series=None):
     """
     Grafica las detecciones y guarda en /Output/video/grafico_detecciones.png
-    
+
     Args:
-        output_file: Path al archivo detections.txt
+        output_file: Path al archivo detections.npz (o detections.txt); solo se lee si no
+            se pasan frames/ys
         run_dir: Directorio base del video (/Output/video)
+        frames, ys: Puntos ya cargados (evita volver a leer el archivo)
+        y_suave: Señal suavizada por frame de bpm.alternating_extrema (opcional, se superpone)
+        eventos: [(frame, "max"|"min"), ...] de bpm.alternating_extrema (opcional)
+        series: {id: (frames, ys)} de una corrida multi-bomba: un color por bomba
     """
+    # Importes pesados recién acá: el proceso que no grafica no los paga
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.ticker import MaxNLocator
+
     # Archivo de salida: /Output/video/grafico_detecciones.png
     out_path = Path(run_dir) / "grafico_detecciones.png"
 
     # === Leer el archivo ===
-    pairs = []
-    # Aceptar tanto Path como string
-    file_path = Path(output_file) if not isinstance(output_file, Path) else output_file
-    with file_path.open("r", encoding="utf-8") as f:
-        for line in f:
-            s = line.strip()
-            if not s:
-                continue
-            try:
-                a, b = ast.literal_eval(s)   # Convierte "(1, 407.0)" -> (1, 407.0)
-                pairs.append((int(a), float(b)))
-            except Exception:
-                pass
-
-    # === Crear DataFrame ===
-    df = pd.DataFrame(pairs, columns=["frame", "valor"])
+    if series is None and (frames is None or ys is None):
+        frames, ys = detecciones.cargar_puntos(output_file)
 
     # === Graficar ===
-    fig, ax = plt.subplots(figsize=(10, 4), dpi=150)
-    ax.scatter(df["frame"], df["valor"], s=8, alpha=0.7)
+    fig, ax = plt.subplots(figsize=FIGSIZE, dpi=DPI)
+    if series is not None:
+        for i, (f, y) in series.items():
+            fx, fy = decimar_minmax(f, y)
+            ax.scatter(fx, fy, s=8, alpha=0.7, label=f"Bomba {i}")
+        if series:
+            ax.legend(loc="upper right", fontsize=7)
+    else:
+        fx, fy = decimar_minmax(frames, ys)
+        ax.scatter(fx, fy, s=8, alpha=0.7, label="Detecciones")
+
+    if y_suave is not None and frames is not None and len(frames):
+        # La señal suavizada está indexada por frame; se dibuja solo el tramo con detecciones
+        x = np.arange(int(frames[0]), min(int(frames[-1]) + 1, len(y_suave)))
+        sx, sy = decimar_minmax(x, y_suave[x])
+        ax.plot(sx, sy, color="tab:orange", linewidth=1, label="Suavizada")
+        if eventos:
+            idx = np.array([i for i, _ in eventos])
+            es_max = np.array([t == "max" for _, t in eventos])
+            ax.scatter(idx[es_max], y_suave[idx[es_max]], marker="^", color="tab:red", s=25, zorder=3, label="Máximos")
+            ax.scatter(idx[~es_max], y_suave[idx[~es_max]], marker="v", color="tab:green", s=25, zorder=3, label="Mínimos")
+        ax.legend(loc="upper right", fontsize=7)
+
     ax.xaxis.set_major_locator(MaxNLocator(nbins=10))
     ax.yaxis.set_major_locator(MaxNLocator(nbins=6))
     ax.set_title("Coordenada Y del centro de detección por frame")
@@ -48,8 +96,48 @@ def graficar(output_file, run_dir):
     plt.margins(x=0.01, y=0.05)
     plt.tight_layout()
 
-    # === Guardar gráfico ===
-    plt.savefig(out_path, bbox_inches="tight")
-    plt.close()
+    # === Guardar gráfico === (a un temporal y rename: nadie ve un .png a medias)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    plt.savefig(tmp, bbox_inches="tight", format="png")
+    plt.close(fig)
+    os.replace(tmp, out_path)
+
+    print(f"Gráfico guardado en {out_path.resolve()}")
+    return str(out_path)
+
+
+def _graficar_medido(*args, **kwargs):
+    # En el proceso del graficador: devuelve también lo que tardó (para metrics.json)
+    t0 = time.perf_counter()
+    path = graficar(*args, **kwargs)
+    return path, time.perf_counter() - t0
+
+
+class GraficadorFondo:
+    """
+    Corre graficar() en un proceso aparte (un ProcessPoolExecutor de 1 proceso), así el
+    worker pasa al próximo video apenas encola el gráfico.
+
+    El proceso se crea con "spawn" la primera vez que se usa. El worker que lo crea no puede
+    ser daemon (los procesos daemon no pueden tener hijos).
+    """
+
+    def __init__(self):
+        self._pool = None
+
+    def enviar(self, *args, **kwargs):
+        """Encola graficar(*args, **kwargs) y devuelve el Future: (ruta del png, segundos)."""
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"))
+        try:
+            return self._pool.submit(_graficar_medido, *args, **kwargs)
+        except BrokenProcessPool:
+            # El proceso del graficador murió: se crea otro
+            self._pool = ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"))
+            return self._pool.submit(_graficar_medido, *args, **kwargs)
 
-    print(f"Gráfico guardado en {out_path.resolve()}")
\ No newline at end of file
+    def cerrar(self):
+        """Espera los gráficos pendientes y termina el proceso."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
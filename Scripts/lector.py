@@ -0,0 +1,146 @@
+# DECODIFICA EL VIDEO EN UN HILO APARTE Y ENTREGA LOS FRAMES EN LOTES A LA INFERENCIA.
+import queue
+import threading
+import time
+
+_FIN = object()  # marca de fin de cola
+
+
+class LectorFrames:
+    """
+    Etapa de decodificación del pipeline: decodificación -> inferencia -> escritura.
+
+    Un hilo lee el video (cv2.VideoCapture ya abierto y posicionado), arma los lotes
+    [(frame_idx, frame), ...] y los deja en una cola acotada; la inferencia los consume
+    iterando el lector. Mientras el modelo procesa un lote el hilo ya decodifica los
+    siguientes (OpenCV libera el GIL al decodificar). Si la cola se llena el hilo espera
+    (back-pressure) en lugar de adelantarse todo el video.
+
+    Los frames se leen sobre un anillo de `buffers` arrays reutilizados (cap.read(buf)), así
+    no se reserva memoria nueva por frame. El anillo tiene que ser más grande que la cantidad
+    de frames que pueden estar vivos a la vez aguas abajo (cola de lotes, lote en inferencia
+    y cola del escritor de video): ver Detection._leer_lotes. buffers=0 -> sin reutilizar.
+
+    Índices, stride, inicio y fin igual que Detection._leer_lotes (que lo usa).
+
+    Args:
+        cap: cv2.VideoCapture listo para leer el frame inicio + 1
+        tam: Frames por lote
+        tam_cola: Lotes decodificados por adelantado
+        metricas_run: metricas.MetricasRun opcional: suma "decodificar" (en el hilo) y el
+            tiempo que la inferencia espera un lote ("espera_decodificador")
+    """
+
+    def __init__(self, cap, tam, stride=1, inicio=0, fin=None, tam_cola=4, buffers=0, metricas_run=None):
+        self.cap = cap
+        self.tam = max(1, int(tam))
+        self.stride = max(1, int(stride))
+        self.inicio = inicio
+        self.fin = fin
+        self.metricas = metricas_run
+        self.n_buffers = max(0, int(buffers))
+        self._anillo = []
+        self._pos = 0
+
+        self._cola = queue.Queue(maxsize=max(1, int(tam_cola)))
+        self._parar = threading.Event()
+        self._error = None
+        self._hilo = threading.Thread(target=self._run, name="lector-video", daemon=True)
+        self._hilo.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def __iter__(self):
+        try:
+            while True:
+                t0 = time.perf_counter()
+                lote = self._cola.get()
+                if self.metricas is not None:
+                    self.metricas.sumar("espera_decodificador", time.perf_counter() - t0)
+                if lote is _FIN:
+                    break
+                yield lote
+        finally:
+            self.cerrar()
+        if self._error is not None:
+            raise RuntimeError("Falló la decodificación del video") from self._error
+
+    def cerrar(self):
+        """
+        Detiene el hilo (si el consumidor cortó antes del final) y lo espera: después de
+        cerrar el lector se puede liberar cap.
+        """
+        self._parar.set()
+        try:
+            while True:
+                self._cola.get_nowait()  # destrabar un put() bloqueado
+        except queue.Empty:
+            pass
+        self._hilo.join()
+
+    def _leer(self):
+        if not self.n_buffers:
+            return self.cap.read()
+        if len(self._anillo) < self.n_buffers:
+            ok, frame = self.cap.read()
+            if ok:
+                self._anillo.append(frame)
+            return ok, frame
+        # Si el tamaño no coincide, OpenCV devuelve un array nuevo: pasa a ser el buffer
+        ok, frame = self.cap.read(self._anillo[self._pos])
+        if ok:
+            self._anillo[self._pos] = frame
+            self._pos = (self._pos + 1) % self.n_buffers
+        return ok, frame
+
+    def _encolar(self, item):
+        while not self._parar.is_set():
+            try:
+                self._cola.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        m = self.metricas
+        lote = []
+        frame_idx = self.inicio
+        leidos = 0
+        try:
+            t0 = time.perf_counter()
+            while self.fin is None or frame_idx < self.fin:
+                if frame_idx % self.stride:
+                    if not self.cap.grab():
+                        break
+                    frame_idx += 1
+                    continue
+                ok, frame = self._leer()
+                if not ok:
+                    break
+                frame_idx += 1
+                lote.append((frame_idx, frame))
+                if len(lote) >= self.tam:
+                    if m is not None:
+                        m.sumar("decodificar", time.perf_counter() - t0)
+                    leidos += len(lote)
+                    if not self._encolar(lote):
+                        return
+                    lote = []
+                    t0 = time.perf_counter()
+            if m is not None:
+                m.sumar("decodificar", time.perf_counter() - t0)
+            leidos += len(lote)
+            if lote and not self._encolar(lote):
+                return
+        except Exception as e:
+            self._error = e
+        finally:
+            if m is not None:
+                m.contar("frames_leidos", leidos)
+                m.contar("frames_video", frame_idx - self.inicio)
+            self._encolar(_FIN)
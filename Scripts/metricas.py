@@ -0,0 +1,176 @@
+# METRICAS: TIEMPOS POR ETAPA DE CADA VIDEO (metrics.json) Y CONTADORES DEL DAEMON (PROMETHEUS).
+import json
+import os
+import resource
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+NOMBRE = "metrics.json"
+# Descripción (# HELP) de los contadores que no son de frames
+AYUDA_EVENTOS = {"cache_hits": "Videos cuyas detecciones salieron del cache (sin YOLO)."}
+
+
+def rss_pico_bytes():
+    """Memoria residente pico del proceso (ru_maxrss está en KB en Linux, en bytes en macOS)."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == "darwin" else pico * 1024
+
+
+def _escribir_atomico(path, texto):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        f.write(texto)
+    os.replace(tmp, path)
+
+
+class MetricasRun:
+    """
+    Tiempos de pared por etapa y contadores de frames de un video.
+
+    Las etapas se acumulan (la inferencia, por ejemplo, se mide lote por lote) con
+    `with m.etapa("rodhead"):` o con sumar(). El hilo del escritor de video también suma
+    acá, así que las actualizaciones van con lock.
+    """
+
+    def __init__(self):
+        self.etapas = {}       # nombre -> segundos acumulados
+        self.llamadas = {}     # nombre -> veces que se midió
+        self.contadores = {}   # nombre -> cantidad (frames leídos, inferidos, escritos...)
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+
+    @contextmanager
+    def etapa(self, nombre):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sumar(nombre, time.perf_counter() - t0)
+
+    def sumar(self, nombre, segundos):
+        with self._lock:
+            self.etapas[nombre] = self.etapas.get(nombre, 0.0) + segundos
+            self.llamadas[nombre] = self.llamadas.get(nombre, 0) + 1
+
+    def contar(self, nombre, n=1):
+        with self._lock:
+            self.contadores[nombre] = self.contadores.get(nombre, 0) + n
+
+    def resumen(self):
+        total = time.perf_counter() - self._t0
+        with self._lock:
+            etapas = {k: {'segundos': round(v, 4), 'llamadas': self.llamadas[k]}
+                      for k, v in self.etapas.items()}
+            contadores = dict(self.contadores)
+        frames = contadores.get('frames_video', 0)
+        return {
+            'total_s': round(total, 4),
+            'etapas': etapas,
+            'contadores': contadores,
+            # Frames del video original avanzados por segundo de pared (incluye los salteados)
+            'fps_efectivo': round(frames / total, 2) if total > 0 else None,
+            'rss_pico_mb': round(rss_pico_bytes() / 2 ** 20, 1),
+        }
+
+    def guardar(self, run_dir, **extra):
+        """Escribe metrics.json en el run_dir (junto a resultados.txt)."""
+        datos = self.resumen()
+        datos.update(extra)
+        os.makedirs(run_dir, exist_ok=True)
+        _escribir_atomico(os.path.join(run_dir, NOMBRE), json.dumps(datos, indent=2) + "\n")
+        return datos
+
+
+def agregar_etapa(run_dir, nombre, segundos):
+    """
+    Agrega a un metrics.json ya escrito una etapa medida después (el gráfico en segundo
+    plano termina cuando el run ya registró sus métricas).
+
+    Returns:
+        dict: metrics.json actualizado
+    """
+    path = os.path.join(run_dir, NOMBRE)
+    with open(path) as f:
+        datos = json.load(f)
+    datos.setdefault('etapas', {})[nombre] = {'segundos': round(segundos, 4), 'llamadas': 1}
+    _escribir_atomico(path, json.dumps(datos, indent=2) + "\n")
+    return datos
+
+
+class ContadoresDaemon:
+    """
+    Contadores acumulados de un worker, en el formato "textfile" de Prometheus
+    (node_exporter --collector.textfile.directory=METRICSDIR).
+
+    Cada worker escribe su propio archivo <METRICSDIR>/yolo_<host>_w<N>.prom (de forma
+    atómica, como pide el collector); los contadores arrancan de cero si el worker se reinicia.
+    Sin directorio no se escribe nada.
+    """
+
+    def __init__(self, directorio, worker):
+        host = socket.gethostname()
+        self.path = os.path.join(directorio, f"yolo_{host}_w{worker}.prom") if directorio else None
+        if self.path:
+            os.makedirs(directorio, exist_ok=True)
+        self._labels = f'host="{host}",worker="{worker}"'
+        self.videos = {}           # resultado -> cantidad
+        self.frames = {}           # contador de frames (frames_*) -> cantidad
+        self.eventos = {}          # otros contadores (ej. cache_hits) -> cantidad
+        self.segundos_etapa = {}   # etapa -> segundos
+        self.espera_s = 0.0        # tiempo ocioso esperando videos
+        self.ultimo = None
+
+    def esperando(self, segundos):
+        self.espera_s += segundos
+
+    def registrar(self, resultado, metricas=None):
+        """Suma un video terminado (resultado: ok / error / off_prepass) y reescribe el archivo."""
+        self.videos[resultado] = self.videos.get(resultado, 0) + 1
+        if metricas is not None:
+            for k, v in metricas.etapas.items():
+                self.segundos_etapa[k] = self.segundos_etapa.get(k, 0.0) + v
+            for k, v in metricas.contadores.items():
+                destino = self.frames if k.startswith("frames_") else self.eventos
+                destino[k] = destino.get(k, 0) + v
+        self.ultimo = time.time()
+        self.escribir()
+
+    def escribir(self):
+        if not self.path:
+            return
+        lb = self._labels
+        lineas = [
+            "# HELP yolo_videos_total Videos procesados por resultado.",
+            "# TYPE yolo_videos_total counter",
+            *(f'yolo_videos_total{{{lb},resultado="{k}"}} {v}' for k, v in sorted(self.videos.items())),
+            "# HELP yolo_frames_total Frames por tipo (leidos, inferidos, seguidos, escritos...).",
+            "# TYPE yolo_frames_total counter",
+            *(f'yolo_frames_total{{{lb},tipo="{k}"}} {v}' for k, v in sorted(self.frames.items())),
+            # Los que no cuentan frames van en su propia métrica, para que sumar
+            # yolo_frames_total tenga sentido
+            *(linea for k, v in sorted(self.eventos.items()) for linea in (
+                f"# HELP yolo_{k}_total {AYUDA_EVENTOS.get(k, k)}",
+                f"# TYPE yolo_{k}_total counter",
+                f"yolo_{k}_total{{{lb}}} {v}",
+            )),
+            "# HELP yolo_stage_seconds_total Tiempo de pared acumulado por etapa.",
+            "# TYPE yolo_stage_seconds_total counter",
+            *(f'yolo_stage_seconds_total{{{lb},etapa="{k}"}} {v:.6f}'
+              for k, v in sorted(self.segundos_etapa.items())),
+            "# HELP yolo_idle_seconds_total Tiempo esperando videos en la cola.",
+            "# TYPE yolo_idle_seconds_total counter",
+            f"yolo_idle_seconds_total{{{lb}}} {self.espera_s:.6f}",
+            "# HELP yolo_rss_peak_bytes Memoria residente pico del worker.",
+            "# TYPE yolo_rss_peak_bytes gauge",
+            f"yolo_rss_peak_bytes{{{lb}}} {rss_pico_bytes()}",
+        ]
+        if self.ultimo is not None:
+            lineas += [
+                "# HELP yolo_last_video_timestamp_seconds Fin del último video procesado.",
+                "# TYPE yolo_last_video_timestamp_seconds gauge",
+                f"yolo_last_video_timestamp_seconds{{{lb}}} {self.ultimo:.3f}",
+            ]
+        _escribir_atomico(self.path, "\n".join(lineas) + "\n")
@@ -0,0 +1,96 @@
+# PRE-ANÁLISIS BARATO DE MOVIMIENTO: DESCARTA VIDEOS CLARAMENTE QUIETOS ANTES DE CORRER YOLO.
+import cv2
+import numpy as np
+
+
+def prepass_movimiento(video_path,
+                       ancho=160,            # ancho del stream reducido en escala de grises
+                       cada_s=0.5,           # segundos entre muestras
+                       umbral_pixel=15,      # diferencia de gris para contar un píxel como "cambió"
+                       umbral_off=0.002,     # fracción máxima de píxeles cambiados para OFF
+                       margen=0.5):          # fracción de umbral_off hasta la que el OFF es seguro
+    """
+    Diferencia de frames sobre una versión chica y en grises del video, muestreada cada
+    `cada_s` segundos (los frames intermedios se saltean con grab()).
+
+    Compara cada muestra con la anterior y con la primera (para no perder movimientos lentos).
+    Si en ninguna comparación cambia más de `margen * umbral_off` de los píxeles, el video se
+    clasifica OFF sin pasar por YOLO; si no, queda para la detección completa. Entre
+    `margen * umbral_off` y `umbral_off` la escena es casi estática pero el margen es chico:
+    también se corre YOLO, así el OFF del pre-análisis nunca sale con confianza cercana a 0
+    (la confianza va de 1 sin cambios a 0.5 en el límite del margen).
+
+    Returns:
+        dict: {
+            'status': 'OFF' o 'ESCALAR',
+            'confidence': float (0-1),
+            'reason': str,
+            'movimiento': fracción máxima de píxeles cambiados,
+            'n_muestras': int
+        }
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+        paso = max(1, int(round(cada_s * fps)))
+
+        primera = anterior = None
+        movimiento = 0.0
+        n_muestras = 0
+        frame_idx = 0
+        while True:
+            if frame_idx % paso:
+                if not cap.grab():
+                    break
+                frame_idx += 1
+                continue
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frame_idx += 1
+
+            h, w = frame.shape[:2]
+            chico = cv2.resize(frame, (ancho, max(1, int(h * ancho / w))), interpolation=cv2.INTER_AREA)
+            gris = cv2.GaussianBlur(cv2.cvtColor(chico, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+            n_muestras += 1
+
+            if primera is None:
+                primera = gris
+            else:
+                for ref in (anterior, primera):
+                    cambio = float(np.count_nonzero(cv2.absdiff(gris, ref) > umbral_pixel)) / gris.size
+                    movimiento = max(movimiento, cambio)
+            anterior = gris
+    finally:
+        cap.release()
+
+    if n_muestras < 2:
+        return {'status': 'ESCALAR', 'confidence': 0.0, 'movimiento': movimiento,
+                'n_muestras': n_muestras, 'reason': 'Video demasiado corto para el pre-análisis'}
+
+    limite = margen * umbral_off
+    if movimiento <= limite:
+        return {
+            'status': 'OFF',
+            'confidence': 1.0 - 0.5 * movimiento / limite if limite > 0 else 1.0,
+            'movimiento': movimiento,
+            'n_muestras': n_muestras,
+            'reason': (f"Pre-análisis: escena estática, {movimiento:.3%} de píxeles cambiados "
+                       f"(umbral {umbral_off:.3%}) en {n_muestras} muestras")
+        }
+    if movimiento <= umbral_off:
+        return {
+            'status': 'ESCALAR',
+            'confidence': 0.0,
+            'movimiento': movimiento,
+            'n_muestras': n_muestras,
+            'reason': (f"Pre-análisis: {movimiento:.3%} de píxeles cambiados, cerca del umbral "
+                       f"{umbral_off:.3%}: se corre la detección")
+        }
+    return {
+        'status': 'ESCALAR',
+        'confidence': 0.0,
+        'movimiento': movimiento,
+        'n_muestras': n_muestras,
+        'reason': f"Pre-análisis: movimiento en {movimiento:.3%} de píxeles, se corre la detección"
+    }
@@ -0,0 +1,52 @@
+# PLANIFICADOR DE MUESTREO: CUÁNTOS FRAMES SALTEAR SIN PERDER PRECISIÓN EN EL BPM.
+"""
+Los golpes del pump jack son lentos (con bpm_max=10 un ciclo dura al menos 6 s, 180 frames a
+30 fps), así que inferir todos los frames es innecesario. planificar_stride() elige cada
+cuántos frames correr la inferencia a partir del fps del video, del rango de BPM y de la
+ventana de suavizado:
+
+- Tolerancia: un extremo queda ubicado con un error de hasta ±stride/2 frames, así que el
+  período (diferencia entre dos extremos) puede errar hasta ~stride frames. Para que el
+  error relativo del BPM no supere `tolerancia` en el ciclo más corto:
+      stride <= tolerancia * período_mínimo_en_frames
+- Resolución: al menos `min_muestras_ciclo` muestras por ciclo para que los extremos se
+  distingan del ruido.
+- Suavizado: bpm.interpolate_signal rellena los frames salteados con rectas; la media móvil
+  de smooth_win frames solo redondea los quiebres si stride <= smooth_win.
+
+Los índices de frame guardados siguen siendo los del video original, así que bpm.bpm_cycle
+y on_off usan el fps original sin cambios; el stride queda registrado en detections.npz.
+"""
+import math
+
+
+def planificar_stride(fps, bpm_max=10, smooth_win=11, tolerancia=0.05, min_muestras_ciclo=20):
+    """
+    Returns:
+        dict: {
+            'stride': frames entre inferencias (1 = todos),
+            'fps_efectivo': fps / stride,
+            'limites': stride máximo según cada criterio
+        }
+    """
+    fps = fps or 30.0
+    periodo_min = fps * 60.0 / bpm_max  # frames del ciclo más rápido
+    limites = {
+        'tolerancia': math.floor(tolerancia * periodo_min),
+        'resolucion': math.floor(periodo_min / max(1, min_muestras_ciclo)),
+        'suavizado': max(1, int(smooth_win)),
+    }
+    stride = max(1, min(limites.values()))
+    return {'stride': stride, 'fps_efectivo': fps / stride, 'limites': limites}
+
+
+def resolver_stride(config, fps, bpm_max=10, smooth_win=11, tolerancia=0.05):
+    """
+    Interpreta la variable SAMPLING: "auto" usa planificar_stride(); un número es un stride
+    fijo. Devuelve el stride a usar.
+    """
+    config = str(config or "1").strip().lower()
+    if config == "auto":
+        plan = planificar_stride(fps, bpm_max=bpm_max, smooth_win=smooth_win, tolerancia=tolerancia)
+        return plan['stride']
+    return max(1, int(config))
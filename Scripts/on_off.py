@@ -1,5 +1,5 @@
 """ Cómo funciona:
-Carga de datos: Lee detections.txt y extrae las coordenadas Y.
+Carga de datos: Lee detections.npz (o detections.txt) y extrae las coordenadas Y.
 Métricas de movimiento:
 Varianza: Variabilidad general de las posiciones Y
 Desviación estándar: Dispersión de los valores
@@ -19,33 +19,43 @@ Desviación estándar mínima: 5 píxeles
 Cambio promedio mínimo: 1 píxel por frame
 Varianza mínima: 25
 
+Línea de tiempo (detect_on_off_timeline):
+Aplica el mismo criterio sobre ventanas deslizantes de window_s segundos (sumas acumuladas,
+una sola pasada) y devuelve tramos ON/OFF con confianza y BPM por tramo, para videos donde
+el pump jack se detiene o arranca a mitad de camino.
+
 Nota: Se puede ajustar los umbrales de las métricas para mejorar la precisión. """
 
 import os
 import numpy as np
-import re
 from dotenv import load_dotenv
+import detecciones
+import bpm
+
+# Peso de cada métrica
+WEIGHTS = {
+    'range': 0.3,
+    'std': 0.25,
+    'mean_change': 0.25,
+    'variance': 0.1,
+    'trend': 0.1
+}
 
 def load_points(path):
-    """Carga los puntos (frame, y) desde detections.txt"""
-    frames, ys = [], []
+    """Carga los puntos (frame, y) desde detections.npz (o un detections.txt viejo)"""
     try:
-        with open(path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                m = re.match(r"\((\d+),\s*([0-9.]+)\)", line)
-                if m:
-                    frames.append(int(m.group(1)))
-                    ys.append(float(m.group(2)))
+        return detecciones.cargar_puntos(path)
     except FileNotFoundError:
         return np.array([]), np.array([])
-    return np.array(frames), np.array(ys)
 
-def calculate_movement_metrics(ys):
+def calculate_movement_metrics(ys, stride=1):
     """
     Calcula métricas de movimiento para determinar si el pump jack está activo.
+
+    Args:
+        ys: Coordenadas Y de las detecciones, en orden
+        stride: Frames entre muestras consecutivas (muestreo de detectar()); los cambios
+            y la tendencia se expresan siempre por frame
     
     Returns:
         dict: Diccionario con métricas calculadas
@@ -68,14 +78,14 @@ def calculate_movement_metrics(ys):
     y_range = np.max(ys) - np.min(ys)
     
     # Cambios entre frames consecutivos
-    changes = np.abs(np.diff(ys))
+    changes = np.abs(np.diff(ys)) / stride
     mean_change = np.mean(changes)
     max_change = np.max(changes)
     
     # Tendencia: pendiente promedio (usando regresión lineal simple)
     if len(ys) > 1:
         x = np.arange(len(ys))
-        trend = np.polyfit(x, ys, 1)[0]  # Pendiente
+        trend = np.polyfit(x, ys, 1)[0] / stride  # Pendiente
     else:
         trend = 0.0
     
@@ -97,7 +107,7 @@ def detect_on_off(detections_path,
     Detecta si el pump jack está encendido (ON) o apagado (OFF).
     
     Args:
-        detections_path: Ruta al archivo detections.txt
+        detections_path: Ruta al archivo detections.npz (o detections.txt)
         min_range: Rango mínimo de Y para considerar movimiento (default: 10 píxeles)
         min_std: Desviación estándar mínima (default: 5 píxeles)
         min_mean_change: Cambio promedio mínimo entre frames (default: 1 píxel)
@@ -111,16 +121,28 @@ def detect_on_off(detections_path,
             'reason': str explicando la decisión
         }
     """
-    # Cargar datos
-    frames, ys = load_points(detections_path)
-    
+    # Cargar datos (y el stride de muestreo con el que se generaron)
+    try:
+        columnas, meta = detecciones.cargar(detections_path)
+        ys = columnas['cy'].astype(float)
+    except FileNotFoundError:
+        ys, meta = np.array([]), {}
+    stride = int(meta.get('stride', 1))
+    return detect_on_off_series(ys, stride=stride, min_range=min_range, min_std=min_std,
+                                min_mean_change=min_mean_change, min_variance=min_variance)
+
+def detect_on_off_series(ys, stride=1, min_range=10.0, min_std=5.0, min_mean_change=1.0, min_variance=25.0):
+    """
+    detect_on_off sobre una serie de coordenadas Y ya cargada (ej. la de una sola bomba en
+    modo multi-bomba). Mismos umbrales y mismo resultado.
+    """
     # Validaciones
     if len(ys) == 0:
         return {
             'status': 'UNKNOWN',
             'confidence': 0.0,
             'metrics': {},
-            'reason': 'No se encontraron datos en detections.txt'
+            'reason': 'No se encontraron detecciones'
         }
     
     if len(ys) < 5:
@@ -132,7 +154,7 @@ def detect_on_off(detections_path,
         }
     
     # Calcular métricas
-    metrics = calculate_movement_metrics(ys)
+    metrics = calculate_movement_metrics(ys, stride=stride)
     
     # Sistema de puntuación para determinar ON/OFF
     scores = {
@@ -143,17 +165,8 @@ def detect_on_off(detections_path,
         'trend': 1.0 if abs(metrics['trend']) > 0.1 else 0.0  # Tendencia significativa
     }
     
-    # Peso de cada métrica
-    weights = {
-        'range': 0.3,
-        'std': 0.25,
-        'mean_change': 0.25,
-        'variance': 0.1,
-        'trend': 0.1
-    }
-    
     # Calcular score total
-    total_score = sum(scores[key] * weights[key] for key in scores)
+    total_score = sum(scores[key] * WEIGHTS[key] for key in scores)
     confidence = total_score
     
     # Determinar estado
@@ -175,6 +188,187 @@ def detect_on_off(detections_path,
         'n_points': len(ys)
     }
 
+def _rolling_max(x, w):
+    """Máximo en ventanas de w muestras (van Herk/Gil-Werman): O(n) sin importar w."""
+    n = len(x)
+    if w <= 1:
+        return x.copy()
+    nb = -(-n // w)
+    pad = np.full(nb * w, -np.inf)
+    pad[:n] = x
+    b = pad.reshape(nb, w)
+    g = np.maximum.accumulate(b, axis=1).ravel()                  # máximo desde el inicio del bloque
+    h = np.maximum.accumulate(b[:, ::-1], axis=1)[:, ::-1].ravel()  # máximo hasta el fin del bloque
+    return np.maximum(h[:n - w + 1], g[w - 1:n])
+
+def _window_sums(x, w):
+    """Suma de cada ventana de w muestras usando sumas acumuladas."""
+    c = np.concatenate(([0.0], np.cumsum(x)))
+    return c[w:] - c[:-w]
+
+def rolling_movement_metrics(ys, win):
+    """
+    Las mismas métricas que calculate_movement_metrics, pero para cada ventana de `win`
+    muestras consecutivas, en una sola pasada vectorizada (lineal en len(ys)).
+
+    Returns:
+        dict: Cada métrica es un array con un valor por ventana (len(ys) - win + 1)
+    """
+    ys = np.asarray(ys, dtype=float)
+    win = int(win)
+    if win < 2 or len(ys) < win:
+        raise ValueError(f"Ventana inválida: {win} (señal de {len(ys)} muestras)")
+
+    # Centrar la señal mejora la precisión de las sumas acumuladas en series largas
+    y = ys - ys.mean()
+
+    s1 = _window_sums(y, win)
+    s2 = _window_sums(y * y, win)
+    mean = s1 / win
+    variance = np.maximum(s2 / win - mean * mean, 0.0)
+
+    y_range = _rolling_max(ys, win) + _rolling_max(-ys, win)
+
+    changes = np.abs(np.diff(ys))
+    mean_change = _window_sums(changes, win - 1) / (win - 1)
+    max_change = _rolling_max(changes, win - 1)
+
+    # Pendiente de mínimos cuadrados con x = 0..win-1:
+    # sum((x - x_medio) * y) / sum((x - x_medio)^2)
+    idx = np.arange(len(y), dtype=float)
+    sxy = _window_sums(idx * y, win) - np.arange(len(s1)) * s1   # sum(x_local * y)
+    sxx = win * (win * win - 1) / 12.0
+    trend = (sxy - (win - 1) / 2.0 * s1) / sxx
+
+    return {
+        'variance': variance,
+        'std_dev': np.sqrt(variance),
+        'range': y_range,
+        'mean_change': mean_change,
+        'max_change': max_change,
+        'trend': np.abs(trend)
+    }
+
+def _runs(values):
+    """Tramos de valores iguales consecutivos: (inicios, fines exclusivos)."""
+    cambios = np.flatnonzero(values[1:] != values[:-1]) + 1
+    inicios = np.concatenate(([0], cambios))
+    fines = np.concatenate((cambios, [len(values)]))
+    return inicios, fines
+
+def detect_on_off_timeline(detections_path,
+                           fps=None,
+                           window_s=10.0,       # Duración de cada ventana en segundos
+                           min_segment_s=None,  # Tramos más cortos se absorben en el anterior
+                           min_range=10.0,
+                           min_std=5.0,
+                           min_mean_change=1.0,
+                           min_variance=25.0,
+                           bpm_min=0.8,
+                           bpm_max=10):
+    """
+    Línea de tiempo ON/OFF: aplica el mismo criterio que detect_on_off sobre ventanas
+    deslizantes de la señal interpolada y agrupa los frames en tramos ON/OFF.
+
+    Args:
+        detections_path: Ruta al archivo detections.npz (o detections.txt)
+        fps: FPS del video (default: el guardado en detections.npz, o 30)
+        window_s: Duración de la ventana de análisis en segundos
+        min_segment_s: Duración mínima de un tramo (default: window_s / 2)
+        min_*: Mismos umbrales que detect_on_off
+        bpm_min, bpm_max: Rango para el BPM de cada tramo ON
+
+    Returns:
+        dict: {
+            'status': estado del tramo más largo ('ON', 'OFF' o 'UNKNOWN'),
+            'segments': [{'start_frame', 'end_frame', 'start_s', 'end_s',
+                          'status', 'confidence', 'bpm'}, ...],
+            'window_frames': int,
+            'n_points': int
+        }
+    """
+    try:
+        columnas, meta = detecciones.cargar(detections_path)
+    except FileNotFoundError:
+        columnas, meta = detecciones.vacias(), {}
+    frames = columnas['frame'].astype(int)
+    ys = columnas['cy'].astype(float)
+    if fps is None:
+        fps = meta.get('fps') or 30.0
+
+    if len(ys) < 5:
+        return {'status': 'UNKNOWN', 'segments': [], 'window_frames': 0, 'n_points': len(ys),
+                'reason': f'Datos insuficientes: solo {len(ys)} puntos (mínimo 5)'}
+
+    # Señal densa por frame desde la primera detección (sin el relleno constante inicial)
+    f0 = int(frames.min())
+    y = bpm.interpolate_signal(frames, ys)[f0:]
+    n = len(y)
+    win = min(max(2, int(round(window_s * fps))), n)
+
+    metrics = rolling_movement_metrics(y, win)
+
+    # Mismo sistema de puntuación que detect_on_off, para todas las ventanas a la vez
+    scores = {
+        'range': metrics['range'] >= min_range,
+        'std': metrics['std_dev'] >= min_std,
+        'mean_change': metrics['mean_change'] >= min_mean_change,
+        'variance': metrics['variance'] >= min_variance,
+        'trend': metrics['trend'] > 0.1
+    }
+    total_score = sum(scores[key] * WEIGHTS[key] for key in scores)
+    active_metrics = sum(v.astype(int) for v in scores.values())
+    on = (active_metrics >= 3) | (total_score >= 0.6)
+
+    # Cada frame toma la ventana centrada en él (los bordes, la primera/última ventana)
+    centro = np.clip(np.arange(n) - win // 2, 0, len(on) - 1)
+    on_frame = on[centro]
+    score_frame = total_score[centro]
+
+    # Tramos, absorbiendo en el anterior los más cortos que min_segment_s
+    if min_segment_s is None:
+        min_segment_s = window_s / 2
+    min_len = max(1, int(round(min_segment_s * fps)))
+    inicios, fines = _runs(on_frame)
+    cortos = (fines - inicios) < min_len
+    cortos[0] = False
+    if cortos.any():
+        etiquetas = on_frame[inicios].copy()
+        # Cada tramo corto hereda la etiqueta del último tramo largo anterior
+        largo = np.where(~cortos, np.arange(len(inicios)), 0)
+        etiquetas = etiquetas[np.maximum.accumulate(largo)]
+        on_frame = np.repeat(etiquetas, fines - inicios)
+        inicios, fines = _runs(on_frame)
+
+    segments = []
+    for a, b in zip(inicios.tolist(), fines.tolist()):
+        status = 'ON' if on_frame[a] else 'OFF'
+        seg_score = float(score_frame[a:b].mean())
+        seg_bpm = None
+        if status == 'ON':
+            sel = (frames >= a + f0) & (frames < b + f0)
+            if sel.sum() >= 5:
+                seg_bpm, _ = bpm.bpm_cycle(frames[sel] - (a + f0), ys[sel], fps,
+                                           bpm_min=bpm_min, bpm_max=bpm_max)
+        segments.append({
+            'start_frame': a + f0,
+            'end_frame': b + f0 - 1,
+            'start_s': (a + f0) / fps,
+            'end_s': (b + f0 - 1) / fps,
+            'status': status,
+            # Confianza del veredicto del tramo: score medio si ON, su complemento si OFF
+            'confidence': seg_score if status == 'ON' else 1.0 - seg_score,
+            'bpm': seg_bpm
+        })
+
+    mas_largo = max(segments, key=lambda sg: sg['end_frame'] - sg['start_frame'])
+    return {
+        'status': mas_largo['status'],
+        'segments': segments,
+        'window_frames': win,
+        'n_points': len(ys)
+    }
+
 def check_pump_jack_status(OUTPUT_FILE):
     """
     Función principal que carga variables de entorno y detecta el estado.
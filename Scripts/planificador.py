@@ -0,0 +1,316 @@
+# PLANIFICADOR: VIGILA LA BANDEJA DE ENTRADA Y REPARTE LOS VIDEOS ENTRE N WORKERS.
+import json
+import os
+import queue
+import shutil
+import socket
+import time
+import traceback
+import multiprocessing as mp
+
+try:  # notificaciones del kernel (opcional); si no está, se hace polling
+    from inotify_simple import INotify, flags
+except ImportError:
+    INotify = None
+
+STAGING_DIR = ".claimed"  # subcarpeta oculta de PROCESSINGPATH (mismo filesystem -> rename atómico)
+PENDIENTES_DIR = "pendientes"  # dentro de STAGING_DIR: video -> run_dir de corridas sin terminar
+FALLIDOS_DIR = "fallidos"  # dentro de STAGING_DIR si no hay OUTPUTFAIL
+
+
+def listar_videos(path):
+    """Archivos de la bandeja de entrada (ignora carpetas y ocultos, como la de staging)."""
+    try:
+        nombres = os.listdir(path)
+    except FileNotFoundError:
+        return []
+    return sorted(
+        n for n in nombres
+        if not n.startswith(".") and os.path.isfile(os.path.join(path, n))
+    )
+
+
+def staging_dir(processing_path, worker):
+    """Carpeta de staging de un worker de este host."""
+    return os.path.join(processing_path, STAGING_DIR, f"{socket.gethostname()}-w{worker}")
+
+
+def reclamar(processing_path, nombre, destino):
+    """
+    Reclama un video moviéndolo (rename atómico) a la carpeta de staging del worker.
+
+    Si otro worker u otra instancia del daemon ya lo reclamó, el rename falla y se devuelve None.
+
+    Returns:
+        str: Nueva ruta del video, o None si no se pudo reclamar
+    """
+    os.makedirs(destino, exist_ok=True)
+    origen = os.path.join(processing_path, nombre)
+    reclamado = os.path.join(destino, nombre)
+    try:
+        os.rename(origen, reclamado)
+    except FileNotFoundError:
+        return None
+    return reclamado
+
+
+def devolver_reclamados(processing_path, workers):
+    """Devuelve a la bandeja los videos que quedaron en staging (daemon o worker caído)."""
+    for i in range(workers):
+        dir_w = staging_dir(processing_path, i)
+        for nombre in listar_videos(dir_w):
+            os.rename(os.path.join(dir_w, nombre), os.path.join(processing_path, nombre))
+            print(f"Video recuperado de staging: {nombre}")
+
+
+def apartar_fallido(processing_path, video_path):
+    """
+    Saca de staging un video cuyo procesamiento lanzó una excepción, a OUTPUTFAIL (como
+    los que fallan en la detección) o, sin OUTPUTFAIL, a STAGING_DIR/fallidos. Así no vuelve
+    a la bandeja si el worker se relanza y no se reintenta en un bucle.
+
+    Returns:
+        str: Nueva ruta del video, o None si ya no estaba en staging
+    """
+    if not os.path.exists(video_path):
+        return None  # ya se movió al run_dir (la excepción fue después de la detección)
+    destino = os.getenv("OUTPUTFAIL") or os.path.join(processing_path, STAGING_DIR, FALLIDOS_DIR)
+    os.makedirs(destino, exist_ok=True)
+    apartado = os.path.join(destino, os.path.basename(video_path))
+    shutil.move(video_path, apartado)
+    return apartado
+
+
+def _pendiente_path(processing_path, nombre):
+    return os.path.join(processing_path, STAGING_DIR, PENDIENTES_DIR, f"{nombre}.json")
+
+
+def video_id_pendiente(processing_path, nombre, tamano):
+    """
+    video_id de una corrida anterior de este mismo video que no terminó (daemon caído o
+    error con checkpoint), para reanudarla en el mismo run_dir. El tamaño del archivo
+    distingue un video nuevo que llega con el mismo nombre.
+    """
+    try:
+        with open(_pendiente_path(processing_path, nombre)) as f:
+            datos = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return datos.get("video_id") if datos.get("tamano") == tamano else None
+
+
+def registrar_pendiente(processing_path, nombre, video_id, tamano):
+    path = _pendiente_path(processing_path, nombre)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"video_id": video_id, "tamano": tamano}, f)
+    os.replace(tmp, path)
+
+
+def olvidar_pendiente(processing_path, nombre):
+    try:
+        os.remove(_pendiente_path(processing_path, nombre))
+    except FileNotFoundError:
+        pass
+
+
+class VigilanteBandeja:
+    """
+    Espera cambios en la bandeja de entrada y dice qué videos ya se pueden reclamar.
+
+    Un archivo que todavía se está copiando no se reparte: con inotify (si está disponible)
+    un video está listo cuando llega su CLOSE_WRITE o MOVED_TO; con polling (cada `sleep`
+    segundos), cuando su tamaño y su mtime no cambiaron entre dos revisiones. Con inotify se
+    vuelve a listar igual cada `rescan` segundos, con el criterio del polling, por si se
+    perdió algún evento (y para los archivos que ya estaban al arrancar).
+    """
+
+    def __init__(self, path, sleep=1, rescan=30):
+        self.path = path
+        self.sleep = sleep
+        self.rescan = rescan
+        self._firmas = {}  # nombre -> (tamaño, mtime) en la revisión anterior
+        self._ultima_revision = time.monotonic()
+        self._inotify = None
+        if INotify is not None:
+            try:
+                self._inotify = INotify()
+                self._inotify.add_watch(path, flags.CLOSE_WRITE | flags.MOVED_TO)
+            except OSError as e:
+                print("inotify no disponible, se usa polling:", e)
+                self._inotify = None
+
+    def revisar(self):
+        """
+        Lista la bandeja y compara con la revisión anterior.
+
+        Returns:
+            (presentes, listos): todos los videos de la bandeja y los que no cambiaron desde
+            la revisión anterior
+        """
+        firmas = {}
+        for nombre in listar_videos(self.path):
+            try:
+                st = os.stat(os.path.join(self.path, nombre))
+            except FileNotFoundError:
+                continue  # lo reclamó otro worker mientras se listaba
+            firmas[nombre] = (st.st_size, st.st_mtime_ns)
+        listos = [n for n, firma in firmas.items() if self._firmas.get(n) == firma]
+        self._firmas = firmas
+        self._ultima_revision = time.monotonic()
+        return list(firmas), listos
+
+    def esperar(self):
+        """Bloquea hasta que haya novedades (o venza el timeout); devuelve (presentes, listos)."""
+        if self._inotify is None:
+            time.sleep(self.sleep)
+            return self.revisar()
+        # La revisión completa corre cada `rescan` segundos aunque sigan llegando eventos
+        restante = max(0.0, self._ultima_revision + self.rescan - time.monotonic())
+        eventos = self._inotify.read(timeout=int(restante * 1000) + 1, read_delay=100)
+        completos = {e.name for e in eventos}
+        if time.monotonic() - self._ultima_revision >= self.rescan:
+            presentes, listos = self.revisar()
+            return presentes, [n for n in presentes if n in completos or n in listos]
+        presentes = listar_videos(self.path)
+        return presentes, [n for n in presentes if n in completos]
+
+
+def _trabajador(worker, cola, processing_path, threads):
+    # Cada worker carga sus propios modelos una sola vez
+    import torch
+    import detection
+    import detecciones
+    import procesamiento
+    import metricas
+    import graficador
+    import catalogo as catalogo_runs
+
+    if threads:
+        torch.set_num_threads(threads)
+    detector = detection.Detection()
+    destino = staging_dir(processing_path, worker)
+    contadores = metricas.ContadoresDaemon(os.getenv("METRICSDIR"), worker)
+    contadores.escribir()
+    # Gráficos en un proceso aparte (el worker no es daemon, así que puede tener hijos)
+    graficos = graficador.GraficadorFondo() if os.getenv("PLOTASYNC", "1") == "1" else None
+    # Cada worker registra sus corridas en el catálogo con su propia conexión
+    catalogo = catalogo_runs.desde_entorno()
+
+    while True:
+        t0 = time.monotonic()
+        nombre = cola.get()
+        contadores.esperando(time.monotonic() - t0)
+        if nombre is None:
+            if graficos is not None:
+                graficos.cerrar()
+            return
+        video_path = reclamar(processing_path, nombre, destino)
+        if video_path is None:
+            continue  # lo tomó otro worker u otra instancia
+        # Mismo run_dir que una corrida anterior sin terminar (ahí está su checkpoint)
+        tamano = os.path.getsize(video_path)
+        video_id = video_id_pendiente(processing_path, nombre, tamano)
+        if video_id is None:
+            video_id = procesamiento.nuevo_video_id(nombre)
+            registrar_pendiente(processing_path, nombre, video_id, tamano)
+        else:
+            print(f"[worker {worker}] Reanudando {nombre} en {video_id}")
+        print(f"[worker {worker}] Procesando {nombre}")
+        run_dir = os.path.join(os.getenv("OUTPUTPATH"), video_id)
+        try:
+            procesamiento.procesar_video(detector, video_path, video_id=video_id, contadores=contadores,
+                                         graficos=graficos, catalogo=catalogo)
+        except Exception:
+            # Un video que rompe el procesamiento (archivo corrupto, error de decodificación,
+            # del catálogo...) no tiene que tirar el worker: se aparta y se sigue con el próximo
+            print(f"[worker {worker}] Error procesando {nombre}:")
+            traceback.print_exc()
+            apartado = apartar_fallido(processing_path, video_path)
+            if apartado:
+                print(f"[worker {worker}] Video apartado en {apartado}")
+            procesamiento.unlink(os.path.join(run_dir, "_RUNNING"))
+            if catalogo is not None:
+                catalogo.registrar_run(run_dir, nombre, "error")
+        finally:
+            # Terminó (ok, off_prepass, error o excepción): el registro solo se conserva si la
+            # detección quedó a medias con un checkpoint para reanudar
+            if not os.path.exists(os.path.join(run_dir, detecciones.NOMBRE_CHECKPOINT)):
+                olvidar_pendiente(processing_path, nombre)
+
+
+class Planificador:
+    """
+    Reparte los videos de la bandeja entre `workers` procesos, cada uno con sus modelos.
+
+    El planificador solo avisa qué archivos terminaron de llegar; cada worker reclama el archivo con un rename
+    atómico antes de procesarlo, así que nunca dos workers (ni dos daemons) toman el mismo.
+    """
+
+    def __init__(self, processing_path, workers=1, sleep=1, threads=None):
+        self.processing_path = processing_path
+        self.workers = max(1, int(workers))
+        # Hilos de torch por worker: repartir los núcleos para no sobresuscribir la CPU
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.vigilante = VigilanteBandeja(processing_path, sleep=sleep)
+        self._ctx = mp.get_context("spawn")
+        self._cola = self._ctx.Queue()
+        self._procesos = {}
+
+    def _lanzar(self, i):
+        # Sin daemon=True: cada worker lanza su propio proceso de gráficos
+        p = self._ctx.Process(
+            target=_trabajador,
+            args=(i, self._cola, self.processing_path, self.threads),
+            name=f"worker-{i}"
+        )
+        p.start()
+        self._procesos[i] = p
+
+    def _revisar_workers(self):
+        # Si un worker murió, se devuelven sus videos a la bandeja y se relanza
+        for i, p in list(self._procesos.items()):
+            if not p.is_alive():
+                print(f"Worker {i} terminó inesperadamente (exit {p.exitcode}), relanzando")
+                dir_w = staging_dir(self.processing_path, i)
+                for nombre in listar_videos(dir_w):
+                    os.rename(os.path.join(dir_w, nombre), os.path.join(self.processing_path, nombre))
+                self._lanzar(i)
+
+    def run(self):
+        devolver_reclamados(self.processing_path, self.workers)
+        for i in range(self.workers):
+            self._lanzar(i)
+
+        encolados = set()
+        presentes, listos = self.vigilante.revisar()
+        try:
+            while True:
+                # Los que ya no están en la bandeja fueron reclamados: se pueden volver a encolar
+                encolados &= set(presentes)
+                for nombre in listos:
+                    if nombre not in encolados:
+                        self._cola.put(nombre)
+                        encolados.add(nombre)
+
+                self._revisar_workers()
+                presentes, listos = self.vigilante.esperar()
+        except KeyboardInterrupt:
+            print("Deteniendo workers...")
+        finally:
+            self.detener()
+
+    def detener(self, timeout=10):
+        # Vaciar la cola para que los workers vean el aviso de fin enseguida
+        try:
+            while True:
+                self._cola.get_nowait()
+        except queue.Empty:
+            pass
+        for _ in self._procesos:
+            self._cola.put(None)
+        for p in self._procesos.values():
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
@@ -0,0 +1,399 @@
+# PROCESA UN VIDEO COMPLETO: DETECCION -> GRAFICO -> ON/OFF -> BPM -> resultados.txt
+import os
+import shutil
+import numpy as np
+from datetime import datetime
+from dotenv import load_dotenv
+import graficador
+import bpm
+import on_off
+import movimiento
+import metricas
+import cache
+import catalogo as catalogo_runs
+import detecciones
+load_dotenv()
+
+# Rango de BPM esperado (también lo usa detection para planificar el muestreo)
+BPM_MIN = float(os.getenv("BPMMIN", "0.8"))
+BPM_MAX = float(os.getenv("BPMMAX", "10"))
+
+# Pre-análisis de movimiento: los videos claramente estáticos se marcan OFF sin correr YOLO
+PREPASS = os.getenv("PREPASS", "0") == "1"
+PREPASS_THRESHOLD = float(os.getenv("PREPASSTHRESHOLD", "0.002"))
+PREPASS_EVERY = float(os.getenv("PREPASSEVERY", "0.5"))
+PREPASS_MARGIN = float(os.getenv("PREPASSMARGIN", "0.5"))
+
+# Multi-bomba: series con menos puntos que esto (ids fugaces del asignador) no se reportan
+MULTI_MIN_POINTS = int(os.getenv("MULTIMINPOINTS", "30"))
+
+# Cache de detecciones por contenido (video + pesos + configuración); vacío = desactivado
+CACHE_PATH = os.getenv("CACHEPATH")
+
+def touch(path):
+    # Crear directorio si no existe
+    dir_path = os.path.dirname(path)
+    if dir_path and not os.path.exists(dir_path):
+        os.makedirs(dir_path, exist_ok=True)
+    with open(path, "a"):
+        os.utime(path, None)
+
+def unlink(path):
+    # Eliminar archivo si existe, sin error si no existe
+    if os.path.exists(path):
+        os.remove(path)
+
+def nuevo_video_id(nombre_video):
+    # Nombre del video + timestamp para la carpeta de salida
+    video_id_base = os.path.splitext(nombre_video)[0]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{video_id_base}_{timestamp}"
+
+def procesar_video(detector, video_path, video_id=None, output_path=None, contadores=None, graficos=None,
+                   catalogo=None):
+    """
+    Corre todo el análisis de un video ya reclamado y deja los marcadores en su run_dir.
+
+    Args:
+        detector: Instancia de detection.Detection (con los modelos ya cargados)
+        video_path: Ruta al video a procesar
+        video_id: Carpeta de salida (default: nombre del video + timestamp)
+        output_path: Raíz de salida (default: OUTPUTPATH)
+        contadores: metricas.ContadoresDaemon del worker (opcional)
+        catalogo: catalogo.Catalogo donde registrar la corrida (opcional)
+        graficos: graficador.GraficadorFondo del worker; si se pasa, el gráfico se hace en
+            segundo plano y _SUCCESS se marca recién cuando termina
+
+    Returns:
+        str: run_dir del video, o None si falló la detección
+    """
+    output_path = output_path or os.getenv("OUTPUTPATH")
+    m = metricas.MetricasRun()
+
+    # Obtener nombre del video
+    nombre_video = os.path.basename(video_path)
+    if video_id is None:
+        video_id = nuevo_video_id(nombre_video)
+    run_dir = os.path.join(output_path, video_id)  # /Output/video
+    touch(os.path.join(run_dir, "_RUNNING"))
+    if catalogo is not None:
+        catalogo.registrar_inicio(run_dir, nombre_video)
+
+    # Pre-análisis de movimiento: si la escena está quieta no hace falta detectar
+    if PREPASS:
+        with m.etapa("prepass"):
+            previo = movimiento.prepass_movimiento(video_path, cada_s=PREPASS_EVERY, umbral_off=PREPASS_THRESHOLD,
+                                                    margen=PREPASS_MARGIN)
+        print(previo['reason'])
+        if previo['status'] == 'OFF':
+            run_dir = cerrar_sin_detectar(video_path, run_dir, previo)
+            registrar_metricas(m, run_dir, contadores, "off_prepass", nombre_video, 'OFF',
+                               catalogo=catalogo, status_result=previo)
+            return run_dir
+
+    # Video ya procesado con los mismos pesos y configuración: se reutilizan sus detecciones
+    clave, en_cache = None, None
+    if CACHE_PATH:
+        with m.etapa("cache"):
+            # La firma tiene el hash de los pesos cargados: si cambiaron en disco, recargar
+            # antes para no reutilizar detecciones hechas con los pesos anteriores
+            detector.recargar_si_cambio()
+            clave = cache.clave(video_path, detector.firma())
+            en_cache = cache.buscar(CACHE_PATH, clave)
+
+    if en_cache:
+        m.contar("cache_hits")
+        run_dir_result, output_file = desde_cache(detector, en_cache, video_path, run_dir)
+    else:
+        # Llamar al método detectar() para procesar el video
+        # Retorna: run_dir, output_file
+        run_dir_result, output_file = detector.detectar(video_id=video_id, video_path=video_path, metricas_run=m)
+        if run_dir_result is not None and clave:
+            cache.guardar(CACHE_PATH, clave, output_file)
+
+    if run_dir_result is None:
+        # Error en el procesamiento, eliminar _RUNNING y continuar con siguiente video
+        unlink(os.path.join(run_dir, "_RUNNING"))
+        registrar_metricas(m, run_dir, contadores, "error", nombre_video, None, catalogo=catalogo)
+        return None
+
+    # Usar el run_dir retornado (por si acaso)
+    run_dir = run_dir_result
+
+    # FPS del video: lo guarda la detección en los metadatos (el video no se vuelve a abrir)
+    fps = detecciones.cargar_meta(output_file).get("fps") or 30.0
+    print(f"FPS: {fps}")
+
+    if detecciones.tiene_ids(output_file):
+        return procesar_bombas(output_file, run_dir, fps, m, contadores, graficos, nombre_video, catalogo)
+
+    # Puntos, señal suavizada y extremos se calculan una sola vez: los usan el gráfico y el BPM
+    with m.etapa("extremos"):
+        frames, ys, eventos, y_suave = extremos(output_file, fps)
+
+    # Graficar las detecciones: /Output/video/grafico_detecciones.png
+    # En segundo plano su tiempo se mide en el proceso del graficador (ver terminar_grafico)
+    grafico = None
+    if graficos is not None:
+        grafico = graficos.enviar(output_file, run_dir, frames=frames, ys=ys,
+                                  y_suave=y_suave, eventos=eventos)
+    else:
+        with m.etapa("grafico"):
+            graficador.graficar(output_file, run_dir, frames=frames, ys=ys,
+                                y_suave=y_suave, eventos=eventos)
+
+    # Verificar estado ON/OFF del pump jack y, si está funcionando, calcular el BPM
+    status_result, bpm_value, dbg = estado_y_bpm(output_file, eventos, fps, m)
+
+    # Archivo para guardar resultados BPM y ON/OFF: /Output/video/resultados.txt
+    resultados_file = os.path.join(run_dir, "resultados.txt")
+    escribir_resultados(resultados_file, status_result, bpm_value, dbg)
+
+    # Línea de tiempo ON/OFF por ventanas (opcional): tramos con confianza y BPM
+    if os.getenv("ONOFFTIMELINE", "0") == "1":
+        with m.etapa("timeline"):
+            escribir_timeline(output_file, resultados_file, fps)
+
+    estado = status_result.get('status') if status_result else None
+    analisis = dict(status_result=status_result, bpm_value=bpm_value, dbg=dbg)
+    registrar_metricas(m, run_dir, contadores, "ok", nombre_video, estado, catalogo=catalogo, **analisis)
+    if grafico is None:
+        marcar_terminado(run_dir)
+    else:
+        # Si el gráfico ya terminó, el callback corre acá mismo
+        grafico.add_done_callback(lambda fut: terminar_grafico(fut, run_dir, nombre_video, estado,
+                                                               catalogo, **analisis))
+    return run_dir
+
+def procesar_bombas(output_file, run_dir, fps, m, contadores, graficos, nombre_video, catalogo=None):
+    """Resto de procesar_video para una corrida multi-bomba: gráfico y resultados por bomba."""
+    series = detecciones.series_por_id(output_file)
+    grafico = None
+    if graficos is not None:
+        grafico = graficos.enviar(output_file, run_dir, series=series)
+    else:
+        with m.etapa("grafico"):
+            graficador.graficar(output_file, run_dir, series=series)
+
+    bombas = analizar_bombas(output_file, fps, m, series=series)
+    escribir_resultados_bombas(os.path.join(run_dir, "resultados.txt"), bombas)
+
+    estado = estado_bombas(bombas)
+    registrar_metricas(m, run_dir, contadores, "ok", nombre_video, estado, catalogo=catalogo, bombas=bombas)
+    if grafico is None:
+        marcar_terminado(run_dir)
+    else:
+        grafico.add_done_callback(lambda fut: terminar_grafico(fut, run_dir, nombre_video, estado,
+                                                               catalogo, bombas=bombas))
+    return run_dir
+
+def analizar_bombas(output_file, fps, m=None, umbrales=None, bpm_min=BPM_MIN, bpm_max=BPM_MAX,
+                    series=None, min_puntos=None):
+    """
+    ON/OFF de cada bomba y el BPM de todas las que están ON en una sola pasada de
+    bpm.bpm_cycle_batch (el mismo valor que daría cada serie por el camino de una bomba).
+
+    Returns:
+        [(id, status_result, bpm_value, dbg), ...] ordenado por id, sin las series con menos
+        de min_puntos detecciones (default: MULTIMINPOINTS)
+    """
+    m = m or metricas.MetricasRun()
+    min_puntos = MULTI_MIN_POINTS if min_puntos is None else min_puntos
+    stride = int(detecciones.cargar_meta(output_file).get("stride", 1))
+    if series is None:
+        series = detecciones.series_por_id(output_file)
+    series = {i: s for i, s in series.items() if len(s[0]) >= min_puntos}
+
+    with m.etapa("on_off"):
+        estados = {i: on_off.detect_on_off_series(ys, stride=stride, **(umbrales or {}))
+                   for i, (_, ys) in series.items()}
+
+    bpms = {}
+    encendidas = [i for i in series if estados[i]['status'] == 'ON']
+    if encendidas:
+        with m.etapa("bpm"):
+            # Misma señal que el camino de una bomba (extremos + bpm_from_events, desde el
+            # frame 0) y bpm_cycle_batch da lo mismo que bpm_cycle: el BPM de un pozo no
+            # depende de MULTIPUMP
+            Y = bpm.interpolate_signals([series[i] for i in encendidas])
+            valores, info = bpm.bpm_cycle_batch(Y, fps, bpm_min=bpm_min, bpm_max=bpm_max)
+        for k, i in enumerate(encendidas):
+            if np.isfinite(valores[k]):
+                bpms[i] = (float(valores[k]), {"median_period_s": float(info["median_period_s"][k]),
+                                               "n_periods": int(info["n_periods"][k])})
+
+    bombas = []
+    for i, status_result in estados.items():
+        bpm_value, dbg = bpms.get(i, (None, {}))
+        bpm_txt = f"{bpm_value:.2f}" if bpm_value else "N/A"
+        print(f"Bomba {i}: {status_result['status']} (Confianza: {status_result['confidence']:.0%}, BPM: {bpm_txt})")
+        bombas.append((i, status_result, bpm_value, dbg))
+    return bombas
+
+def estado_bombas(bombas):
+    # Resumen para metrics.json y reanalizar: "2/3 ON"
+    encendidas = sum(1 for _, st, _, _ in bombas if st['status'] == 'ON')
+    return f"{encendidas}/{len(bombas)} ON"
+
+def extremos(output_file, fps, bpm_min=BPM_MIN, bpm_max=BPM_MAX):
+    """
+    Carga los puntos y calcula la señal suavizada y los extremos alternados.
+
+    Returns:
+        (frames, ys, eventos, y_suave); eventos vacío e y_suave None si no hay detecciones
+    """
+    frames, ys = bpm.load_points(output_file)
+    eventos, y_suave = [], None
+    if len(frames):
+        y = bpm.interpolate_signal(frames, ys)
+        eventos, y_suave = bpm.alternating_extrema(y, fps, bpm_min=bpm_min, bpm_max=bpm_max)
+    return frames, ys, eventos, y_suave
+
+def estado_y_bpm(output_file, eventos, fps, m=None, umbrales=None):
+    """
+    ON/OFF (con los umbrales por defecto de on_off, o `umbrales`) y BPM si está ON.
+
+    Returns:
+        (status_result, bpm_value, dbg)
+    """
+    m = m or metricas.MetricasRun()
+    with m.etapa("on_off"):
+        if umbrales:
+            status_result = on_off.detect_on_off(output_file, **umbrales)
+        else:
+            status_result = on_off.check_pump_jack_status(output_file)
+
+    bpm_value, dbg = None, {}
+    if status_result and status_result.get('status') == 'ON':  # Si el pump jack está funcionando, calculamos el BPM
+        print(f"Estado Pump Jack: {status_result['status']} (Confianza: {status_result['confidence']:.0%})")
+
+        # Calculamos el BPM
+        with m.etapa("bpm"):
+            bpm_value, dbg = bpm.bpm_from_events(eventos, fps)
+        print("BPM:", bpm_value)
+
+    elif status_result:  # Si el pump jack no está funcionando, no calculamos el BPM
+        print("Pump Jack no está funcionando")
+        print(f"Estado Pump Jack: {status_result['status']} (Confianza: {status_result['confidence']:.0%})")
+
+    else:
+        print("Error al verificar estado del Pump Jack")
+    return status_result, bpm_value, dbg
+
+def desde_cache(detector, en_cache, video_path, run_dir):
+    """Arma el run_dir con las detecciones del cache en lugar de correr la detección."""
+    os.makedirs(run_dir, exist_ok=True)
+    output_file = os.path.join(run_dir, detecciones.NOMBRE)
+    shutil.copyfile(en_cache, output_file)
+    if detector.DETECTIONS_TXT:
+        columnas, _ = detecciones.cargar(output_file)
+        detecciones.exportar_txt(columnas, os.path.join(run_dir, detecciones.NOMBRE_TXT))
+    shutil.move(video_path, os.path.join(run_dir, os.path.basename(video_path)))
+    print(f"Detecciones tomadas del cache: {en_cache}")
+    return run_dir, output_file
+
+def marcar_terminado(run_dir, grafico=None):
+    # _RUNNING -> _SUCCESS; con gráfico en segundo plano, cuando el gráfico termina
+    if grafico is not None and grafico.exception() is not None:
+        print("Error generando el gráfico:", grafico.exception())
+    unlink(os.path.join(run_dir, "_RUNNING"))
+    touch(os.path.join(run_dir, "_SUCCESS"))
+
+def terminar_grafico(fut, run_dir, nombre_video, estado, catalogo=None, **analisis):
+    """
+    Callback del gráfico en segundo plano: cuando termina, agrega su tiempo (medido en el
+    proceso del graficador) a metrics.json, completa la fila del catálogo con ese tiempo y
+    la ruta del png, y marca _SUCCESS.
+    """
+    try:
+        if fut.exception() is None:
+            _, segundos = fut.result()
+            datos = metricas.agregar_etapa(run_dir, "grafico", segundos)
+            if catalogo is not None:
+                # El callback corre en otro hilo: conexión propia (las de sqlite3 no se comparten)
+                cat = catalogo_runs.Catalogo(catalogo.path)
+                try:
+                    cat.registrar_run(run_dir, nombre_video, "ok", datos, estado=estado, **analisis)
+                finally:
+                    cat.cerrar()
+    except Exception as e:
+        # Métricas o catálogo: que no impida marcar _SUCCESS (el gráfico y resultados.txt ya están)
+        print("Error registrando el gráfico en métricas/catálogo:", e)
+    finally:
+        marcar_terminado(run_dir, fut)
+
+def registrar_metricas(m, run_dir, contadores, resultado, nombre_video, estado, catalogo=None, **analisis):
+    # metrics.json junto a resultados.txt, contadores acumulados del worker y, con catálogo,
+    # la fila de la corrida (analisis: status_result, bpm_value, dbg o bombas)
+    datos = None
+    try:
+        datos = m.guardar(run_dir, video=nombre_video, resultado=resultado, estado=estado)
+        if contadores is not None:
+            contadores.registrar(resultado, m)
+    except OSError as e:
+        print("Error guardando métricas:", e)
+    if catalogo is not None:
+        catalogo.registrar_run(run_dir, nombre_video, resultado, datos or m.resumen(), estado=estado, **analisis)
+
+def cerrar_sin_detectar(video_path, run_dir, status_result):
+    """
+    Cierra un video que el pre-análisis ya clasificó OFF: lo mueve al run_dir y escribe
+    resultados.txt como si hubiera pasado por la detección (sin detections.npz ni gráfico).
+    """
+    shutil.move(video_path, os.path.join(run_dir, os.path.basename(video_path)))
+    print(f"Estado Pump Jack: OFF por pre-análisis (Confianza: {status_result['confidence']:.0%})")
+    escribir_resultados(os.path.join(run_dir, "resultados.txt"), status_result)
+    unlink(os.path.join(run_dir, "_RUNNING"))
+    touch(os.path.join(run_dir, "_SUCCESS"))
+    return run_dir
+
+def escribir_resultados(resultados_file, status_result, bpm_value=None, dbg=None):
+    # Archivo de resultados con el estado ON/OFF y, si está ON, el BPM
+    with open(resultados_file, "w") as f:
+        f.write("=== RESULTADOS DEL ANÁLISIS ===\n\n")
+        _escribir_estado(f, status_result, bpm_value, dbg)
+
+def escribir_resultados_bombas(resultados_file, bombas):
+    # Multi-bomba: una sección por bomba con el mismo contenido que escribir_resultados
+    with open(resultados_file, "w") as f:
+        f.write("=== RESULTADOS DEL ANÁLISIS ===\n\n")
+        f.write(f"Bombas detectadas: {len(bombas)}\n")
+        if not bombas:
+            f.write("\nError: No se pudo determinar el estado del Pump Jack\n")
+        for i, status_result, bpm_value, dbg in bombas:
+            f.write(f"\n=== BOMBA {i} ===\n\n")
+            _escribir_estado(f, status_result, bpm_value, dbg)
+
+def _escribir_estado(f, status_result, bpm_value=None, dbg=None):
+    dbg = dbg or {}
+    if not status_result:
+        f.write("Error: No se pudo determinar el estado del Pump Jack\n")
+        return
+    f.write(f"Estado Pump Jack: {status_result['status']}\n")
+    f.write(f"Confianza: {status_result['confidence']:.2%}\n")
+    f.write(f"Razón: {status_result['reason']}\n")
+    if 'n_muestras' in status_result:
+        f.write(f"Muestras del pre-análisis: {status_result['n_muestras']}\n\n")
+    else:
+        f.write(f"Puntos analizados: {status_result.get('n_points', 0)}\n\n")
+    if status_result['status'] != 'ON':
+        f.write("BPM: No calculado (Pump Jack apagado)\n")
+    elif bpm_value:
+        f.write(f"BPM: {bpm_value:.2f}\n")
+        f.write(f"Período mediano: {dbg.get('median_period_s', 'N/A')} segundos\n")
+        f.write(f"Número de períodos: {dbg.get('n_periods', 'N/A')}\n")
+    else:
+        f.write("BPM: No se pudo calcular\n")
+
+def escribir_timeline(output_file, resultados_file, fps, window_s=None, bpm_min=BPM_MIN, bpm_max=BPM_MAX):
+    timeline = on_off.detect_on_off_timeline(
+        output_file, fps=fps or None,
+        window_s=window_s or float(os.getenv("ONOFFWINDOW", "10")),
+        bpm_min=bpm_min, bpm_max=bpm_max
+    )
+    with open(resultados_file, "a") as f:
+        f.write("\n=== LÍNEA DE TIEMPO ON/OFF ===\n\n")
+        for sg in timeline['segments']:
+            bpm_txt = f"{sg['bpm']:.2f}" if sg['bpm'] else "N/A"
+            f.write(f"{sg['start_s']:.1f}s - {sg['end_s']:.1f}s: {sg['status']} "
+                    f"(Confianza: {sg['confidence']:.2%}, BPM: {bpm_txt})\n")
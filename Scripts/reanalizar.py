@@ -0,0 +1,124 @@
+# RE-ANÁLISIS: VUELVE A CORRER ON/OFF Y BPM SOBRE LAS DETECCIONES GUARDADAS, SIN YOLO.
+"""
+Cambiar un umbral de on_off o el rango de BPM no requiere volver a inferir: las detecciones
+de cada corrida ya están en su detections.npz. Este comando recorre los run_dir de OUTPUTPATH
+(en paralelo) y reescribe resultados.txt con los parámetros nuevos (y el veredicto en el
+catálogo de corridas, si existe).
+
+Uso:
+    python Scripts/reanalizar.py --bpm-max 12 --min-range 15
+    python Scripts/reanalizar.py /ruta/a/Outputs --workers 8 --timeline --graficar
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+import detecciones
+import catalogo
+
+
+def listar_runs(output_path):
+    """run_dir con detecciones (npz, o detections.txt de corridas viejas)."""
+    runs = []
+    for nombre in sorted(os.listdir(output_path)):
+        run_dir = os.path.join(output_path, nombre)
+        for archivo in (detecciones.NOMBRE, detecciones.NOMBRE_TXT):
+            if os.path.isfile(os.path.join(run_dir, archivo)):
+                runs.append((run_dir, os.path.join(run_dir, archivo)))
+                break
+    return runs
+
+
+def reanalizar_run(run_dir, output_file, umbrales, bpm_min, bpm_max, fps_defecto=30.0,
+                   timeline=False, window_s=None, graficar=False, catalogo_path=None):
+    """
+    Recalcula ON/OFF y BPM de una corrida y reescribe su resultados.txt (por bomba si la
+    corrida es multi-bomba; ahí no hay línea de tiempo).
+
+    Returns:
+        (run_dir, estado, bpm) o (run_dir, "ERROR: ...", None); en multi-bomba estado es
+        el resumen ("2/3 ON") y bpm None
+    """
+    import procesamiento
+    try:
+        meta = detecciones.cargar_meta(output_file)
+        fps = float(meta.get("fps") or fps_defecto)
+        if detecciones.tiene_ids(output_file):
+            series = detecciones.series_por_id(output_file)
+            bombas = procesamiento.analizar_bombas(output_file, fps, umbrales=umbrales, bpm_min=bpm_min,
+                                                   bpm_max=bpm_max, series=series)
+            procesamiento.escribir_resultados_bombas(os.path.join(run_dir, "resultados.txt"), bombas)
+            estado = procesamiento.estado_bombas(bombas)
+            if catalogo_path:
+                _actualizar_catalogo(catalogo_path, run_dir, bombas=bombas, estado=estado)
+            if graficar:
+                import graficador
+                graficador.graficar(output_file, run_dir, series=series)
+            return run_dir, estado, None
+        frames, ys, eventos, y_suave = procesamiento.extremos(output_file, fps, bpm_min=bpm_min, bpm_max=bpm_max)
+        status_result, bpm_value, dbg = procesamiento.estado_y_bpm(output_file, eventos, fps, umbrales=umbrales)
+        resultados_file = os.path.join(run_dir, "resultados.txt")
+        procesamiento.escribir_resultados(resultados_file, status_result, bpm_value, dbg)
+        if timeline:
+            procesamiento.escribir_timeline(output_file, resultados_file, fps, window_s=window_s,
+                                            bpm_min=bpm_min, bpm_max=bpm_max)
+        if graficar:
+            import graficador
+            graficador.graficar(output_file, run_dir, frames=frames, ys=ys, y_suave=y_suave, eventos=eventos)
+        if catalogo_path:
+            _actualizar_catalogo(catalogo_path, run_dir, status_result=status_result, bpm_value=bpm_value, dbg=dbg)
+    except Exception as e:
+        return run_dir, f"ERROR: {e}", None
+    return run_dir, status_result.get('status') if status_result else None, bpm_value
+
+
+def _actualizar_catalogo(path, run_dir, **analisis):
+    cat = catalogo.Catalogo(path)
+    try:
+        cat.registrar_analisis(run_dir, **analisis)
+    finally:
+        cat.cerrar()
+
+
+def main(argv=None):
+    load_dotenv()
+    p = argparse.ArgumentParser(description="Recalcula ON/OFF y BPM de las corridas guardadas")
+    p.add_argument("output", nargs="?", default=os.getenv("OUTPUTPATH"), help="Raíz de salida (default: OUTPUTPATH)")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--fps", type=float, default=30.0, help="FPS para corridas sin metadatos (detections.txt)")
+    p.add_argument("--bpm-min", type=float, default=float(os.getenv("BPMMIN", "0.8")))
+    p.add_argument("--bpm-max", type=float, default=float(os.getenv("BPMMAX", "10")))
+    p.add_argument("--min-range", type=float, help="Umbral de on_off.detect_on_off")
+    p.add_argument("--min-std", type=float, help="Umbral de on_off.detect_on_off")
+    p.add_argument("--min-mean-change", type=float, help="Umbral de on_off.detect_on_off")
+    p.add_argument("--min-variance", type=float, help="Umbral de on_off.detect_on_off")
+    p.add_argument("--timeline", action="store_true", help="Agrega la línea de tiempo ON/OFF")
+    p.add_argument("--window", type=float, help="Ventana (s) de la línea de tiempo (default: ONOFFWINDOW)")
+    p.add_argument("--graficar", action="store_true", help="Rehace también el gráfico")
+    args = p.parse_args(argv)
+
+    umbrales = {k: v for k, v in (("min_range", args.min_range), ("min_std", args.min_std),
+                                  ("min_mean_change", args.min_mean_change),
+                                  ("min_variance", args.min_variance)) if v is not None}
+    runs = listar_runs(args.output)
+    # Solo se actualiza un catálogo que ya existe (no se crea uno para re-analizar)
+    catalogo_path = catalogo.path_por_defecto()
+    if catalogo_path and not os.path.exists(catalogo_path):
+        catalogo_path = None
+    print(f"Re-analizando {len(runs)} corridas en {args.output} con {args.workers} procesos")
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futuros = [pool.submit(reanalizar_run, run_dir, output_file, umbrales, args.bpm_min, args.bpm_max,
+                               fps_defecto=args.fps, timeline=args.timeline, window_s=args.window,
+                               graficar=args.graficar, catalogo_path=catalogo_path)
+                   for run_dir, output_file in runs]
+        resultados = [f.result() for f in futuros]
+
+    for run_dir, estado, valor in resultados:
+        bpm_txt = f"{valor:.2f}" if valor else "N/A"
+        print(f"{os.path.basename(run_dir)}: {estado} (BPM: {bpm_txt})")
+    return resultados
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# REGION DE INTERES: APRENDE DONDE SE MUEVE EL RODHEAD PARA INFERIR SOLO SOBRE ESE RECORTE.
+import math
+
+
+class RegionInteres:
+    """
+    Región de interés del rodhead para inferir sobre un recorte en lugar del frame completo.
+
+    La cámara es fija y el rodhead solo se mueve verticalmente dentro de una franja, así que
+    alcanza con las primeras detecciones a frame completo para saber dónde buscarlo:
+
+    1. Aprendizaje: mientras no hay región, se infiere a frame completo y se acumula la unión
+       de las cajas del rodhead. Con `frames_aprendizaje` detecciones se fija la región
+       (la unión más un margen proporcional al tamaño de la caja).
+    2. Recorte: se infiere solo sobre la región y las cajas se trasladan al frame completo.
+       Si una detección queda cerca del borde, la región se agranda para incluirla.
+    3. Si en el recorte se pierde el rodhead o la confianza baja de `conf_min`, se vuelve a
+       detectar a frame completo y se reaprende la región.
+
+    Args:
+        size: (w, h) del frame completo
+        margen: Margen alrededor de la unión de cajas, como fracción del ancho/alto de la caja
+        frames_aprendizaje: Detecciones a frame completo necesarias para fijar la región
+        conf_min: Confianza mínima en el recorte para seguir confiando en la región
+    """
+
+    def __init__(self, size, margen=0.5, frames_aprendizaje=30, conf_min=0.4):
+        self.w, self.h = size
+        self.margen = margen
+        self.frames_aprendizaje = max(1, int(frames_aprendizaje))
+        self.conf_min = conf_min
+        self.region = None        # (x0, y0, x1, y1) en píxeles del frame completo
+        self._union = None
+        self._vistas = 0
+        self._cajas_w = 0.0
+        self._cajas_h = 0.0
+        self.reaprendizajes = 0
+
+    def recorte(self):
+        """Región actual (x0, y0, x1, y1), o None si todavía se infiere a frame completo."""
+        return self.region
+
+    def imgsz(self, imgsz_base):
+        """
+        Tamaño de inferencia para el recorte que mantiene la misma escala (píxeles por
+        objeto) que la inferencia a frame completo con `imgsz_base`.
+        """
+        x0, y0, x1, y1 = self.region
+        escala = imgsz_base / max(self.w, self.h)
+        lado = max(x1 - x0, y1 - y0) * escala
+        return int(min(imgsz_base, max(32, math.ceil(lado / 32) * 32)))
+
+    def observar(self, caja):
+        """
+        Registra una detección a frame completo (fase de aprendizaje).
+
+        Args:
+            caja: (cx, cy, w, h, conf) en coordenadas del frame completo, o None
+        """
+        if self.region is not None or caja is None:
+            return
+        cx, cy, bw, bh, _ = caja
+        x0, y0, x1, y1 = cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2
+        if self._union is None:
+            self._union = [x0, y0, x1, y1]
+        else:
+            u = self._union
+            self._union = [min(u[0], x0), min(u[1], y0), max(u[2], x1), max(u[3], y1)]
+        self._vistas += 1
+        self._cajas_w = max(self._cajas_w, bw)
+        self._cajas_h = max(self._cajas_h, bh)
+
+        if self._vistas >= self.frames_aprendizaje:
+            self.region = self._con_margen(self._union)
+
+    def ampliar(self, caja):
+        """
+        Con la región ya fijada, la agranda si una detección confiable quedó cerca del borde
+        (el aprendizaje puede no haber visto la carrera completa del rodhead).
+        """
+        if self.region is None or caja is None:
+            return
+        cx, cy, bw, bh, _ = caja
+        x0, y0, x1, y1 = self._con_margen([cx - bw / 2, cy - bh / 2, cx + bw / 2, cy + bh / 2])
+        r = self.region
+        self.region = (min(r[0], x0), min(r[1], y0), max(r[2], x1), max(r[3], y1))
+
+    def _con_margen(self, u):
+        mx, my = self._cajas_w * self.margen, self._cajas_h * self.margen
+        return (
+            max(0, int(u[0] - mx)), max(0, int(u[1] - my)),
+            min(self.w, int(math.ceil(u[2] + mx))), min(self.h, int(math.ceil(u[3] + my)))
+        )
+
+    def confiable(self, caja):
+        """Indica si la detección en el recorte alcanza para seguir usando la región."""
+        return caja is not None and caja[4] >= self.conf_min
+
+    def perder(self):
+        """Descarta la región: las próximas inferencias vuelven a frame completo."""
+        self.region = None
+        self._union = None
+        self._vistas = 0
+        self._cajas_w = self._cajas_h = 0.0
+        self.reaprendizajes += 1
@@ -0,0 +1,147 @@
+# SEGUIMIENTO LIVIANO DEL RODHEAD ENTRE DETECCIONES (FLUJO ÓPTICO LUCAS-KANADE).
+import cv2
+import numpy as np
+
+_LK = dict(winSize=(21, 21), maxLevel=3,
+           criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+class SeguidorFlujo:
+    """
+    Sigue la caja del rodhead de un frame al siguiente con flujo óptico, para no correr YOLO
+    en todos los frames.
+
+    iniciar() toma puntos característicos dentro de la caja detectada; actualizar() los sigue
+    con Lucas-Kanade (con chequeo ida y vuelta) y desplaza la caja según el movimiento mediano.
+    La confianza es la fracción de los puntos iniciales que se siguen bien: cuando baja, el
+    llamador vuelve a correr el detector.
+
+    Args:
+        max_puntos: Puntos característicos a seguir dentro de la caja
+        fb_max: Error máximo ida y vuelta (píxeles) para aceptar un punto
+        min_puntos: Con menos puntos que esto el seguimiento se da por perdido
+    """
+
+    def __init__(self, max_puntos=40, fb_max=1.0, min_puntos=5):
+        self.max_puntos = max_puntos
+        self.fb_max = fb_max
+        self.min_puntos = min_puntos
+        self.caja = None
+        self._prev = None
+        self._pts = None
+        self._n0 = 0
+
+    def activo(self):
+        return self.caja is not None
+
+    def iniciar(self, frame, caja):
+        """Arranca (o reinicia) el seguimiento desde una detección; caja None lo detiene."""
+        self.caja = None
+        self._pts = None
+        if caja is None:
+            return
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        cx, cy, w, h, _ = caja
+        x0, y0 = max(0, int(cx - w / 2)), max(0, int(cy - h / 2))
+        x1, y1 = min(gray.shape[1], int(cx + w / 2) + 1), min(gray.shape[0], int(cy + h / 2) + 1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        mask = np.zeros_like(gray)
+        mask[y0:y1, x0:x1] = 255
+        pts = cv2.goodFeaturesToTrack(gray, maxCorners=self.max_puntos, qualityLevel=0.01,
+                                      minDistance=3, mask=mask)
+        if pts is None or len(pts) < self.min_puntos:
+            return
+        self.caja = caja
+        self._prev = gray
+        self._pts = pts
+        self._n0 = len(pts)
+
+    def actualizar(self, frame):
+        """
+        Sigue la caja hasta este frame.
+
+        Returns:
+            (cx, cy, w, h, confianza) o None si no hay seguimiento activo
+        """
+        if self.caja is None:
+            return None
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        nuevos, st, _ = cv2.calcOpticalFlowPyrLK(self._prev, gray, self._pts, None, **_LK)
+        atras, st2, _ = cv2.calcOpticalFlowPyrLK(gray, self._prev, nuevos, None, **_LK)
+        fb = np.linalg.norm((self._pts - atras).reshape(-1, 2), axis=1)
+        ok = (st.ravel() == 1) & (st2.ravel() == 1) & (fb < self.fb_max)
+
+        cx, cy, w, h, _ = self.caja
+        conf = float(ok.sum() / self._n0)
+        if ok.sum() < self.min_puntos:
+            self.caja = None
+            return (cx, cy, w, h, 0.0)
+
+        dx, dy = np.median((nuevos - self._pts).reshape(-1, 2)[ok], axis=0)
+        self.caja = (cx + float(dx), cy + float(dy), w, h, conf)
+        self._prev = gray
+        self._pts = nuevos[ok].reshape(-1, 1, 2)
+        return self.caja
+
+
+class AsignadorIds:
+    """
+    IDs estables para varias bombas en el mismo video (modo multi-bomba).
+
+    En cada frame inferido se asocian las cajas detectadas con las bombas ya vistas, de a
+    pares de menor distancia entre centros (greedy), medida en tamaños de caja de la bomba.
+    Una caja sin bomba cercana abre un id nuevo; una bomba que no aparece durante más de
+    `max_perdidos` muestras se olvida (si vuelve, recibe otro id).
+
+    Args:
+        max_dist: Distancia máxima entre centros, en tamaños de caja, para asociar
+        max_perdidos: Muestras sin ver una bomba antes de olvidarla
+    """
+
+    def __init__(self, max_dist=1.5, max_perdidos=30):
+        self.max_dist = max_dist
+        self.max_perdidos = max_perdidos
+        self._pistas = {}  # id -> (cx, cy, w, h, última muestra)
+        self._siguiente = 0
+
+    def sembrar(self, filas, stride=1):
+        """
+        Retoma desde filas [(frame, cx, cy, w, h, conf, tracked, id), ...] ya asignadas (al
+        reanudar desde un checkpoint): la última caja de cada id queda como su posición.
+        """
+        for fila in filas:
+            cx, cy, w, h = fila[1:5]
+            self._pistas[int(fila[7])] = (cx, cy, w, h, (int(fila[0]) - 1) // stride)
+            self._siguiente = max(self._siguiente, int(fila[7]) + 1)
+
+    def asignar(self, muestra, cajas):
+        """
+        Args:
+            muestra: Número de muestra del frame (0, 1, 2...)
+            cajas: [(cx, cy, w, h, conf), ...] del frame
+
+        Returns:
+            list: id de cada caja, en el mismo orden
+        """
+        self._pistas = {i: p for i, p in self._pistas.items() if muestra - p[4] <= self.max_perdidos}
+        pares = []
+        for j, (cx, cy, w, h, _) in enumerate(cajas):
+            for i, (px, py, pw, ph, _) in self._pistas.items():
+                d = np.hypot(cx - px, cy - py) / max(pw, ph, 1.0)
+                if d <= self.max_dist:
+                    pares.append((d, j, i))
+        pares.sort()
+
+        ids = [None] * len(cajas)
+        usados = set()
+        for _, j, i in pares:
+            if ids[j] is None and i not in usados:
+                ids[j] = i
+                usados.add(i)
+        for j, caja in enumerate(cajas):
+            if ids[j] is None:
+                ids[j] = self._siguiente
+                self._siguiente += 1
+            self._pistas[ids[j]] = (*caja[:4], muestra)
+        return ids
@@ -0,0 +1,95 @@
+# EQUIVALENCIA DE bpm_cycle (UNA SEÑAL) CON bpm_cycle_batch (MUCHAS A LA VEZ) Y CON BPMOnline (PUNTO A PUNTO).
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import bpm  # noqa: E402
+
+
+def _series(rng, n_series, decimales):
+    # Señales senoidales con ruido y frames salteados; con decimales=0 los cy son enteros,
+    # como los centros de las cajas de YOLO (muchas mesetas en la señal suavizada)
+    series = []
+    for _ in range(n_series):
+        n = int(rng.integers(200, 3000))
+        frames = np.sort(rng.choice(n, size=int(rng.integers(50, n)), replace=False))
+        b = rng.uniform(2, 15)
+        ys = 200 + rng.uniform(5, 60) * np.sin(2 * np.pi * b / 60 * frames / 30)
+        ys = ys + rng.normal(0, rng.uniform(0, 5), len(frames))
+        if decimales is not None:
+            ys = np.round(ys, decimales)
+        series.append((frames, ys))
+    return series
+
+
+@pytest.mark.parametrize("decimales", [None, 1, 0])
+def test_batch_igual_a_bpm_cycle(decimales):
+    series = _series(np.random.default_rng(0), 300, decimales)
+    esperado = []
+    for frames, ys in series:
+        valor, _ = bpm.bpm_cycle(frames, ys, 30, bpm_min=0.8, bpm_max=20)
+        esperado.append(np.nan if valor is None else valor)
+
+    bpms, info = bpm.bpm_cycle_batch(bpm.interpolate_signals(series), 30, bpm_min=0.8, bpm_max=20)
+
+    np.testing.assert_array_equal(bpms, np.array(esperado))
+    assert np.isfinite(bpms).sum() > 250
+
+
+def test_batch_senales_cortas():
+    # Más cortas que la ventana de suavizado: smooth_ma devuelve win muestras
+    rng = np.random.default_rng(1)
+    series = []
+    for _ in range(300):
+        n = int(rng.integers(3, 40))
+        frames = np.sort(rng.choice(n, size=int(rng.integers(2, n)), replace=False))
+        series.append((frames, rng.integers(0, 4, len(frames)).astype(float)))
+    esperado = [bpm.bpm_cycle(f, y, 2, bpm_max=20)[0] for f, y in series]
+    bpms, _ = bpm.bpm_cycle_batch(bpm.interpolate_signals(series), 2, bpm_max=20)
+    np.testing.assert_array_equal(bpms, np.array([np.nan if v is None else v for v in esperado]))
+
+
+@pytest.mark.parametrize("stride", [1, 3])
+def test_online_igual_a_bpm_cycle(stride):
+    # Frames con stride (muestreo) y huecos (frames sin detección), cy con y sin redondeo
+    rng = np.random.default_rng(stride)
+    for k in range(100):
+        n = int(rng.integers(300, 4000))
+        frames = np.arange(1, n, stride)
+        frames = frames[rng.random(len(frames)) > rng.uniform(0, 0.4)]
+        ys = 200 + rng.uniform(5, 60) * np.sin(2 * np.pi * rng.uniform(2, 15) / 60 * frames / 30)
+        ys = ys + rng.normal(0, rng.uniform(0, 3), len(frames))
+        if k % 2:
+            ys = np.round(ys)
+
+        esperado, info = bpm.bpm_cycle(frames, ys, 30, bpm_min=0.8, bpm_max=20)
+        est = bpm.BPMOnline(30, bpm_min=0.8, bpm_max=20)
+        for f, y in zip(frames, ys):
+            est.agregar(f, y)
+        valor, dbg = est.finalizar()
+
+        assert valor == esperado
+        if esperado is not None:
+            assert dbg["n_periods"] == info["n_periods"]
+
+
+def test_online_memoria_acotada():
+    # 20 minutos a 30 fps y 12 BPM: ~240 ciclos, con lugar para solo 10 períodos
+    frames = np.arange(1, 36000)
+    ys = 200 + 40 * np.sin(2 * np.pi * 12 / 60 * frames / 30)
+    est = bpm.BPMOnline(30, bpm_min=0.8, bpm_max=20, max_periodos=10)
+    tamanos = []
+    for f, y in zip(frames, ys):
+        est.agregar(f, y)
+        tamanos.append((len(est._buf), len(est._finales), len(est._cerrados), len(est._eventos_muestra),
+                        len(est.periodos)))
+
+    buf, finales, cerrados, muestra, periodos = np.max(tamanos, axis=0)
+    assert periodos == 10
+    assert buf <= 2 * est._win and finales <= 3 and cerrados <= 2 and muestra <= 10
+    assert est.n_eventos > 400
+    valor, _ = est.finalizar()
+    assert abs(valor - 12) < 0.1
@@ -0,0 +1,55 @@
+# CACHE DE DETECCIONES: LA CLAVE CAMBIA CON LOS PESOS Y LA CONFIGURACIÓN, NO CON EL NOMBRE DEL VIDEO.
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import cache  # noqa: E402
+
+
+def _escribir(path, datos):
+    with open(path, "wb") as f:
+        f.write(datos)
+    return str(path)
+
+
+def _firma(pesos, **config):
+    # Como Detection.firma(): hash de los pesos cargados más la configuración de detección
+    return {"modelo": cache.hash_archivo(pesos), "backend": "torch", "imgsz": 640, **config}
+
+
+def test_clave_cambia_con_la_firma(tmp_path):
+    video = _escribir(tmp_path / "pozo12.mp4", b"video" * 1000)
+    pesos = _escribir(tmp_path / "best.pt", b"pesos-v1")
+    antes = cache.clave(video, _firma(pesos))
+
+    assert cache.clave(video, _firma(pesos)) == antes
+    assert cache.clave(video, _firma(pesos, imgsz=960)) != antes
+    assert cache.clave(video, _firma(pesos, sampling="auto")) != antes
+
+    # Pesos reemplazados en disco: otra clave
+    _escribir(pesos, b"pesos-v2")
+    assert cache.clave(video, _firma(pesos)) != antes
+
+
+def test_clave_depende_del_contenido_no_del_nombre(tmp_path):
+    pesos = _escribir(tmp_path / "best.pt", b"pesos")
+    a = _escribir(tmp_path / "pozo12_0800.mp4", b"mismo video")
+    b = _escribir(tmp_path / "pozo12_0900.mp4", b"mismo video")
+    c = _escribir(tmp_path / "pozo13.mp4", b"otro video")
+    assert cache.clave(a, _firma(pesos)) == cache.clave(b, _firma(pesos))
+    assert cache.clave(a, _firma(pesos)) != cache.clave(c, _firma(pesos))
+
+
+def test_guardar_y_buscar(tmp_path):
+    raiz = str(tmp_path / "cache")
+    salida = _escribir(tmp_path / "detections.npz", b"detecciones")
+    clave = cache.clave(_escribir(tmp_path / "v.mp4", b"v"), {"modelo": "x"})
+
+    assert cache.buscar(raiz, clave) is None
+    path = cache.guardar(raiz, clave, salida)
+    assert cache.buscar(raiz, clave) == path
+    assert os.path.dirname(path) == os.path.join(raiz, clave[:2])
+    with open(path, "rb") as f:
+        assert f.read() == b"detecciones"
+    # Sin temporales sueltos
+    assert os.listdir(os.path.dirname(path)) == [f"{clave}.npz"]
@@ -0,0 +1,101 @@
+# CATÁLOGO DE CORRIDAS: ALTA Y CIERRE, BÚSQUEDA POR VIDEO Y BACKFILL DESDE LOS run_dir.
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import catalogo  # noqa: E402
+import procesamiento  # noqa: E402
+
+ON = {"status": "ON", "confidence": 0.9, "reason": "movimiento", "n_points": 1800}
+OFF = {"status": "OFF", "confidence": 0.8, "reason": "quieto", "n_points": 1800}
+DBG = {"median_period_s": 10.0, "n_periods": 5}
+
+
+@pytest.fixture
+def cat(tmp_path):
+    c = catalogo.Catalogo(str(tmp_path / "catalogo.sqlite"))
+    yield c
+    c.cerrar()
+
+
+def _run_dir(tmp_path, nombre):
+    run_dir = tmp_path / "Outputs" / nombre
+    run_dir.mkdir(parents=True)
+    return str(run_dir)
+
+
+def test_inicio_y_cierre_actualizan_la_misma_fila(tmp_path, cat):
+    run_dir = _run_dir(tmp_path, "pozo12_20261001_080000")
+    cat.registrar_inicio(run_dir, "pozo12.mp4")
+    (fila,) = cat.buscar()
+    assert fila["estado_run"] == "running" and fila["video_id"] == "pozo12_20261001_080000"
+    inicio = fila["inicio"]
+
+    cat.registrar_run(run_dir, "pozo12.mp4", "ok", {"total_s": 12.5, "etapas": {"rodhead": {"segundos": 9.0}}},
+                      status_result=ON, bpm_value=6.0, dbg=DBG)
+    (fila,) = cat.buscar()
+    assert fila["estado_run"] == "ok" and fila["inicio"] == inicio
+    assert (fila["estado"], fila["bpm"], fila["n_periodos"]) == ("ON", 6.0, 5)
+    assert json.loads(fila["etapas"]) == {"rodhead": 9.0}
+
+    # Re-análisis a OFF: borra el BPM anterior y no toca el resto
+    cat.registrar_analisis(run_dir, status_result=OFF)
+    (fila,) = cat.buscar()
+    assert (fila["estado"], fila["bpm"], fila["estado_run"], fila["total_s"]) == ("OFF", None, "ok", 12.5)
+
+
+def test_buscar_video_con_y_sin_extension(tmp_path, cat):
+    for video in ("pozo12.mp4", "pozo12_b.mp4", "pozo_1.mp4", "pozoX1.mp4", "pozo_1"):
+        cat.registrar_run(_run_dir(tmp_path, video.replace(".", "_")), video, "ok")
+
+    def videos(**filtros):
+        return sorted(f["video"] for f in cat.buscar(**filtros))
+
+    assert videos(video="pozo12") == ["pozo12.mp4"]
+    assert videos(video="pozo12.mp4") == ["pozo12.mp4"]
+    assert videos(video="pozo_1") == ["pozo_1", "pozo_1.mp4"]  # el _ no es comodín
+    assert videos(video="pozo12%") == ["pozo12.mp4", "pozo12_b.mp4"]
+
+
+def test_buscar_por_fecha_y_estado(tmp_path, cat):
+    for nombre, inicio, estado in (("a", datetime(2026, 10, 1), ON), ("b", datetime(2026, 10, 5), OFF),
+                                   ("c", datetime(2026, 10, 9), ON)):
+        run_dir = _run_dir(tmp_path, nombre)
+        cat.registrar_run(run_dir, f"{nombre}.mp4", "ok", status_result=estado)
+        cat._guardar(run_dir, {"inicio": inicio.timestamp()})
+
+    filas = cat.buscar(desde=datetime(2026, 10, 2), estado="ON")
+    assert [f["video"] for f in filas] == ["c.mp4"]
+    assert [f["video"] for f in cat.buscar(hasta=datetime(2026, 10, 9))] == ["b.mp4", "a.mp4"]
+
+
+def test_backfill_desde_resultados(tmp_path, cat):
+    output = tmp_path / "Outputs"
+    una = _run_dir(tmp_path, "pozo12_20261001_080000")
+    procesamiento.escribir_resultados(os.path.join(una, "resultados.txt"), ON, 6.0, DBG)
+    procesamiento.touch(os.path.join(una, "_SUCCESS"))
+    with open(os.path.join(una, "metrics.json"), "w") as f:
+        json.dump({"video": "pozo12.mp4", "total_s": 30.0, "resultado": "ok"}, f)
+
+    multi = _run_dir(tmp_path, "pozo13_20261002_090000")
+    procesamiento.escribir_resultados_bombas(os.path.join(multi, "resultados.txt"),
+                                             [(0, ON, 7.5, DBG), (1, OFF, None, None)])
+    procesamiento.touch(os.path.join(multi, "_RUNNING"))
+    (output / "no_es_run").mkdir()
+
+    assert cat.backfill(str(output)) == 2
+    filas = {f["video_id"]: f for f in cat.buscar()}
+    f = filas["pozo12_20261001_080000"]
+    assert (f["video"], f["estado_run"], f["estado"], f["bpm"], f["confianza"]) == ("pozo12.mp4", "ok", "ON", 6.0, 0.9)
+    assert f["inicio"] == datetime(2026, 10, 1, 8).timestamp()
+    f = filas["pozo13_20261002_090000"]
+    assert (f["estado_run"], f["estado"], f["n_bombas"]) == ("running", "1/2 ON", 2)
+    assert [(b["id"], b["estado"], b["bpm"]) for b in f["bombas"]] == [(0, "ON", 7.5), (1, "OFF", None)]
+
+    # Volver a importar no duplica
+    assert cat.backfill(str(output)) == 2
+    assert len(cat.buscar()) == 2
@@ -0,0 +1,95 @@
+# FORMATO DE detections.npz: IDA Y VUELTA, detections.txt VIEJO, SERIES POR BOMBA Y CHECKPOINTS.
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import detecciones  # noqa: E402
+
+FILAS = [(1, 100.0, 200.5, 30.0, 32.0, 0.91, 0), (2, 101.0, 201.25, 30.0, 32.0, 0.5, 1),
+         (4, 99.5, 199.75, 31.0, 32.0, 0.88, 0)]
+
+
+def test_guardar_y_cargar(tmp_path):
+    path = str(tmp_path / detecciones.NOMBRE)
+    detecciones.guardar(path, detecciones.desde_filas(FILAS), fps=29.97, stride=2, fps_efectivo=14.985)
+
+    columnas, meta = detecciones.cargar(path)
+    assert meta == {"fps": 29.97, "stride": 2, "fps_efectivo": 14.985}
+    assert detecciones.cargar_meta(path) == meta
+    assert {k: v.dtype for k, v in columnas.items()} == {k: np.dtype(t) for k, t in detecciones.COLUMNAS.items()}
+    # float32 en disco: conf 0.91 vuelve como 0.9100000262...
+    np.testing.assert_allclose(detecciones.a_filas(columnas), FILAS, rtol=1e-6)
+    assert not detecciones.tiene_ids(path)
+    assert not os.path.exists(f"{path}.tmp")
+
+    frames, ys = detecciones.cargar_puntos(path)
+    np.testing.assert_array_equal(frames, [1, 2, 4])
+    np.testing.assert_array_equal(ys, [200.5, 201.25, 199.75])
+
+
+def test_sin_detecciones(tmp_path):
+    path = str(tmp_path / detecciones.NOMBRE)
+    detecciones.guardar(path, detecciones.desde_filas([]), fps=30.0)
+    columnas, _ = detecciones.cargar(path)
+    assert all(len(v) == 0 for v in columnas.values())
+    assert detecciones.a_filas(columnas) == []
+
+
+def test_txt_exportado_se_lee_igual(tmp_path):
+    # Corridas viejas (solo detections.txt) y la exportación DETECTIONSTXT=1
+    txt = str(tmp_path / detecciones.NOMBRE_TXT)
+    detecciones.exportar_txt(detecciones.desde_filas(FILAS), txt)
+    with open(txt) as f:
+        assert f.readline() == "(1, 200.5)\n"
+
+    columnas, meta = detecciones.cargar(txt)
+    assert meta == {} and detecciones.cargar_meta(txt) == {}
+    np.testing.assert_array_equal(columnas["frame"], [1, 2, 4])
+    np.testing.assert_array_equal(columnas["cy"], [200.5, 201.25, 199.75])
+    assert np.isnan(columnas["cx"]).all() and not columnas["tracked"].any()
+    assert not detecciones.tiene_ids(txt)
+
+
+def test_series_por_id(tmp_path):
+    filas = [(1, 0, 10.0, 1, 1, .9, 0, 1), (1, 0, 50.0, 1, 1, .9, 0, 0),
+             (2, 0, 11.0, 1, 1, .9, 0, 1), (3, 0, 51.0, 1, 1, .9, 0, 0)]
+    path = str(tmp_path / detecciones.NOMBRE)
+    detecciones.guardar(path, detecciones.desde_filas(filas, con_id=True), fps=30.0)
+
+    assert detecciones.tiene_ids(path)
+    series = detecciones.series_por_id(path)
+    assert list(series) == [0, 1]
+    np.testing.assert_array_equal(series[0][0], [1, 3])
+    np.testing.assert_array_equal(series[0][1], [50.0, 51.0])
+    np.testing.assert_array_equal(series[1][0], [1, 2])
+
+    # Sin columna id: una sola serie con id 0
+    una = str(tmp_path / "una.npz")
+    detecciones.guardar(una, detecciones.desde_filas(FILAS))
+    assert list(detecciones.series_por_id(una)) == [0]
+
+
+def test_checkpoint(tmp_path):
+    run_dir = str(tmp_path)
+    assert detecciones.cargar_checkpoint(run_dir) == (None, {})
+
+    detecciones.guardar_checkpoint(run_dir, FILAS, ultimo_frame=4, stride=1, parte=2)
+    filas, meta = detecciones.cargar_checkpoint(run_dir)
+    assert meta == {"ultimo_frame": 4, "stride": 1, "parte": 2}
+    np.testing.assert_allclose(filas, FILAS, rtol=1e-6)
+
+    detecciones.borrar_checkpoint(run_dir)
+    assert not os.path.exists(os.path.join(run_dir, detecciones.NOMBRE_CHECKPOINT))
+    detecciones.borrar_checkpoint(run_dir)
+
+
+def test_checkpoint_ilegible_o_incompleto(tmp_path):
+    path = os.path.join(str(tmp_path), detecciones.NOMBRE_CHECKPOINT)
+    with open(path, "wb") as f:
+        f.write(b"cortado a la mitad")
+    assert detecciones.cargar_checkpoint(str(tmp_path)) == (None, {})
+    # Un .npz válido sin último frame no sirve para reanudar
+    detecciones.guardar(path, detecciones.desde_filas(FILAS))
+    assert detecciones.cargar_checkpoint(str(tmp_path)) == (None, {})
@@ -0,0 +1,56 @@
+# RANGOS DE FRAMES PARA VIDEOS LARGOS: LÍMITES, COBERTURA Y UNIÓN DE LAS DETECCIONES.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import fragmentos  # noqa: E402
+
+
+def _inferidos(n_frames, stride, inicio=0, fin=None):
+    # Frames que infiere Detection._leer_lotes: 1, 1 + stride, ... dentro de (inicio, fin]
+    fin = n_frames if fin is None else fin
+    return [f for f in range(1, n_frames + 1, stride) if inicio < f <= fin]
+
+
+@pytest.mark.parametrize("n_frames", [1, 7, 100, 9000, 9001, 54321])
+@pytest.mark.parametrize("partes", [1, 2, 3, 8])
+@pytest.mark.parametrize("stride", [1, 3, 10])
+def test_rangos_cubren_el_video_sin_huecos(n_frames, partes, stride):
+    rangos = fragmentos.rangos(n_frames, partes, stride)
+
+    assert 1 <= len(rangos) <= partes
+    assert rangos[0][0] == 0 and rangos[-1][1] is None
+    for (ini, fin), (sig, _) in zip(rangos, rangos[1:]):
+        assert fin == sig  # contiguos: sin huecos ni solapamiento
+        assert ini % stride == 0 and fin % stride == 0 and fin > ini
+
+    # Los frames inferidos rango por rango son exactamente los de la corrida en serie
+    por_rango = [f for ini, fin in rangos for f in _inferidos(n_frames, stride, ini, fin)]
+    assert por_rango == _inferidos(n_frames, stride)
+
+
+def test_un_solo_rango():
+    # Con un video de no más de un stride no hay nada que repartir
+    assert fragmentos.rangos(5, 4, stride=10) == [(0, None)]
+    assert fragmentos.rangos(0, 4) == [(0, None)]
+
+
+def test_unir_filas_descarta_repetidos_en_los_limites():
+    # Filas (frame, cx, cy, w, h, conf, tracked); el segundo rango repite frames del
+    # calentamiento que ya están en el primero
+    r1 = [(1, 0, 10, 1, 1, .9, 0), (4, 0, 11, 1, 1, .9, 0), (7, 0, 12, 1, 1, .9, 0)]
+    r2 = [(7, 0, 99, 1, 1, .9, 0), (10, 0, 13, 1, 1, .9, 0)]
+    r3 = []
+    r4 = [(10, 0, 99, 1, 1, .9, 0), (13, 0, 14, 1, 1, .9, 0)]
+    filas = fragmentos.unir_filas([r1, r2, r3, r4])
+    assert [f[0] for f in filas] == [1, 4, 7, 10, 13]
+    assert [f[2] for f in filas] == [10, 11, 12, 13, 14]  # gana el rango que llegó primero
+
+
+def test_unir_filas_igual_a_serie():
+    serie = [(f, 0, f % 17, 1, 1, .9, 0) for f in _inferidos(1000, 3) if f % 11]
+    rangos = fragmentos.rangos(1000, 4, 3)
+    partes = [[fila for fila in serie if ini < fila[0] <= (fin or 1000)] for ini, fin in rangos]
+    assert fragmentos.unir_filas(partes) == serie
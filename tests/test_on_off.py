@@ -0,0 +1,50 @@
+# LÍNEA DE TIEMPO ON/OFF: MÉTRICAS POR VENTANA VECTORIZADAS CONTRA LAS DE UNA SOLA VENTANA.
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import detecciones  # noqa: E402
+import on_off  # noqa: E402
+
+
+@pytest.mark.parametrize("win", [2, 3, 30, 300])
+def test_rolling_igual_a_cada_ventana(win):
+    rng = np.random.default_rng(win)
+    n = 2000
+    # Señal lejos de cero (cy en píxeles), con tramos quietos, ruido y un escalón
+    ys = 400 + np.where(np.arange(n) < 1200, 40 * np.sin(np.arange(n) / 15), 0) + rng.normal(0, 2, n)
+    ys[1500:] += 60
+
+    rolling = on_off.rolling_movement_metrics(ys, win)
+    for i in range(0, n - win + 1, 7):
+        esperado = on_off.calculate_movement_metrics(ys[i:i + win])
+        for k, v in esperado.items():
+            assert rolling[k][i] == pytest.approx(v, rel=1e-6, abs=1e-6), (k, i)
+    assert all(len(v) == n - win + 1 for v in rolling.values())
+
+
+def test_rolling_ventana_invalida():
+    with pytest.raises(ValueError):
+        on_off.rolling_movement_metrics(np.arange(10.0), 1)
+    with pytest.raises(ValueError):
+        on_off.rolling_movement_metrics(np.arange(10.0), 11)
+
+
+def test_timeline_bomba_que_se_detiene(tmp_path):
+    # 60 s encendida a 6 BPM y 60 s detenida, a 30 fps
+    fps = 30.0
+    frames = np.arange(1, 3601)
+    ys = np.where(frames <= 1800, 240 + 60 * np.sin(2 * np.pi * 6 / 60 * frames / fps), 240.0)
+    ys = ys + np.random.default_rng(0).normal(0, 0.3, len(frames))
+    path = str(tmp_path / detecciones.NOMBRE)
+    detecciones.guardar(path, detecciones.desde_filas([(f, 0, y, 1, 1, .9, 0) for f, y in zip(frames, ys)]), fps=fps)
+
+    timeline = on_off.detect_on_off_timeline(path, window_s=10.0)
+    tramos = timeline['segments']
+    assert [t['status'] for t in tramos] == ['ON', 'OFF']
+    assert abs(tramos[0]['end_s'] - 60) <= 10
+    assert tramos[0]['bpm'] == pytest.approx(6, rel=0.05)
+    assert tramos[1]['bpm'] is None
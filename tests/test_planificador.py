@@ -0,0 +1,108 @@
+# PLANIFICADOR: BANDEJA DE ENTRADA, RECLAMO DE VIDEOS Y VIDEOS QUE ROMPEN EL PROCESAMIENTO.
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import planificador  # noqa: E402
+
+
+def _video(path, datos=b"video"):
+    with open(path, "wb") as f:
+        f.write(datos)
+    return str(path)
+
+
+class _INotifyOcupado:
+    # Una bandeja con eventos continuos (de otros archivos): read() nunca vence el timeout
+    def read(self, timeout=None, read_delay=None):
+        time.sleep(0.02)
+        return [SimpleNamespace(name="otro.mp4")]
+
+
+def test_revision_periodica_con_eventos_continuos(tmp_path):
+    # Un video que ya estaba (o cuyo evento se perdió) se reparte en las revisiones
+    # periódicas aunque inotify no deje de avisar de otros archivos
+    _video(tmp_path / "viejo.mp4")
+    vigilante = planificador.VigilanteBandeja(str(tmp_path), rescan=0.1)
+    vigilante._inotify = _INotifyOcupado()
+    vigilante.revisar()
+
+    limite = time.monotonic() + 2
+    listos = []
+    while "viejo.mp4" not in listos and time.monotonic() < limite:
+        _, listos = vigilante.esperar()
+    assert "viejo.mp4" in listos
+
+
+def test_polling_espera_que_el_archivo_deje_de_cambiar(tmp_path):
+    vigilante = planificador.VigilanteBandeja(str(tmp_path))
+    vigilante._inotify = None
+    path = _video(tmp_path / "pozo12.mp4", b"a")
+    assert vigilante.revisar() == (["pozo12.mp4"], [])
+    _video(path, b"ab")  # sigue copiándose
+    assert vigilante.revisar() == (["pozo12.mp4"], [])
+    assert vigilante.revisar() == (["pozo12.mp4"], ["pozo12.mp4"])
+
+
+def test_apartar_fallido(tmp_path, monkeypatch):
+    staging = tmp_path / "bandeja" / planificador.STAGING_DIR / "host-w0"
+    staging.mkdir(parents=True)
+    video = _video(staging / "roto.mp4")
+
+    monkeypatch.delenv("OUTPUTFAIL", raising=False)
+    apartado = planificador.apartar_fallido(str(tmp_path / "bandeja"), video)
+    assert apartado == str(tmp_path / "bandeja" / planificador.STAGING_DIR / planificador.FALLIDOS_DIR / "roto.mp4")
+    assert os.path.exists(apartado) and not os.path.exists(video)
+    # Fuera de la bandeja y de staging: no se vuelve a encolar ni a devolver
+    assert planificador.listar_videos(str(tmp_path / "bandeja")) == []
+    assert planificador.listar_videos(str(staging)) == []
+
+    video = _video(staging / "roto2.mp4")
+    monkeypatch.setenv("OUTPUTFAIL", str(tmp_path / "fail"))
+    assert planificador.apartar_fallido(str(tmp_path / "bandeja"), video) == str(tmp_path / "fail" / "roto2.mp4")
+    # Ya movido al run_dir antes de la excepción: no hay nada que apartar
+    assert planificador.apartar_fallido(str(tmp_path / "bandeja"), video) is None
+
+
+def test_reclamar_una_sola_vez(tmp_path):
+    bandeja = str(tmp_path)
+    _video(tmp_path / "pozo12.mp4")
+    w0 = planificador.staging_dir(bandeja, 0)
+    w1 = planificador.staging_dir(bandeja, 1)
+
+    reclamado = planificador.reclamar(bandeja, "pozo12.mp4", w0)
+    assert reclamado == os.path.join(w0, "pozo12.mp4") and os.path.exists(reclamado)
+    # El otro worker llega tarde: el rename falla y no se procesa dos veces
+    assert planificador.reclamar(bandeja, "pozo12.mp4", w1) is None
+    # La carpeta de staging es oculta: la bandeja ya no lo lista
+    assert planificador.listar_videos(bandeja) == []
+
+
+def test_devolver_reclamados(tmp_path):
+    bandeja = str(tmp_path)
+    _video(tmp_path / "a.mp4")
+    _video(tmp_path / "b.mp4")
+    planificador.reclamar(bandeja, "a.mp4", planificador.staging_dir(bandeja, 0))
+    planificador.reclamar(bandeja, "b.mp4", planificador.staging_dir(bandeja, 1))
+    assert planificador.listar_videos(bandeja) == []
+
+    planificador.devolver_reclamados(bandeja, workers=2)
+    assert planificador.listar_videos(bandeja) == ["a.mp4", "b.mp4"]
+
+
+def test_registro_de_corrida_pendiente(tmp_path):
+    bandeja = str(tmp_path)
+    assert planificador.video_id_pendiente(bandeja, "pozo12.mp4", 100) is None
+
+    planificador.registrar_pendiente(bandeja, "pozo12.mp4", "pozo12_20261001_080000", 100)
+    assert planificador.video_id_pendiente(bandeja, "pozo12.mp4", 100) == "pozo12_20261001_080000"
+    # Otro video con el mismo nombre (otro tamaño): corrida nueva
+    assert planificador.video_id_pendiente(bandeja, "pozo12.mp4", 101) is None
+    # El registro vive en staging: no se confunde con un video de la bandeja
+    assert planificador.listar_videos(bandeja) == []
+
+    planificador.olvidar_pendiente(bandeja, "pozo12.mp4")
+    assert planificador.video_id_pendiente(bandeja, "pozo12.mp4", 100) is None
+    planificador.olvidar_pendiente(bandeja, "pozo12.mp4")  # sin registro: no falla
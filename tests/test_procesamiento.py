@@ -0,0 +1,58 @@
+# EL BPM DE UNA BOMBA NO DEPENDE DE MULTIPUMP: analizar_bombas CONTRA EL CAMINO DE UNA BOMBA.
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Scripts"))
+import detecciones  # noqa: E402
+import procesamiento  # noqa: E402
+
+
+def _filas(rng, bpm_real, desde, n=1800, fps=30):
+    # cy enteros (centros de cajas de YOLO) y una bomba que puede aparecer tarde
+    frames = np.arange(desde, n)
+    cy = np.round(200 + 40 * np.sin(2 * np.pi * bpm_real / 60 * frames / fps) + rng.normal(0, 1.5, len(frames)))
+    return [(int(f), 100.0, float(y), 30.0, 30.0, 0.9, 0) for f, y in zip(frames, cy)]
+
+
+def test_bpm_multi_igual_a_una_bomba(tmp_path):
+    rng = np.random.default_rng(0)
+    bombas = {0: _filas(rng, 6, 0), 1: _filas(rng, 9, 250), 2: _filas(rng, 4.5, 40)}
+
+    filas = sorted((f + (i,) for i, fs in bombas.items() for f in fs), key=lambda f: f[0])
+    multi = str(tmp_path / "multi.npz")
+    detecciones.guardar(multi, detecciones.desde_filas(filas, con_id=True), fps=30.0, stride=1)
+    resultado = {i: (st, valor) for i, st, valor, _ in procesamiento.analizar_bombas(multi, 30.0)}
+
+    for i, fs in bombas.items():
+        una = str(tmp_path / f"bomba{i}.npz")
+        detecciones.guardar(una, detecciones.desde_filas(fs), fps=30.0, stride=1)
+        _, _, eventos, _ = procesamiento.extremos(una, 30.0)
+        status_result, valor, _ = procesamiento.estado_y_bpm(una, eventos, 30.0)
+        assert resultado[i][0]['status'] == status_result['status'] == 'ON'
+        assert resultado[i][1] == valor
+
+
+def test_terminar_grafico_marca_success_aunque_falle_el_catalogo(tmp_path, monkeypatch):
+    import json
+    from concurrent.futures import Future
+    from types import SimpleNamespace
+
+    run_dir = tmp_path / "pozo12_20260101_000000"
+    run_dir.mkdir()
+    (run_dir / "_RUNNING").touch()
+    (run_dir / "metrics.json").write_text(json.dumps({"etapas": {}}))
+    fut = Future()
+    fut.set_result((str(run_dir / "grafico_detecciones.png"), 0.5))
+    catalogo = SimpleNamespace(path=str(tmp_path / "catalogo.db"))
+
+    def falla(*args, **kwargs):
+        raise RuntimeError("catálogo roto")
+    monkeypatch.setattr(procesamiento.catalogo_runs.Catalogo, "registrar_run", falla)
+
+    procesamiento.terminar_grafico(fut, str(run_dir), "pozo12.mp4", "ON", catalogo=catalogo)
+
+    assert (run_dir / "_SUCCESS").exists()
+    assert not (run_dir / "_RUNNING").exists()
+    assert json.loads((run_dir / "metrics.json").read_text())["etapas"]["grafico"]["segundos"] == 0.5